@@ -3,12 +3,62 @@ from pydantic import BaseSettings
 class Settings(BaseSettings):
     MONGO_URI: str = "mongodb://localhost:27017"
     MONGO_DB: str = "zambian_farmer_db"
+    MONGO_MAX_POOL_SIZE: int = 50
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_CONNECT_TIMEOUT_MS: int = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 10000
+    MONGO_SOCKET_TIMEOUT_MS: int = 60000
+    MONGO_COMMAND_METRICS: bool = True   # per-collection command timings on /metrics
+    MONGO_SLOW_QUERY_MS: int = 200   # log commands at least this slow (field names only); 0 = off
+    REDIS_URL: str = "redis://redis:6379/0"
     JWT_SECRET: str
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_MINUTES: int = 10080   # ✅ Add this line
+    AUTH_USER_CACHE_TTL_SECONDS: int = 60
+    AUTH_USER_CACHE_SIZE: int = 10000
+    AUTH_TOKEN_MEMO_SIZE: int = 10000
+    AUTH_ROLES_IN_TOKEN: bool = False   # trust signed role claims instead of looking the user up
+    AUTH_USER_CHANGE_CHECK: bool = True   # one Redis GET per request to honour mark_user_changed()
+    BCRYPT_ROUNDS: int = 12   # hashes at any other cost are re-hashed on the next login
+    PASSWORD_VERIFY_WORKERS: int = 2   # concurrent bcrypt verifications per API process
+    PASSWORD_VERIFY_QUEUE: int = 32   # logins allowed to wait for a slot before a 503
+    LOGIN_RATE_LIMIT_WINDOW_SECONDS: int = 300
+    LOGIN_RATE_LIMIT_PER_ACCOUNT: int = 5   # failed logins per account per window (0 = off)
+    LOGIN_RATE_LIMIT_PER_IP: int = 30   # failed logins per client IP per window (0 = off)
+    CRYPTO_KEYS: str = ""   # "<kid>:<secret>,..."; empty = one key "k0" derived from JWT_SECRET
+    CRYPTO_ACTIVE_KEY_ID: str = ""   # key used for new writes; defaults to the last one listed
+    CRYPTO_LEGACY_LOOKUP: bool = True   # also match nrc_hash values written before the keyring
     SEED_ADMIN_EMAIL: str = "admin@agrimanage.com"
     SEED_ADMIN_PASSWORD: str = "admin123"
+    FARMER_CACHE_TTL_SECONDS: int = 30   # detail/list read-through cache; 0 disables it
+    FARMER_CACHE_SIZE: int = 2000   # entries in each API process's LRU tier
+    FARMER_CACHE_REDIS: bool = False   # also share cached bodies between API processes via Redis
+    FARMER_STATS_REBUILD_SECONDS: int = 3600   # beat interval of the full farmer_stats rebuild
+    SYNC_BULK_CHUNK_SIZE: int = 500
+    SYNC_STREAM_KEEPALIVE_SECONDS: int = 10
+    SYNC_STREAM_IDLE_SECONDS: int = 600   # a progress stream with no change for this long is closed
+    SYNC_CHUNK_SIZE: int = 500   # records per chunk task for streamed (NDJSON) uploads
+    SYNC_STREAM_MAX_BYTES: int = 512 * 1024 * 1024   # per streamed upload, counted after gzip inflation
+    SYNC_CONTENT_DEDUPE_SECONDS: int = 300   # identical batches sent without an Idempotency-Key are replayed this long
+    SYNC_SEQ_LEASE_SECONDS: int = 600   # must exceed the slowest farmer write; a crashed writer holds the delta feed back this long
+    SYNC_CHANGES_MAX_PAGE: int = 1000
+    SYNC_TOMBSTONE_TTL_DAYS: int = 90   # older sync tokens must resync from scratch
+    ID_CARD_DIR: str = "/app/uploads/idcards"   # rendered cards; sheets go in its "sheets" subfolder
+    SYNC_TASK_SOFT_TIME_LIMIT: int = 120   # seconds; per sync chunk
+    SYNC_TASK_TIME_LIMIT: int = 180
+    ID_CARD_TASK_SOFT_TIME_LIMIT: int = 60
+    ID_CARD_TASK_TIME_LIMIT: int = 90
+    ID_CARD_BATCH_SOFT_TIME_LIMIT: int = 3600   # listing a batch's farmers; also how long its progress count is kept
+    ID_CARD_BATCH_TIME_LIMIT: int = 3900
+    ID_CARD_CHUNK_SOFT_TIME_LIMIT: int = 300   # one RENDER_CHUNK of cards; a chunk stopped here is reported incomplete
+    ID_CARD_CHUNK_TIME_LIMIT: int = 360
+    MAINTENANCE_TASK_SOFT_TIME_LIMIT: int = 1800
+    MAINTENANCE_TASK_TIME_LIMIT: int = 2100
+    WORKER_CPU_COUNT: int = 0   # cores worker profiles size their pools for; 0 = detect
+    METRICS_ENABLED: bool = True   # Prometheus text on GET /metrics
+    METRICS_TOKEN: str = ""   # when set, /metrics requires "Authorization: Bearer <token>"
+    INDEX_PLAN_GUARD: bool = False   # test mode: refuse to start if hot queries COLLSCAN
 
     class Config:
         env_file = "../.env"
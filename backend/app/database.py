@@ -1,10 +1,20 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from .config import settings
+from .utils.mongo_metrics import CommandTimer
 _client = None
+def mongo_client_options():
+    return {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": settings.MONGO_SOCKET_TIMEOUT_MS,
+        "event_listeners": [CommandTimer(settings.MONGO_SLOW_QUERY_MS)] if settings.MONGO_COMMAND_METRICS else [],
+    }
 def get_client():
     global _client
     if not _client:
-        _client = AsyncIOMotorClient(settings.MONGO_URI)
+        _client = AsyncIOMotorClient(settings.MONGO_URI, **mongo_client_options())
     return _client
 def get_database():
     return get_client()[settings.MONGO_DB]
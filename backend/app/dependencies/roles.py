@@ -1,12 +1,83 @@
+import logging
+import time
+import redis
 from fastapi import Depends, Header, HTTPException, status
+from app.config import settings
+from app.utils.cache import TTLCache
+from app.utils.metrics import Counter
+from app.utils.redis_client import get_async_redis, get_redis
 from app.utils.security import decode_token
 from app.database import get_database
 
+logger = logging.getLogger(__name__)
+
+# email -> (user document without password_hash, time it was loaded).
+# Changes to roles or is_active reach every API process through
+# mark_user_changed(): it stores the change time in Redis, and cached users and
+# role-carrying tokens older than that are re-read from Mongo. Without Redis
+# (or with AUTH_USER_CHANGE_CHECK off) AUTH_USER_CACHE_TTL_SECONDS, and for
+# role claims the token lifetime, is the only bound on staleness.
+user_cache = TTLCache(maxsize=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_TTL_SECONDS)
+USER_CHANGED_KEY = "auth-user-changed:{email}"
+# where get_current_user resolved the user from: token claims, the cache or Mongo
+user_lookups = Counter("auth_user_lookups_total", "Users resolved for authenticated requests", ("source",))
+
+
+def invalidate_user(email: str | None = None):
+    """Drop one cached user, or every cached user when no email is given (this process only)."""
+    if email is None:
+        user_cache.clear()
+    else:
+        user_cache.pop(email)
+
+
+def mark_user_changed(email: str):
+    """
+    Call after changing a user's roles or is_active, from any process. Blocking.
+    The marker outlives every cache entry and access token issued before it.
+    """
+    invalidate_user(email)
+    keep = max(settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60, settings.AUTH_USER_CACHE_TTL_SECONDS)
+    get_redis().set(USER_CHANGED_KEY.format(email=email), time.time(), ex=keep)
+
+
+async def user_changed_at(email: str) -> float | None:
+    """When the user last changed (mark_user_changed), None if not recently or unknown."""
+    if not settings.AUTH_USER_CHANGE_CHECK:
+        return None
+    try:
+        value = await get_async_redis().get(USER_CHANGED_KEY.format(email=email))
+    except redis.RedisError as e:
+        logger.warning("user change check skipped: %s", e)
+        return None
+    return float(value) if value is not None else None
+
+
+async def load_user(db, email: str, changed_at: float | None = None):
+    """
+    Cached users.find_one({"email": ...}); a cache entry loaded before `changed_at`
+    is re-read. Returns None for unknown users and for users with is_active false.
+    """
+    cached = user_cache.get(email)
+    if cached is not None and (changed_at is None or cached[1] > changed_at):
+        user_lookups.inc(("cache",))
+        user = cached[0]
+    else:
+        user_lookups.inc(("mongo",))
+        loaded_at = time.time()
+        user = await db.users.find_one({"email": email}, {"password_hash": 0})
+        if user:
+            user_cache.set(email, (user, loaded_at))
+    if user and user.get("is_active", True) is False:
+        return None
+    return user
+
 
 async def get_current_user(authorization: str = Header(None), db=Depends(get_database)):
     """
     Extract and verify JWT token from the Authorization header.
-    Returns the full user document from MongoDB.
+    Returns the user document, from the in-process cache when possible, or
+    straight from the token's role claims when AUTH_ROLES_IN_TOKEN is enabled.
     """
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
@@ -24,9 +95,15 @@ async def get_current_user(authorization: str = Header(None), db=Depends(get_dat
         if not email:
             raise HTTPException(status_code=401, detail="Invalid token payload")
 
-        user = await db.users.find_one({"email": email})
+        changed_at = await user_changed_at(email)
+        if settings.AUTH_ROLES_IN_TOKEN and "roles" in payload \
+                and (changed_at is None or payload.get("iat", 0) > changed_at):
+            user_lookups.inc(("token",))
+            return {"email": email, "roles": payload["roles"]}
+
+        user = await load_user(db, email, changed_at)
         if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+            raise HTTPException(status_code=404, detail="User not found or disabled")
 
         return user
 
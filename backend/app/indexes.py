@@ -0,0 +1,119 @@
+import logging
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure
+from .config import settings
+from .services.farmer_geo import within_filter
+
+logger = logging.getLogger(__name__)
+
+# Declarative index registry: collection -> IndexModels.
+# create_indexes() is a no-op for indexes that already exist, so this is safe to
+# apply on every startup.
+INDEXES = {
+    "farmers": [
+        IndexModel([("farmer_id", ASCENDING)], name="farmer_id_unique", unique=True),
+        IndexModel([("nrc_hash", ASCENDING)], name="nrc_hash_unique", unique=True, sparse=True),
+        IndexModel([("temp_id", ASCENDING)], name="temp_id_sparse", sparse=True),
+        IndexModel([("personal_info.phone_primary", ASCENDING)], name="phone_primary"),
+        # listing / keyset pagination: (filter..., created_at desc, _id desc)
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_keyset"),
+        IndexModel([("address.province", ASCENDING), ("address.district", ASCENDING),
+                    ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="province_district_keyset"),
+        IndexModel([("address.district", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="district_keyset"),
+        IndexModel([("registration_status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="status_keyset"),
+        # multikey: fuzzy search and sync duplicate blocking (services/farmer_search.py)
+        IndexModel([("search_keys", ASCENDING)], name="search_keys"),
+        # GeoJSON points: /near, /within and map tiles (services/farmer_geo.py); null locations are skipped
+        IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+        # delta feed for tablets (services/farmer_changes.py)
+        IndexModel([("sync_seq", ASCENDING)], name="sync_seq"),
+    ],
+    "farmer_tombstones": [
+        IndexModel([("sync_seq", ASCENDING)], name="sync_seq"),
+        IndexModel([("deleted_at", ASCENDING)], name="deleted_at_ttl",
+                   expireAfterSeconds=settings.SYNC_TOMBSTONE_TTL_DAYS * 86400),
+    ],
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+}
+
+# Queries on request / sync hot paths; each must be answered from an index.
+HOT_QUERIES = [
+    ("farmers", {"farmer_id": "ZM00000000"}),
+    ("farmers", {"temp_id": {"$in": ["offline_0"]}}),
+    ("farmers", {"nrc_hash": {"$in": ["0" * 64]}}),
+    ("farmers", {"personal_info.phone_primary": {"$in": ["+260970000000"]}}),
+    ("farmers", {"address.province": "Lusaka", "address.district": "Chilanga"}),
+    ("farmers", {"registration_status": "pending"}),
+    ("farmers", {"search_keys": {"$in": ["w:banda", "b:kabwe:mwila:b"]}}),
+    ("farmers", within_filter((21.0, -18.0, 34.0, -8.0))),
+    ("farmers", {"sync_seq": {"$gt": 0}}),
+    ("farmer_tombstones", {"sync_seq": {"$gt": 0}}),
+    ("users", {"email": "admin@agrimanage.com"}),
+]
+
+
+def _log_index_failure(coll_name: str, exc: OperationFailure):
+    # e.g. an index with the same keys but other options, or duplicates blocking a unique index
+    logger.warning("Could not create indexes on %s: %s", coll_name, exc)
+
+
+async def ensure_indexes(db):
+    """Apply INDEXES with the async (Motor) client, e.g. on API startup."""
+    for coll_name, models in INDEXES.items():
+        try:
+            await db[coll_name].create_indexes(models)
+        except OperationFailure as e:
+            _log_index_failure(coll_name, e)
+
+
+def ensure_indexes_sync(db):
+    """Apply INDEXES with a synchronous pymongo client (scripts, workers)."""
+    for coll_name, models in INDEXES.items():
+        try:
+            db[coll_name].create_indexes(models)
+        except OperationFailure as e:
+            _log_index_failure(coll_name, e)
+
+
+def _has_collscan(plan) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collscan(v) for v in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(v) for v in plan)
+    return False
+
+
+def _winning_plan(explain: dict):
+    return explain.get("queryPlanner", {}).get("winningPlan", explain)
+
+
+def _raise_for_collscans(offenders: list):
+    if offenders:
+        detail = ", ".join(f"{coll}.find({query})" for coll, query in offenders)
+        raise RuntimeError(f"Hot queries fall back to COLLSCAN: {detail}")
+
+
+async def assert_indexed_queries(db):
+    """Test-mode guard: fail if any HOT_QUERIES plan contains a COLLSCAN."""
+    offenders = []
+    for coll_name, query in HOT_QUERIES:
+        explain = await db[coll_name].find(query).explain()
+        if _has_collscan(_winning_plan(explain)):
+            offenders.append((coll_name, query))
+    _raise_for_collscans(offenders)
+
+
+def assert_indexed_queries_sync(db):
+    offenders = []
+    for coll_name, query in HOT_QUERIES:
+        explain = db[coll_name].find(query).explain()
+        if _has_collscan(_winning_plan(explain)):
+            offenders.append((coll_name, query))
+    _raise_for_collscans(offenders)
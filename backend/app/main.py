@@ -1,14 +1,21 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import auth, farmers, sync
 from fastapi.staticfiles import StaticFiles
-from app.routes import farmers, auth, uploads
+from .routes import auth, farmers, metrics, sync, uploads
+from .config import settings
+from .database import get_database
+from .indexes import ensure_indexes, assert_indexed_queries
+from .utils.http_metrics import RequestMetricsMiddleware
+from .utils.serialization import MongoJSONResponse
+from .services import farmer_stats
+from .tasks.celery_app import STATS_REBUILD_TASK, celery_app
 
-app = FastAPI(title="Zambian Farmer System - Phase1")
+app = FastAPI(title="Zambian Farmer System - Phase1", default_response_class=MongoJSONResponse)
 app.include_router(sync.router)
 app.include_router(auth.router)
 app.include_router(farmers.router)
 app.include_router(uploads.router)
+app.include_router(metrics.router)
 
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
@@ -19,6 +26,19 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if settings.METRICS_ENABLED:
+    app.add_middleware(RequestMetricsMiddleware)
+
+@app.on_event("startup")
+async def create_indexes():
+    db = get_database()
+    await ensure_indexes(db)
+    if settings.INDEX_PLAN_GUARD:
+        await assert_indexed_queries(db)
+    # first start with an existing registry: backfill the stats summary once
+    if not await db[farmer_stats.STATS_COLLECTION].estimated_document_count() \
+            and await db.farmers.estimated_document_count():
+        celery_app.send_task(STATS_REBUILD_TASK)
 
 @app.get("/health")
 async def health():
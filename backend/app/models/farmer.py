@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from datetime import datetime
 class PersonalInfo(BaseModel):
     first_name: str
@@ -8,6 +8,8 @@ class PersonalInfo(BaseModel):
 class Address(BaseModel):
     province: str
     district: str
+    gps_latitude: Optional[float] = None
+    gps_longitude: Optional[float] = None
 class FarmerCreate(BaseModel):
     temp_id: Optional[str] = None
     personal_info: PersonalInfo
@@ -15,3 +17,24 @@ class FarmerCreate(BaseModel):
 class FarmerOut(FarmerCreate):
     farmer_id: str
     created_at: Optional[datetime] = None
+# Response shapes of the read endpoints. Those routes return MongoJSONResponse directly,
+# so these document the API without paying pydantic validation per document.
+class FarmerSummary(BaseModel):
+    id: str = Field(alias="_id")
+    farmer_id: Optional[str] = None
+    temp_id: Optional[str] = None
+    personal_info: Optional[dict] = None
+    address: Optional[dict] = None
+    registration_status: Optional[str] = None
+    photo_thumb_path: Optional[str] = None
+    created_at: Optional[datetime] = None
+class FarmerDetail(FarmerSummary):
+    photo_path: Optional[str] = None
+    photo_card_path: Optional[str] = None
+    identification_documents: Optional[List[dict]] = None
+    updated_at: Optional[datetime] = None
+class FarmerPage(BaseModel):
+    count: int
+    results: List[FarmerSummary]
+    next_cursor: Optional[str] = None
+    estimated_total: Optional[int] = None
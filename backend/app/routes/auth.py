@@ -1,9 +1,15 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+import math
+from fastapi import APIRouter, HTTPException, status, Depends, Request
 from pydantic import BaseModel
 from fastapi import Header
+from ..config import settings
 from ..database import get_database
+from ..dependencies.roles import load_user, require_role, user_changed_at
+from ..utils.bounded_pool import PoolSaturated
+from ..utils.rate_limit import RateLimiter
 from ..utils.security import (
-    verify_password,
+    verify_password_offloaded,
+    password_pool,
     create_access_token,
     create_refresh_token,
     decode_token,
@@ -11,6 +17,10 @@ from ..utils.security import (
 
 router = APIRouter(prefix="/api/auth", tags=["Auth"])
 
+# failed logins only; checked before any bcrypt work is spent on the attempt
+account_limiter = RateLimiter(settings.LOGIN_RATE_LIMIT_PER_ACCOUNT, settings.LOGIN_RATE_LIMIT_WINDOW_SECONDS)
+ip_limiter = RateLimiter(settings.LOGIN_RATE_LIMIT_PER_IP, settings.LOGIN_RATE_LIMIT_WINDOW_SECONDS)
+
 class LoginIn(BaseModel):
     username: str
     password: str
@@ -19,13 +29,36 @@ class RefreshIn(BaseModel):
     refresh_token: str
 
 @router.post("/login")
-async def login(payload: LoginIn):
+async def login(payload: LoginIn, request: Request):
+    email = payload.username.lower().strip()
+    client_ip = request.client.host if request.client else "unknown"
+    retry_after = max(account_limiter.retry_after(email), ip_limiter.retry_after(client_ip))
+    if retry_after:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many failed login attempts",
+                            headers={"Retry-After": str(math.ceil(retry_after))})
+
     db = get_database()
-    user_doc = await db.users.find_one({"email": payload.username.lower().strip()})
-    if not user_doc or not verify_password(payload.password, user_doc.get("password_hash", "")):
+    user_doc = await db.users.find_one({"email": email})
+    valid, new_hash = False, None
+    if user_doc:
+        try:
+            valid, new_hash = await verify_password_offloaded(payload.password, user_doc.get("password_hash", ""))
+        except PoolSaturated:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Login busy, retry shortly",
+                                headers={"Retry-After": "1"})
+    if not valid:
+        account_limiter.hit(email)
+        ip_limiter.hit(client_ip)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
-    access_token = create_access_token(user_doc["email"])
+    account_limiter.reset(email)
+    if user_doc.get("is_active", True) is False:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Account disabled")
+    if new_hash:
+        # BCRYPT_ROUNDS changed since this hash was made
+        await db.users.update_one({"_id": user_doc["_id"]}, {"$set": {"password_hash": new_hash}})
+
+    access_token = create_access_token(user_doc["email"], roles=user_doc.get("roles", []))
     refresh_token = create_refresh_token(user_doc["email"])
     return {
         "access_token": access_token,
@@ -40,7 +73,13 @@ async def refresh_token(payload: RefreshIn):
         data = decode_token(payload.refresh_token)
         if data.get("type") != "refresh":
             raise HTTPException(status_code=401, detail="Invalid token type")
-        new_access_token = create_access_token(data["sub"])
+        # re-read the user so disabled accounts get no new tokens and role
+        # changes take effect at the next refresh
+        user = await load_user(get_database(), data["sub"], await user_changed_at(data["sub"]))
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found or disabled")
+        roles = user.get("roles", []) if settings.AUTH_ROLES_IN_TOKEN else None
+        new_access_token = create_access_token(data["sub"], roles=roles)
         return {"access_token": new_access_token, "token_type": "bearer"}
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
@@ -54,8 +93,7 @@ async def get_current_user(authorization: str | None = Header(None)):
         scheme, token = authorization.split()
         payload = decode_token(token)
         email = payload.get("sub")
-        db = get_database()
-        user = await db.users.find_one({"email": email})
+        user = await load_user(get_database(), email, await user_changed_at(email))
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         return {
@@ -64,4 +102,10 @@ async def get_current_user(authorization: str | None = Header(None)):
             "token_type": payload.get("type")
         }
     except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
+
+
+@router.get("/login-metrics", dependencies=[Depends(require_role(["ADMIN"]))])
+async def login_metrics():
+    """Queueing stats of the bcrypt verification pool in this API process."""
+    return password_pool.stats()
@@ -1,15 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query, Request
+from fastapi.responses import StreamingResponse
 from uuid import uuid4
+from pymongo import ReturnDocument
 from datetime import datetime
-from app.tasks.id_card_task import generate_id_card
+from pydantic import BaseModel
 
-from ..models.farmer import FarmerCreate, FarmerOut
+from ..models.farmer import FarmerCreate, FarmerOut, FarmerDetail, FarmerPage
 from ..database import get_database
 from ..services.farmer_service import FarmerService
+from ..services import farmer_cache, farmer_changes, farmer_geo, farmer_query, farmer_search, farmer_stats
+from ..services.farmer_export import CSV_DEFAULT_COLUMNS, MEDIA_TYPES, stream_export
+from ..services.sync_service import FINGERPRINT_FIELD
 from ..dependencies.roles import require_role
+from ..utils.serialization import MongoJSONResponse
+from ..tasks.celery_app import ID_CARD_BATCH_TASK, ID_CARD_TASK, celery_app
 
 router = APIRouter(prefix="/api/farmers", tags=["Farmers"])
 
+MAX_PAGE_SIZE = 200
+MAX_SEARCH_RESULTS = 50
+MAX_NEAR_RESULTS = 200
+MAX_NEAR_DISTANCE_M = 100_000
+# top-level fields search_keys and location are derived from
+DERIVED_FROM_FIELDS = {"personal_info", "address", "farmer_id"}
+# FarmerOut's top-level fields; its nested models match FarmerCreate's exactly
+FARMER_OUT_FIELDS = tuple(FarmerOut.__fields__)
+
+
+class IdCardBatchIn(BaseModel):
+    farmer_ids: list[str] | None = None
+    province: str | None = None
+    district: str | None = None
+    registration_status: str | None = None
+    sheets: bool = False
+
+
+async def _refresh_derived_fields(db, _id):
+    doc = await db.farmers.find_one({"_id": _id}, {"personal_info": 1, "address": 1, "farmer_id": 1})
+    if doc:
+        await db.farmers.update_one({"_id": _id}, {"$set": {
+            farmer_search.SEARCH_FIELD: farmer_search.search_keys(doc),
+            farmer_geo.LOCATION_FIELD: farmer_geo.location_of(doc),
+        }})
+
+
+async def _map_view(db, bbox: tuple, mode: str, cell: float, filters: dict) -> dict:
+    """Points when few enough farmers match (or when asked for), otherwise grid clusters."""
+    if mode != "clusters":
+        query = farmer_geo.points_query(bbox, **filters)
+        if mode == "points" or await db.farmers.count_documents(query, limit=farmer_geo.MAX_POINTS + 1) \
+                <= farmer_geo.MAX_POINTS:
+            docs = await db.farmers.find(query, farmer_geo.POINT_PROJECTION) \
+                .limit(farmer_geo.MAX_POINTS).to_list(length=farmer_geo.MAX_POINTS)
+            return farmer_geo.points_body(docs)
+    rows = await db.farmers.aggregate(farmer_geo.cluster_pipeline(bbox, cell, **filters)).to_list(length=None)
+    return farmer_geo.clusters_body(rows, cell)
+
 
 # ✅ Create farmer (ADMIN or OPERATOR only)
 @router.post("/", response_model=FarmerOut, status_code=201,
@@ -23,42 +69,219 @@ async def create_farmer(farmer: FarmerCreate, db=Depends(get_database)):
     data["farmer_id"] = "ZM" + uuid4().hex[:8].upper()
     data["created_at"] = datetime.utcnow()
     data["registration_status"] = "pending"
-
-    await db.farmers.insert_one(data)
-    return data
+    data[farmer_search.SEARCH_FIELD] = farmer_search.search_keys(data)
+    data[farmer_geo.LOCATION_FIELD] = farmer_geo.location_of(data)
+    async with farmer_changes.reserve(db) as seq:
+        data.update(farmer_changes.stamp(seq))
+        await db.farmers.insert_one(data)
+    await farmer_stats.apply_deltas(db, farmer_stats.moved(None, farmer_stats.bucket_of(data)))
+    await farmer_cache.invalidate([data["farmer_id"]])
+    return MongoJSONResponse({k: data.get(k) for k in FARMER_OUT_FIELDS}, status_code=201)
 
 
 # ✅ Get list of farmers (ADMIN, OPERATOR, VIEWER)
-@router.get("/", dependencies=[Depends(require_role(["ADMIN", "OPERATOR", "VIEWER"]))])
-async def list_farmers(skip: int = 0, limit: int = 10, db=Depends(get_database)):
-    farmers = await db.farmers.find().skip(skip).limit(limit).to_list(length=limit)
-    return {"count": len(farmers), "results": farmers}
+@router.get("/", response_model=FarmerPage, dependencies=[Depends(require_role(["ADMIN", "OPERATOR", "VIEWER"]))])
+async def list_farmers(request: Request, skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+                       cursor: str | None = None, fields: str | None = None,
+                       province: str | None = None, district: str | None = None,
+                       registration_status: str | None = None,
+                       estimated_total: bool = False, db=Depends(get_database)):
+    """
+    Pass the returned `next_cursor` back as `cursor` for the next page; keyset paging on
+    (created_at, _id) costs the same at any depth. `skip` is kept for old clients.
+    Pages are cached per query string and carry an ETag (If-None-Match -> 304).
+    """
+    filters = farmer_query.build_filter(province=province, district=district,
+                                        registration_status=registration_status)
+    try:
+        projection = farmer_query.build_projection(fields)
+        query = {**filters, **farmer_query.keyset_filter(cursor)} if cursor else filters
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def load():
+        find = db.farmers.find(query, projection).sort(farmer_query.LIST_SORT)
+        if skip and not cursor:
+            find = find.skip(skip)
+        farmers = await find.limit(limit).to_list(length=limit)
+
+        next_cursor = farmer_query.encode_cursor(farmers[-1]) if len(farmers) == limit else None
+
+        response = {"count": len(farmers), "results": farmers, "next_cursor": next_cursor}
+        if estimated_total:
+            # collection metadata when unfiltered, otherwise an index-backed count
+            response["estimated_total"] = (
+                await db.farmers.count_documents(filters) if filters
+                else await db.farmers.estimated_document_count()
+            )
+        return response
+
+    entry = await farmer_cache.read_through(farmer_cache.LIST_SCOPE, farmer_cache.list_key(request), load)
+    return farmer_cache.respond(request, entry)
+
+
+# ✅ Stream the whole registry as NDJSON / CSV (ADMIN, OPERATOR, VIEWER)
+@router.get("/export", dependencies=[Depends(require_role(["ADMIN", "OPERATOR", "VIEWER"]))])
+async def export_farmers(format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+                         fields: str | None = None,
+                         province: str | None = None, district: str | None = None,
+                         registration_status: str | None = None,
+                         batch_size: int = Query(1000, ge=1, le=10000),
+                         gzip: bool = False, db=Depends(get_database)):
+    filters = farmer_query.build_filter(province=province, district=district,
+                                        registration_status=registration_status)
+    try:
+        projection = farmer_query.build_projection(fields)
+        columns = farmer_query.parse_fields(fields) if fields else CSV_DEFAULT_COLUMNS
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    cursor = db.farmers.find(filters, projection).batch_size(batch_size)
+    filename = f"farmers.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream_export(cursor, format, columns, batch_size, compress=gzip),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# ✅ Registry counts per province / district / status (ADMIN, OPERATOR, VIEWER)
+@router.get("/stats", dependencies=[Depends(require_role(["ADMIN", "OPERATOR", "VIEWER"]))])
+async def farmer_statistics(province: str | None = None, district: str | None = None,
+                            registration_status: str | None = None, db=Depends(get_database)):
+    """Served from the farmer_stats summary: one document per bucket, whatever the registry size."""
+    buckets = await db[farmer_stats.STATS_COLLECTION].find({}).to_list(length=None)
+    return MongoJSONResponse(farmer_stats.summarize(
+        buckets, province=province, district=district, registration_status=registration_status))
+
+
+# ✅ Fuzzy search by name, phone or district (ADMIN, OPERATOR, VIEWER)
+@router.get("/search", dependencies=[Depends(require_role(["ADMIN", "OPERATOR", "VIEWER"]))])
+async def search_farmers(q: str = Query(..., min_length=1, max_length=100),
+                         limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS),
+                         province: str | None = None, district: str | None = None,
+                         registration_status: str | None = None, db=Depends(get_database)):
+    """
+    Ranked matches for e.g. `q=bob yy`, `q=0977123456` or `q=banda kabwe`: whole words,
+    name prefixes and trigrams (typos), phone suffixes and farmer ids all count.
+    """
+    pipeline = farmer_search.search_pipeline(q, limit, province=province, district=district,
+                                             registration_status=registration_status)
+    if pipeline is None:
+        raise HTTPException(status_code=400, detail="Query has no searchable words or digits")
+    results = await db.farmers.aggregate(pipeline).to_list(length=limit)
+    return MongoJSONResponse({"count": len(results), "results": results})
+
+
+# ✅ Farmers nearest to a point (ADMIN, OPERATOR, VIEWER)
+@router.get("/near", dependencies=[Depends(require_role(["ADMIN", "OPERATOR", "VIEWER"]))])
+async def farmers_near(lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-180, le=180),
+                       radius_m: float = Query(5000, gt=0, le=MAX_NEAR_DISTANCE_M),
+                       limit: int = Query(20, ge=1, le=MAX_NEAR_RESULTS),
+                       province: str | None = None, district: str | None = None,
+                       registration_status: str | None = None, db=Depends(get_database)):
+    """Nearest first, each result with `distance_m`; answered by $geoNear on the location index."""
+    pipeline = farmer_geo.near_pipeline(lat, lon, radius_m, limit, province=province, district=district,
+                                        registration_status=registration_status)
+    results = await db.farmers.aggregate(pipeline).to_list(length=limit)
+    return MongoJSONResponse({"count": len(results), "results": results})
+
+
+# ✅ Farmers inside a bounding box, as points or clusters (ADMIN, OPERATOR, VIEWER)
+@router.get("/within", dependencies=[Depends(require_role(["ADMIN", "OPERATOR", "VIEWER"]))])
+async def farmers_within(request: Request, bbox: str = Query(..., description="min_lon,min_lat,max_lon,max_lat"),
+                         mode: str = Query("auto", regex="^(auto|points|clusters)$"),
+                         grid: int = Query(farmer_geo.DEFAULT_BBOX_GRID, ge=1, le=256),
+                         province: str | None = None, district: str | None = None,
+                         registration_status: str | None = None, db=Depends(get_database)):
+    """
+    `mode=auto` returns points while at most MAX_POINTS farmers match, clusters beyond
+    that; `grid` is the rough number of cluster cells across the box.
+    """
+    try:
+        box = farmer_geo.parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filters = {"province": province, "district": district, "registration_status": registration_status}
+    cell = farmer_geo.cell_size(box[2] - box[0], grid)
+
+    async def load():
+        return await _map_view(db, box, mode, cell, filters)
+
+    key = "within?" + farmer_cache.list_key(request)
+    entry = await farmer_cache.read_through(farmer_cache.LIST_SCOPE, key, load)
+    return farmer_cache.respond(request, entry)
+
+
+# ✅ One web-map tile of farmers, as points or clusters (ADMIN, OPERATOR, VIEWER)
+@router.get("/tiles/{z}/{x}/{y}", dependencies=[Depends(require_role(["ADMIN", "OPERATOR", "VIEWER"]))])
+async def farmer_tile(request: Request, z: int, x: int, y: int,
+                      mode: str = Query("auto", regex="^(auto|points|clusters)$"),
+                      province: str | None = None, district: str | None = None,
+                      registration_status: str | None = None, db=Depends(get_database)):
+    """XYZ tile z/x/y (as used by Leaflet / MapLibre); clusters are TILE_GRID x TILE_GRID cells per tile."""
+    if not 0 <= z <= farmer_geo.MAX_ZOOM:
+        raise HTTPException(status_code=400, detail=f"Zoom must be between 0 and {farmer_geo.MAX_ZOOM}")
+    try:
+        box = farmer_geo.tile_bbox(z, x, y)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filters = {"province": province, "district": district, "registration_status": registration_status}
+    cell = farmer_geo.cell_size(box[2] - box[0], farmer_geo.TILE_GRID)
+
+    async def load():
+        return await _map_view(db, box, mode, cell, filters)
+
+    key = f"tile:{z}/{x}/{y}?" + farmer_cache.list_key(request)
+    entry = await farmer_cache.read_through(farmer_cache.LIST_SCOPE, key, load)
+    return farmer_cache.respond(request, entry)
 
 
 # ✅ Get single farmer (any authenticated role)
-@router.get("/{farmer_id}", dependencies=[Depends(require_role(["ADMIN", "OPERATOR", "VIEWER"]))])
-async def get_farmer(farmer_id: str, db=Depends(get_database)):
-    farmer = await db.farmers.find_one({"farmer_id": farmer_id})
-    if not farmer:
+@router.get("/{farmer_id}", response_model=FarmerDetail,
+            dependencies=[Depends(require_role(["ADMIN", "OPERATOR", "VIEWER"]))])
+async def get_farmer(farmer_id: str, request: Request, db=Depends(get_database)):
+    async def load():
+        return await db.farmers.find_one({"farmer_id": farmer_id}, farmer_query.DETAIL_PROJECTION)
+
+    entry = await farmer_cache.read_through(farmer_id, "detail", load)
+    if entry is None:
         raise HTTPException(status_code=404, detail="Farmer not found")
-    return farmer
+    return farmer_cache.respond(request, entry)
 
 
 # ✅ Update farmer (ADMIN, OPERATOR)
 @router.put("/{farmer_id}", dependencies=[Depends(require_role(["ADMIN", "OPERATOR"]))])
 async def update_farmer(farmer_id: str, payload: dict, db=Depends(get_database)):
-    result = await db.farmers.update_one({"farmer_id": farmer_id}, {"$set": payload})
-    if result.matched_count == 0:
+    payload.pop(FINGERPRINT_FIELD, None)
+    async with farmer_changes.reserve(db) as seq:
+        changes = {**payload, **farmer_changes.stamp(seq)}
+        # the next sync of this farmer's record must be written again, even if unchanged on the tablet
+        before = await db.farmers.find_one_and_update({"farmer_id": farmer_id},
+                                                      {"$set": changes, "$unset": {FINGERPRINT_FIELD: ""}},
+                                                      projection=farmer_stats.BUCKET_PROJECTION,
+                                                      return_document=ReturnDocument.BEFORE)
+    if before is None:
         raise HTTPException(status_code=404, detail="Farmer not found")
+    if any(key.split(".")[0] in DERIVED_FROM_FIELDS for key in payload):
+        await _refresh_derived_fields(db, before["_id"])
+    bucket = farmer_stats.bucket_of(before)
+    await farmer_stats.apply_deltas(db, farmer_stats.moved(bucket, farmer_stats.bucket_after_set(bucket, payload)))
+    await farmer_cache.invalidate([farmer_id, payload.get("farmer_id")])
     return {"message": "Farmer updated successfully"}
 
 
 # ✅ Delete farmer (ADMIN only)
 @router.delete("/{farmer_id}", dependencies=[Depends(require_role(["ADMIN"]))])
 async def delete_farmer(farmer_id: str, db=Depends(get_database)):
-    result = await db.farmers.delete_one({"farmer_id": farmer_id})
-    if result.deleted_count == 0:
+    deleted = await db.farmers.find_one_and_delete({"farmer_id": farmer_id},
+                                                   projection=farmer_stats.BUCKET_PROJECTION)
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Farmer not found")
+    async with farmer_changes.reserve(db) as seq:
+        await db[farmer_changes.TOMBSTONES_COLLECTION].insert_one(farmer_changes.tombstone(farmer_id, seq))
+    await farmer_stats.apply_deltas(db, farmer_stats.moved(farmer_stats.bucket_of(deleted), None))
+    await farmer_cache.invalidate([farmer_id])
     return {"message": f"Farmer {farmer_id} deleted successfully"}
 
 
@@ -71,5 +294,16 @@ async def generate_farmer_idcard(farmer_id: str, background_tasks: BackgroundTas
         raise HTTPException(status_code=404, detail="Farmer not found")
 
     # trigger async celery task
-    background_tasks.add_task(generate_id_card.delay, farmer_id)
+    background_tasks.add_task(celery_app.send_task, ID_CARD_TASK, args=[farmer_id])
     return {"message": f"ID card generation started for {farmer_id}"}
+
+
+# ✅ Generate ID cards for many farmers at once (ADMIN, OPERATOR)
+@router.post("/idcards/batch", status_code=202,
+             dependencies=[Depends(require_role(["ADMIN", "OPERATOR"]))])
+async def generate_idcards_batch(payload: IdCardBatchIn):
+    filters = {k: v for k, v in payload.dict(include=set(farmer_query.FILTER_FIELDS)).items() if v is not None}
+    if not payload.farmer_ids and not filters:
+        raise HTTPException(status_code=400, detail="Provide farmer_ids or a province/district/registration_status filter")
+    task = celery_app.send_task(ID_CARD_BATCH_TASK, args=[payload.farmer_ids, filters, payload.sheets])
+    return {"job_id": task.id, "status": "queued"}
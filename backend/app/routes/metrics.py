@@ -0,0 +1,42 @@
+import hmac
+from fastapi import APIRouter, Header, HTTPException, Response
+from ..config import settings
+from ..dependencies.roles import user_lookups
+from ..tasks import task_metrics
+from ..utils import http_metrics, mongo_metrics
+from ..utils.metrics import CONTENT_TYPE, render, snapshot
+from ..utils.security import password_pool
+
+router = APIRouter(tags=["Metrics"])
+
+
+def _password_pool_lines() -> list:
+    stats = password_pool.stats()
+    return (
+        snapshot("password_verify_in_flight", "bcrypt verifications running", {(): stats["in_flight"]})
+        + snapshot("password_verify_queued", "bcrypt verifications waiting for a slot", {(): stats["queued"]})
+        + snapshot("password_verify_completed_total", "bcrypt verifications finished",
+                   {(): stats["completed"]}, kind="counter")
+        + snapshot("password_verify_rejected_total", "Logins refused with 503 because the pool was full",
+                   {(): stats["rejected"]}, kind="counter")
+        + snapshot("password_verify_wait_seconds_total", "Time verifications waited for a slot",
+                   {(): stats["wait_seconds_total"]}, kind="counter")
+        + snapshot("password_verify_run_seconds_total", "Time spent in bcrypt",
+                   {(): stats["run_seconds_total"]}, kind="counter")
+    )
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(authorization: str = Header(None)):
+    """
+    Prometheus text format. Request, Mongo, login and user-lookup series are
+    this API process's own; Celery series are summed over all workers (Redis).
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if settings.METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {settings.METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+    lines = http_metrics.render() + mongo_metrics.render() + user_lookups.render() + _password_pool_lines()
+    lines += await task_metrics.render()
+    return Response(content=render(lines), media_type=CONTENT_TYPE)
@@ -1,12 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+import asyncio
+import json
+import uuid
+import zlib
+from ..config import settings
+from ..database import get_database
+from ..services import farmer_changes
+from ..utils.redis_client import get_async_redis
+from ..utils.serialization import MongoJSONResponse, content_hash
 from ..utils.security import decode_token
-from ..tasks.celery_app import celery_app
-from ..tasks.sync_tasks import process_sync_batch
-from pydantic import BaseModel
+from ..tasks.celery_app import SYNC_BATCH_TASK, celery_app
+from ..tasks.progress import TERMINAL_STATES, progress_channel
+from ..tasks.sync_jobs import (chunk_ids, claim_submission, dispatch_chunk, finish_upload, job_info,
+                               reclaim_submission, register_job, release_submission, retry_chunks)
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional
 
 router = APIRouter(prefix="/api/sync", tags=["Sync"])
 
+MAX_STATUS_BATCH = 200
+MAX_NDJSON_LINE_BYTES = 1024 * 1024
+MAX_REPORTED_REJECTS = 100
+RERUN_STATES = {"FAILURE", "REVOKED"}
+
 class SyncRecord(BaseModel):
     temp_id: Optional[str]
     nrc_number: Optional[str] = None
@@ -17,28 +36,356 @@ class SyncRequest(BaseModel):
     farmers: List[SyncRecord]
     last_sync: Optional[str] = None
 
+class StatusBatchRequest(BaseModel):
+    job_ids: List[str]
+
+def _user_from_token(token: str):
+    try:
+        payload = decode_token(token)
+        return payload.get("sub")
+    except Exception:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
 async def get_current_user(authorization: str | None = Header(None)):
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing token")
     try:
         scheme, token = authorization.split()
-        payload = decode_token(token)
-        return payload.get("sub")
-    except Exception:
+    except ValueError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    return _user_from_token(token)
+
+async def get_stream_user(authorization: str | None = Header(None),
+                          access_token: str | None = Query(None)):
+    # browser EventSource cannot set headers, so the token may come as a query parameter
+    if access_token and not authorization:
+        return _user_from_token(access_token)
+    return await get_current_user(authorization)
+
+def _job_status(job_id: str, state: str, info):
+    status = {"job_id": job_id, "state": state, "result": None}
+    if state in TERMINAL_STATES:
+        status["result"] = info if state == "SUCCESS" else str(info)
+    elif state == "PROGRESS":
+        status["progress"] = info
+    return status
+
+def _read_status(job_id: str):
+    async_result = celery_app.AsyncResult(job_id)
+    return _job_status(job_id, async_result.state, async_result.info)
+
+def _read_statuses(job_ids: List[str]):
+    # one MGET against the result backend instead of one round trip per job
+    backend = celery_app.backend
+    keys = [backend.get_key_for_task(job_id) for job_id in job_ids]
+    raw = backend.mget(keys)
+    if isinstance(raw, dict):  # cache backends return {key: value}
+        raw = [raw.get(key) for key in keys]
+    statuses = []
+    for job_id, value in zip(job_ids, raw):
+        meta = backend.decode_result(value) if value else {"status": "PENDING", "result": None}
+        statuses.append(_job_status(job_id, meta["status"], meta.get("result")))
+    return statuses
+
+def _replay(job_id: str) -> dict:
+    return {**_read_status(job_id), "status": "replayed"}
 
 @router.post("/batch")
-async def sync_batch(payload: SyncRequest, current_user=Depends(get_current_user)):
-    # enqueue Celery job and return job id
+async def sync_batch(payload: SyncRequest, current_user=Depends(get_current_user),
+                     idempotency_key: str | None = Header(None)):
+    """
+    Enqueue a sync job. A retry of the same submission returns the earlier job and,
+    once finished, its result instead of queueing the work again; only a failed job
+    is re-run. With an Idempotency-Key header a submission is remembered as long as
+    its result; without one, identical records count as a retry only for
+    SYNC_CONTENT_DEDUPE_SECONDS, so a later deliberate resend is applied.
+    """
     farmers_payload = [f.dict() for f in payload.farmers]
-    task = process_sync_batch.apply_async(args=[current_user, farmers_payload])
-    return {"job_id": task.id, "status": "queued"}
+    body_hash = content_hash(farmers_payload)
+    if idempotency_key:
+        key, ttl = f"key:{idempotency_key}", None
+    else:
+        key, ttl = f"hash:{body_hash}", settings.SYNC_CONTENT_DEDUPE_SECONDS
+    job_id = str(uuid.uuid4())
+
+    earlier = await run_in_threadpool(claim_submission, current_user, key, body_hash, job_id, ttl)
+    if earlier is not None:
+        if earlier["hash"] != body_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different batch")
+        replay = await run_in_threadpool(_replay, earlier["job_id"])
+        if replay["state"] not in RERUN_STATES:
+            return replay
+        current = await run_in_threadpool(reclaim_submission, current_user, key, body_hash,
+                                          earlier["job_id"], job_id, ttl)
+        if current != job_id:  # a concurrent retry re-ran it first
+            return await run_in_threadpool(_replay, current)
+
+    try:
+        await run_in_threadpool(register_job, current_user, job_id)
+        celery_app.send_task(SYNC_BATCH_TASK, args=[current_user, farmers_payload], task_id=job_id)
+    except Exception:
+        await run_in_threadpool(release_submission, current_user, key)
+        raise
+    return {"job_id": job_id, "status": "queued"}
+
+def _inflated(inflater, data: bytes):
+    """Inflate `data` at most MAX_NDJSON_LINE_BYTES at a time, so a gzip bomb is never expanded whole."""
+    while True:
+        piece = inflater.decompress(data, MAX_NDJSON_LINE_BYTES)
+        if piece:
+            yield piece
+        data = inflater.unconsumed_tail
+        if not data and len(piece) < MAX_NDJSON_LINE_BYTES:
+            return
+
+async def _ndjson_lines(request: Request):
+    """Yield raw NDJSON lines as the body arrives, inflating gzip bodies on the fly."""
+    encoding = request.headers.get("content-encoding", "").lower()
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS) if encoding == "gzip" else None
+    buffer = b""
+    total = 0
+    async for chunk in request.stream():
+        for piece in _inflated(inflater, chunk) if inflater else (chunk,):
+            total += len(piece)
+            if total > settings.SYNC_STREAM_MAX_BYTES:
+                raise ValueError(f"body exceeds {settings.SYNC_STREAM_MAX_BYTES} bytes")
+            buffer += piece
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                yield line
+            if len(buffer) > MAX_NDJSON_LINE_BYTES:
+                raise ValueError(f"NDJSON line exceeds {MAX_NDJSON_LINE_BYTES} bytes")
+    if inflater:
+        for piece in _inflated(inflater, b""):
+            buffer += piece
+        buffer += inflater.flush()
+    for line in buffer.split(b"\n"):
+        yield line
+
+@router.post("/batch/stream")
+async def sync_batch_stream(request: Request, current_user=Depends(get_current_user),
+                            idempotency_key: str | None = Header(None)):
+    """
+    Incremental ingestion for large offline backlogs. The body is NDJSON, one SyncRecord
+    per line, optionally with Content-Encoding: gzip. Records are parsed as they arrive
+    and enqueued in SYNC_CHUNK_SIZE chunks under one parent job_id; see /jobs/{job_id}.
+    With an Idempotency-Key header, a retry of a completed upload returns the earlier
+    job without reading the body (resume failed chunks with /jobs/{job_id}/retry). An
+    upload cut short (malformed body, disconnect, enqueue error) frees its key, so it
+    can be sent again whole; chunks it had already enqueued still run under its job_id.
+    """
+    parent_id = str(uuid.uuid4())
+    key = f"stream:{idempotency_key}" if idempotency_key else None
+    if key:
+        # the body is not hashed up front; the key alone identifies the upload
+        earlier = await run_in_threadpool(claim_submission, current_user, key, "", parent_id)
+        if earlier is not None:
+            job = await run_in_threadpool(_aggregate_job, earlier["job_id"], False)
+            if job is None:
+                raise HTTPException(status_code=409, detail={"message": "Upload with this Idempotency-Key "
+                                                             "is still being received", "job_id": earlier["job_id"]})
+            return {**job, "status": "replayed"}
+
+    task_ids, chunk, rejected = [], [], []
+    accepted = rejected_count = line_no = 0
+    error = None
+    complete = False
+    try:
+        try:
+            async for line in _ndjson_lines(request):
+                line_no += 1
+                if not line.strip():
+                    continue
+                try:
+                    chunk.append(SyncRecord.parse_raw(line).dict())
+                except ValidationError as e:
+                    rejected_count += 1
+                    if len(rejected) < MAX_REPORTED_REJECTS:
+                        rejected.append({"line": line_no, "errors": e.errors()})
+                    continue
+                accepted += 1
+                if len(chunk) >= settings.SYNC_CHUNK_SIZE:
+                    task_ids.append(await run_in_threadpool(dispatch_chunk, current_user, chunk))
+                    chunk = []
+            if chunk:
+                task_ids.append(await run_in_threadpool(dispatch_chunk, current_user, chunk))
+            complete = True
+        except (zlib.error, ValueError) as e:
+            error = f"Malformed body after line {line_no}: {e}"
+        except ClientDisconnect:
+            error = f"Client disconnected after line {line_no}"
+    finally:
+        # also on enqueue errors: chunks already enqueued still run, so record them under
+        # the job, and never leave the key claimed by an upload that did not finish
+        job_id = await run_in_threadpool(finish_upload, current_user, key, task_ids, parent_id, complete)
+    if error:
+        raise HTTPException(status_code=400, detail={"message": error, "job_id": job_id})
+    return {"job_id": job_id, "status": "queued" if job_id else "empty", "chunks": len(task_ids),
+            "records": accepted, "rejected_count": rejected_count, "rejected": rejected}
+
+def _aggregate_job(job_id: str, include_results: bool):
+    task_ids = chunk_ids(job_id)
+    if task_ids is None:
+        return None
+    statuses = _read_statuses(task_ids)
+    counts, results, failed, finished = {}, [], [], 0
+    for status in statuses:
+        if status["state"] == "SUCCESS":
+            finished += 1
+            for record in status["result"]["results"]:
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+                if include_results:
+                    results.append(record)
+        elif status["state"] in TERMINAL_STATES:
+            finished += 1
+            failed.append(status["job_id"])
+
+    if finished < len(statuses):
+        state = "PROGRESS"
+    else:
+        state = "FAILURE" if failed else "SUCCESS"
+    job = {"job_id": job_id, "state": state, "chunks": len(statuses), "finished_chunks": finished,
+           "failed_chunks": failed, "counts": counts}
+    if include_results:
+        job["results"] = results
+    return job
+
+def _owned_job(job_id: str, user: str, include_results: bool):
+    # someone else's job is reported as missing, not as forbidden
+    info = job_info(job_id)
+    if info is None or info["user"] != user:
+        return None
+    return _aggregate_job(job_id, include_results)
+
+@router.get("/jobs/{job_id}")
+async def sync_job(job_id: str, include_results: bool = True, current_user=Depends(get_current_user)):
+    """Aggregated state of a chunked job: per-status counts, results of finished chunks."""
+    job = await run_in_threadpool(_owned_job, job_id, current_user, include_results)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/jobs/{job_id}/retry")
+async def retry_sync_job(job_id: str, current_user=Depends(get_current_user)):
+    """Resume a chunked job by re-enqueueing only its failed chunks."""
+    job = await run_in_threadpool(_owned_job, job_id, current_user, False)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    replaced = await run_in_threadpool(retry_chunks, job_id, job["failed_chunks"])
+    expired = [t for t in job["failed_chunks"] if t not in replaced]
+    return {"job_id": job_id, "retried": len(replaced), "expired_chunks": expired}
+
+@router.get("/changes")
+async def sync_changes(since: str | None = None,
+                       limit: int = Query(500, ge=1, le=settings.SYNC_CHANGES_MAX_PAGE),
+                       current_user=Depends(get_current_user), db=Depends(get_database)):
+    """
+    Farmers created, updated or deleted after `since` (the `next` token of the previous
+    page; omit it for the whole registry), oldest first. Keep calling with `next`
+    while `has_more`; a 410 means the token is too old and the tablet must start over.
+    """
+    try:
+        seq = farmer_changes.decode_token(since)
+    except farmer_changes.TokenExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # read before the changes: everything up to it has been written
+    counter = await db[farmer_changes.COUNTERS_COLLECTION].find_one({"_id": farmer_changes.SEQ_COUNTER})
+    query = farmer_changes.changes_query(seq, farmer_changes.high_water_mark(counter))
+    order = [(farmer_changes.SEQ_FIELD, 1)]
+    farmers = await db.farmers.find(query, farmer_changes.CHANGE_PROJECTION) \
+        .sort(order).limit(limit + 1).to_list(length=limit + 1)
+    tombstones = await db[farmer_changes.TOMBSTONES_COLLECTION].find(query, {"_id": 0}) \
+        .sort(order).limit(limit + 1).to_list(length=limit + 1)
+    return MongoJSONResponse(farmer_changes.page(farmers, tombstones, seq, limit))
 
 @router.get("/status")
 async def sync_status(job_id: str = Query(...), current_user=Depends(get_current_user)):
-    async_result = celery_app.AsyncResult(job_id)
-    state = async_result.state
-    result = None
-    if async_result.ready():
-        result = async_result.result
-    return {"job_id": job_id, "state": state, "result": result}
+    return await run_in_threadpool(_read_status, job_id)
+
+@router.post("/status/batch")
+async def sync_status_batch(payload: StatusBatchRequest, current_user=Depends(get_current_user)):
+    if len(payload.job_ids) > MAX_STATUS_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_STATUS_BATCH} job_ids per request")
+    return {"jobs": await run_in_threadpool(_read_statuses, payload.job_ids)}
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _find_job(job_id: str, user: str):
+    """
+    (chunked, task ids whose progress to follow) for a job this API enqueued: the
+    chunks of a /batch/stream upload, else the job itself. None for an unknown id
+    or another user's job.
+    """
+    info = job_info(job_id)
+    if info is not None and info["user"] != user:
+        return None
+    if info is not None and not info["chunked"]:
+        return False, [job_id]
+    children = chunk_ids(job_id)
+    if children is not None:
+        return True, children
+    if info is None and celery_app.AsyncResult(job_id).state != "PENDING":
+        return False, [job_id]  # enqueued before jobs were registered
+    return None
+
+def _snapshot(job_id: str, chunked: bool):
+    return ("job", _aggregate_job(job_id, False)) if chunked else ("status", _read_status(job_id))
+
+async def _progress_events(job_id: str, chunked: bool, task_ids: List[str]):
+    """
+    Server-sent events for one job: a snapshot first, then every progress message its
+    tasks publish, until the job reaches a terminal state. For a chunked job the
+    aggregated job (as GET /jobs/{job_id}) is sent again each time a chunk finishes.
+    The backend is only re-read on keepalive ticks, to catch a change whose message
+    was missed; after SYNC_STREAM_IDLE_SECONDS without any change the stream ends
+    with an "idle" event and the client may reconnect.
+    """
+    loop = asyncio.get_running_loop()
+    pubsub = get_async_redis().pubsub()
+    try:
+        # subscribe before the snapshot so nothing published in between is lost
+        await pubsub.subscribe(*[progress_channel(task_id) for task_id in task_ids])
+        event, last = await run_in_threadpool(_snapshot, job_id, chunked)
+        yield _sse(event, last)
+        if last["state"] in TERMINAL_STATES:
+            return
+
+        changed_at = loop.time()
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True,
+                                               timeout=settings.SYNC_STREAM_KEEPALIVE_SECONDS)
+            if message is not None:
+                changed_at = loop.time()
+                progress = json.loads(message["data"])
+                yield _sse("progress", progress)
+                if progress["state"] not in TERMINAL_STATES:
+                    continue
+                if not chunked:
+                    return
+
+            event, snapshot = await run_in_threadpool(_snapshot, job_id, chunked)
+            if snapshot != last:
+                changed_at, last = loop.time(), snapshot
+                yield _sse(event, snapshot)
+                if snapshot["state"] in TERMINAL_STATES:
+                    return
+            elif message is None:
+                if loop.time() - changed_at >= settings.SYNC_STREAM_IDLE_SECONDS:
+                    yield _sse("idle", {"job_id": job_id, "state": last["state"]})
+                    return
+                yield ": keepalive\n\n"
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.close()
+
+@router.get("/status/stream")
+async def sync_status_stream(job_id: str = Query(...), current_user=Depends(get_stream_user)):
+    job = await run_in_threadpool(_find_job, job_id, current_user)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(_progress_events(job_id, *job), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
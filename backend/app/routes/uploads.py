@@ -1,20 +1,28 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, status
 from pathlib import Path
+from uuid import uuid4
+from starlette.concurrency import run_in_threadpool
 from app.database import get_database
 from app.dependencies.roles import require_role
-import shutil
+from app.services import farmer_cache, farmer_changes
+from app.services.image_service import InvalidImage, content_dir, generate_photo_derivatives
+from app.utils.file_utils import FileTooLarge, save_upload
 
 router = APIRouter(prefix="/api/farmers", tags=["Uploads"])
 
 UPLOAD_ROOT = Path("uploads")
+PHOTO_ROOT = UPLOAD_ROOT / "photos"
 MAX_FILE_SIZE_MB = 5
+MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
 ALLOWED_PHOTO_TYPES = {"image/jpeg", "image/png"}
 ALLOWED_DOC_TYPES = {"image/jpeg", "image/png", "application/pdf"}
 
-async def save_file(file: UploadFile, dest: Path):
-    dest.parent.mkdir(parents=True, exist_ok=True)
-    with dest.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+async def save_file(file: UploadFile, dest: Path) -> dict:
+    # file.size is client-supplied; the limit is enforced on the bytes actually read
+    try:
+        return await save_upload(file, dest, MAX_FILE_SIZE_BYTES)
+    except FileTooLarge:
+        raise HTTPException(400, "File too large")
 
 @router.post("/{farmer_id}/upload-photo",
              dependencies=[Depends(require_role(["ADMIN", "OPERATOR"]))])
@@ -22,17 +30,31 @@ async def upload_photo(farmer_id: str, file: UploadFile = File(...),
                        db=Depends(get_database)):
     if file.content_type not in ALLOWED_PHOTO_TYPES:
         raise HTTPException(400, "Invalid photo type")
-    if file.size and file.size > MAX_FILE_SIZE_MB * 1024 * 1024:
+    if file.size and file.size > MAX_FILE_SIZE_BYTES:
         raise HTTPException(400, "File too large")
 
-    filename = f"{farmer_id}_photo{Path(file.filename).suffix}"
-    dest = UPLOAD_ROOT / "photos" / farmer_id / filename
-    await save_file(file, dest)
+    # stage the raw upload, then keep only EXIF-free derivatives at a
+    # content-hash path; identical photos share one set of files
+    staged = PHOTO_ROOT / ".incoming" / f"{uuid4().hex}{Path(file.filename).suffix}"
+    stored = await save_file(file, staged)
+    directory = content_dir(PHOTO_ROOT, stored["sha256"])
+    try:
+        derivatives = await run_in_threadpool(generate_photo_derivatives, staged, directory)
+    except InvalidImage:
+        raise HTTPException(400, "Invalid image")
+    finally:
+        await run_in_threadpool(staged.unlink, missing_ok=True)
 
-    path = f"/uploads/photos/{farmer_id}/{filename}"
-    await db.farmers.update_one({"farmer_id": farmer_id},
-                                {"$set": {"photo_path": path}})
-    return {"message": "Photo uploaded", "photo_path": path}
+    urls = {name: "/" + path.as_posix() for name, path in derivatives.items()}
+    async with farmer_changes.reserve(db) as seq:
+        await db.farmers.update_one({"farmer_id": farmer_id},
+                                    {"$set": {"photo_path": urls["full"],
+                                              "photo_card_path": urls["card"],
+                                              "photo_thumb_path": urls["thumb"],
+                                              "photo_sha256": stored["sha256"],
+                                              **farmer_changes.stamp(seq)}})
+    await farmer_cache.invalidate([farmer_id])
+    return {"message": "Photo uploaded", "photo_path": urls["full"], "photo_thumb_path": urls["thumb"]}
 
 @router.post("/{farmer_id}/upload-document",
              dependencies=[Depends(require_role(["ADMIN", "OPERATOR"]))])
@@ -41,16 +63,22 @@ async def upload_document(farmer_id: str, document_type: str,
                           db=Depends(get_database)):
     if file.content_type not in ALLOWED_DOC_TYPES:
         raise HTTPException(400, "Invalid document type")
+    if file.size and file.size > MAX_FILE_SIZE_BYTES:
+        raise HTTPException(400, "File too large")
 
     filename = f"{farmer_id}_{document_type}{Path(file.filename).suffix}"
     dest = UPLOAD_ROOT / "docs" / farmer_id / filename
-    await save_file(file, dest)
+    stored = await save_file(file, dest)
 
     path = f"/uploads/docs/{farmer_id}/{filename}"
-    await db.farmers.update_one(
-        {"farmer_id": farmer_id},
-        {"$push": {"identification_documents": {
-            "doc_type": document_type,
-            "file_path": path
-        }}})
+    async with farmer_changes.reserve(db) as seq:
+        await db.farmers.update_one(
+            {"farmer_id": farmer_id},
+            {"$push": {"identification_documents": {
+                "doc_type": document_type,
+                "file_path": path,
+                "size": stored["size"],
+                "sha256": stored["sha256"],
+            }}, "$set": farmer_changes.stamp(seq)})
+    await farmer_cache.invalidate([farmer_id])
     return {"message": f"{document_type} uploaded", "path": path}
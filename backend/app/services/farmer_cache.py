@@ -0,0 +1,149 @@
+"""
+Read-through cache for GET /api/farmers/{id} and GET /api/farmers/.
+
+Entries are rendered JSON bodies (plus their ETag), keyed by a generation number
+kept in Redis: one per farmer for detail reads and one for all list pages. Writers
+bump the generations *after* their Mongo write, which makes every older entry
+unreachable at once, in every API process, without having to find or delete it:
+
+    farmer-cache:gen:list            -> bumped by every farmer write
+    farmer-cache:gen:<farmer_id>     -> bumped by writes to that farmer
+    farmer-cache:<scope>:<gen>:<key> -> cached body (Redis tier only)
+
+Tiers: an in-process LRU (TTLCache) and, with FARMER_CACHE_REDIS, a Redis copy
+shared by all API workers. Reading the generation costs one Redis GET; if Redis is
+unreachable the cache is bypassed rather than risk serving stale data.
+"""
+import hashlib
+import logging
+from typing import NamedTuple
+from fastapi import Request, Response
+from redis.exceptions import RedisError
+from ..config import settings
+from ..utils.cache import TTLCache
+from ..utils.redis_client import get_async_redis, get_redis
+from ..utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+GEN_KEY = "farmer-cache:gen:{scope}"
+ENTRY_KEY = "farmer-cache:{scope}:{gen}:{key}"
+LIST_SCOPE = "list"
+# clients may keep a copy but must revalidate it (cheap 304) before every use
+CACHE_CONTROL = "private, no-cache"
+
+
+class CachedBody(NamedTuple):
+    body: bytes
+    etag: str
+
+
+_local = TTLCache(maxsize=settings.FARMER_CACHE_SIZE, ttl=settings.FARMER_CACHE_TTL_SECONDS)
+
+
+def _enabled() -> bool:
+    return settings.FARMER_CACHE_TTL_SECONDS > 0
+
+
+def _entry(body: bytes) -> CachedBody:
+    return CachedBody(body, '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"')
+
+
+def _gen_ttl() -> int:
+    # a generation key outlives every entry made under it, so letting it expire
+    # (and restart at 0) can never resurrect an old entry
+    return settings.FARMER_CACHE_TTL_SECONDS * 2 + 60
+
+
+async def read_through(scope: str, key: str, load) -> CachedBody | None:
+    """
+    Cached body for (scope, key), calling `await load()` on a miss.
+    load() returns the JSON content, or None for "not found" (never cached).
+    """
+    if not _enabled():
+        content = await load()
+        return None if content is None else _entry(dumps(content))
+
+    r = get_async_redis()
+    try:
+        gen = int(await r.get(GEN_KEY.format(scope=scope)) or 0)
+    except RedisError as e:
+        logger.warning("farmer cache bypassed: %s", e)
+        content = await load()
+        return None if content is None else _entry(dumps(content))
+
+    entry_key = ENTRY_KEY.format(scope=scope, gen=gen, key=key)
+    entry = _local.get(entry_key)
+    if entry is not None:
+        return entry
+
+    if settings.FARMER_CACHE_REDIS:
+        try:
+            body = await r.get(entry_key)
+        except RedisError:
+            body = None
+        if body is not None:
+            entry = _entry(body)
+            _local.set(entry_key, entry)
+            return entry
+
+    content = await load()
+    if content is None:
+        return None
+    entry = _entry(dumps(content))
+    _local.set(entry_key, entry)
+    if settings.FARMER_CACHE_REDIS:
+        try:
+            await r.set(entry_key, entry.body, ex=settings.FARMER_CACHE_TTL_SECONDS)
+        except RedisError:
+            pass
+    return entry
+
+
+def respond(request: Request, entry: CachedBody) -> Response:
+    """200 with the body, or 304 when the client's If-None-Match already has it."""
+    headers = {"ETag": entry.etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    if entry.etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+
+def list_key(request: Request) -> str:
+    return "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+
+
+def _scopes(farmer_ids) -> list:
+    ids = sorted({f for f in farmer_ids if f})
+    # any farmer write can change list pages; no farmer touched, nothing to bump
+    return [LIST_SCOPE] + ids if ids else []
+
+
+async def invalidate(farmer_ids=()):
+    """Call after a farmer write has completed (API side)."""
+    scopes = _scopes(farmer_ids)
+    if not _enabled() or not scopes:
+        return
+    try:
+        async with get_async_redis().pipeline(transaction=False) as pipe:
+            for scope in scopes:
+                pipe.incr(GEN_KEY.format(scope=scope))
+                pipe.expire(GEN_KEY.format(scope=scope), _gen_ttl())
+            await pipe.execute()
+    except RedisError as e:
+        logger.error("farmer cache invalidation failed: %s", e)
+
+
+def invalidate_sync(farmer_ids=()):
+    """invalidate() for Celery workers and other blocking code."""
+    scopes = _scopes(farmer_ids)
+    if not _enabled() or not scopes:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for scope in scopes:
+            pipe.incr(GEN_KEY.format(scope=scope))
+            pipe.expire(GEN_KEY.format(scope=scope), _gen_ttl())
+        pipe.execute()
+    except RedisError as e:
+        logger.error("farmer cache invalidation failed: %s", e)
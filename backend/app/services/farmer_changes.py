@@ -0,0 +1,159 @@
+"""
+Delta feed for tablets: GET /api/sync/changes?since=<token>.
+
+Every farmer write stamps two fields just before it is sent to Mongo:
+
+    sync_seq     next value of the `counters` sequence (indexed, strictly increasing)
+    updated_at   server time of that allocation
+
+Deletes leave a tombstone {farmer_id, sync_seq, deleted_at} in `farmer_tombstones`
+(TTL-expired after SYNC_TOMBSTONE_TTL_DAYS). The feed merges both collections in
+sync_seq order; the continuation token is the last sequence number handed out.
+
+A sequence number is allocated before its write commits, so a page could overtake
+a slower concurrent write and skip it for good. Writers therefore hold their
+numbers as a reservation (reserve / reserve_sync) until the write has returned;
+reservations are listed in the counter document, in allocation order:
+
+    {"_id": "farmer_sync_seq", "value": <last allocated>,
+     "pending": [{"token", "until", "seq"}, ...]}
+
+The feed only hands out changes up to high_water_mark(): just below the oldest
+open reservation. A writer that dies without releasing holds the feed back for
+SYNC_SEQ_LEASE_SECONDS, after which its reservation is ignored.
+"""
+import base64
+import json
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from ..config import settings
+from .farmer_query import DETAIL_PROJECTION
+
+COUNTERS_COLLECTION = "counters"
+SEQ_COUNTER = "farmer_sync_seq"
+SEQ_FIELD = "sync_seq"
+TOMBSTONES_COLLECTION = "farmer_tombstones"
+CHANGE_PROJECTION = DETAIL_PROJECTION
+
+
+class TokenExpired(ValueError):
+    """The token predates the oldest tombstone still kept; the client must resync from scratch."""
+
+
+def _open(token: str, n: int) -> dict:
+    until = datetime.utcnow() + timedelta(seconds=settings.SYNC_SEQ_LEASE_SECONDS)
+    return {"$inc": {"value": n}, "$push": {"pending": {"token": token, "until": until}}}
+
+
+def _expired(counter: dict) -> bool:
+    now = datetime.utcnow()
+    return any(p["until"] <= now for p in counter.get("pending", ()))
+
+
+@asynccontextmanager
+async def reserve(db, n: int = 1):
+    """
+    Reserve n consecutive sequence numbers and yield the first. Do the write they
+    stamp inside the block: the feed holds back at them until it exits.
+    """
+    counters, token = db[COUNTERS_COLLECTION], uuid.uuid4().hex
+    counter = await counters.find_one_and_update({"_id": SEQ_COUNTER}, _open(token, n), upsert=True,
+                                                 return_document=ReturnDocument.AFTER)
+    first = counter["value"] - n + 1
+    try:
+        await counters.update_one({"_id": SEQ_COUNTER, "pending.token": token}, {"$set": {"pending.$.seq": first}})
+        yield first
+    finally:
+        counter = await counters.find_one_and_update({"_id": SEQ_COUNTER}, {"$pull": {"pending": {"token": token}}},
+                                                     return_document=ReturnDocument.AFTER)
+        if _expired(counter):
+            await counters.update_one({"_id": SEQ_COUNTER},
+                                      {"$pull": {"pending": {"until": {"$lte": datetime.utcnow()}}}})
+
+
+@contextmanager
+def reserve_sync(db, n: int = 1):
+    counters, token = db[COUNTERS_COLLECTION], uuid.uuid4().hex
+    counter = counters.find_one_and_update({"_id": SEQ_COUNTER}, _open(token, n), upsert=True,
+                                           return_document=ReturnDocument.AFTER)
+    first = counter["value"] - n + 1
+    try:
+        counters.update_one({"_id": SEQ_COUNTER, "pending.token": token}, {"$set": {"pending.$.seq": first}})
+        yield first
+    finally:
+        counter = counters.find_one_and_update({"_id": SEQ_COUNTER}, {"$pull": {"pending": {"token": token}}},
+                                               return_document=ReturnDocument.AFTER)
+        if _expired(counter):
+            counters.update_one({"_id": SEQ_COUNTER}, {"$pull": {"pending": {"until": {"$lte": datetime.utcnow()}}}})
+
+
+def high_water_mark(counter: dict | None, now: datetime | None = None) -> int:
+    """
+    The highest sequence number up to which every write has finished, from the
+    counter document. 0 while the oldest open reservation has not recorded its
+    number yet (it is being taken; the next poll gets further).
+    """
+    if not counter:
+        return 0
+    now = now or datetime.utcnow()
+    for reservation in counter.get("pending", ()):
+        if reservation["until"] > now:
+            return reservation["seq"] - 1 if "seq" in reservation else 0
+    return counter["value"]
+
+
+def stamp(seq: int) -> dict:
+    """Fields to $set (or insert) with a write that was given `seq`."""
+    return {SEQ_FIELD: seq, "updated_at": datetime.utcnow()}
+
+
+def tombstone(farmer_id: str, seq: int) -> dict:
+    return {"farmer_id": farmer_id, SEQ_FIELD: seq, "deleted_at": datetime.utcnow()}
+
+
+def encode_token(seq: int) -> str:
+    raw = json.dumps({"s": seq, "t": int(time.time())}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_token(token: str | None) -> int:
+    """Sequence number a token resumes after (0 for no token: the whole registry)."""
+    if not token:
+        return 0
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        seq, issued = int(data["s"]), int(data["t"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid sync token: {e}")
+    if time.time() - issued > settings.SYNC_TOMBSTONE_TTL_DAYS * 86400:
+        raise TokenExpired("Sync token is older than the kept deletions; resync without `since`")
+    return seq
+
+
+def changes_query(since: int, upto: int) -> dict:
+    """Changes after `since` whose writes have finished (upto = high_water_mark())."""
+    return {SEQ_FIELD: {"$gt": since, "$lte": upto}}
+
+
+def page(farmers: list, tombstones: list, since: int, limit: int) -> dict:
+    """
+    Merge up to `limit` changes after `since` from both collections (each queried
+    with changes_query, sorted by sync_seq, limited to limit + 1) into the response.
+    """
+    merged = sorted(
+        [(doc[SEQ_FIELD], {"op": "upsert", "farmer": doc}) for doc in farmers]
+        + [(doc[SEQ_FIELD], {"op": "delete", "farmer_id": doc["farmer_id"]}) for doc in tombstones],
+        key=lambda change: change[0],
+    )[:limit + 1]
+    changes = [change for _, change in merged[:limit]]
+    return {
+        "count": len(changes),
+        "changes": changes,
+        "next": encode_token(merged[len(changes) - 1][0] if changes else since),
+        # more finished changes are waiting; otherwise poll again later with `next`
+        "has_more": len(merged) > limit,
+    }
@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from bson import ObjectId
+from starlette.concurrency import run_in_threadpool
+from ..utils.serialization import dumps
+
+CSV_DEFAULT_COLUMNS = [
+    "farmer_id",
+    "temp_id",
+    "personal_info.first_name",
+    "personal_info.last_name",
+    "personal_info.phone_primary",
+    "personal_info.date_of_birth",
+    "address.province",
+    "address.district",
+    "address.gps_latitude",
+    "address.gps_longitude",
+    "registration_status",
+    "created_at",
+]
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _json_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+
+def _lookup(doc: dict, path: str):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default, separators=(",", ":"))
+    if isinstance(value, (datetime, date, ObjectId)):
+        return _json_default(value)
+    return value
+
+
+class _Encoder:
+    """Turns batches of documents into NDJSON or CSV text, one batch at a time."""
+
+    def __init__(self, fmt: str, columns: list[str]):
+        self.fmt = fmt
+        self.columns = columns
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer) if fmt == "csv" else None
+
+    def header(self) -> str:
+        if self.fmt != "csv":
+            return ""
+        self.writer.writerow(self.columns)
+        return self._drain()
+
+    def encode(self, docs: list[dict]) -> str:
+        if self.fmt == "csv":
+            for doc in docs:
+                self.writer.writerow([_csv_cell(_lookup(doc, c)) for c in self.columns])
+            return self._drain()
+        return b"".join(dumps(doc) + b"\n" for doc in docs).decode()
+
+    def _drain(self) -> str:
+        text = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return text
+
+
+async def stream_export(cursor, fmt: str, columns: list[str], batch_size: int, compress: bool = False):
+    """
+    Yield the export body chunk by chunk straight off a Motor cursor. At most one
+    batch of documents is held in memory, whatever the size of the collection.
+    Encoding and gzip run in the threadpool, one batch at a time, so a large export
+    never holds up the event loop.
+    """
+    encoder = _Encoder(fmt, columns)
+    gzipper = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+
+    def emit(text: str) -> bytes:
+        data = text.encode()
+        return gzipper.compress(data) if gzipper else data
+
+    def emit_batch(docs: list[dict]) -> bytes:
+        return emit(encoder.encode(docs))
+
+    head = emit(encoder.header())
+    if head:
+        yield head
+
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            # awaited before the next batch: the encoder and compressor are never shared
+            chunk = await run_in_threadpool(emit_batch, batch)
+            batch = []
+            if chunk:
+                yield chunk
+    if batch:
+        yield await run_in_threadpool(emit_batch, batch)
+    if gzipper:
+        yield gzipper.flush()
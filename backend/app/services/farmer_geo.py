@@ -0,0 +1,184 @@
+"""
+Farmer locations as GeoJSON points, queried through the `location` 2dsphere index.
+
+    {"location": {"type": "Point", "coordinates": [<lon>, <lat>]}}
+
+`location` is derived from address.gps_latitude / gps_longitude whenever the address
+is written (null when there are no usable coordinates, which the index skips).
+
+Map views use one of two response shapes:
+
+    points    the matching farmers, lightweight projection, capped at MAX_POINTS
+    clusters  counts per grid cell with the cells' mean position, computed in the
+              aggregation, so a view over 100k+ farmers is a few thousand rows
+
+Cells are aligned to a global grid whose size is a power-of-two fraction of 360°,
+the same grid web-map tiles use, so clusters stay put while a client pans.
+"""
+import math
+from .farmer_query import FILTER_FIELDS
+
+LOCATION_FIELD = "location"
+LATITUDE_FIELD, LONGITUDE_FIELD = "gps_latitude", "gps_longitude"
+MAX_POINTS = 2000
+# cluster cells per tile side / per bbox width
+TILE_GRID = 8
+DEFAULT_BBOX_GRID = 32
+MAX_ZOOM = 20
+# one $geoWithin polygon must stay well inside a hemisphere; wider boxes are split
+MAX_POLYGON_WIDTH = 90.0
+# vertex spacing along lines of latitude (polygon edges are geodesics, not parallels)
+EDGE_STEP_DEGREES = 1.0
+MERCATOR_MAX_LAT = 85.05112878
+POINT_PROJECTION = {
+    "farmer_id": 1, LOCATION_FIELD: 1, "registration_status": 1,
+    "personal_info.first_name": 1, "personal_info.last_name": 1,
+}
+
+
+def point(lat: float, lon: float) -> dict:
+    return {"type": "Point", "coordinates": [lon, lat]}
+
+
+def _coordinate(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def location_of(doc: dict) -> dict | None:
+    """GeoJSON point for a farmer document's address, or None without usable GPS."""
+    address = doc.get("address") or {}
+    lat, lon = _coordinate(address.get(LATITUDE_FIELD)), _coordinate(address.get(LONGITUDE_FIELD))
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    if lat == 0 and lon == 0:  # unset GPS on some tablets
+        return None
+    return point(lat, lon)
+
+
+def parse_bbox(bbox: str) -> tuple:
+    """
+    "min_lon,min_lat,max_lon,max_lat" -> floats; ValueError when malformed. Latitudes
+    are clamped to the web-map range: at the poles every vertex of a parallel edge is
+    the same point, and MongoDB rejects a polygon with duplicate vertices.
+    """
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    if not (-180 <= min_lon < max_lon <= 180 and -90 <= min_lat < max_lat <= 90):
+        raise ValueError("bbox corners are out of range or in the wrong order")
+    min_lat, max_lat = max(min_lat, -MERCATOR_MAX_LAT), min(max_lat, MERCATOR_MAX_LAT)
+    if min_lat >= max_lat:
+        raise ValueError(f"bbox must overlap latitudes -{MERCATOR_MAX_LAT}..{MERCATOR_MAX_LAT}")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def tile_bbox(z: int, x: int, y: int) -> tuple:
+    """Bounds of web-map (slippy / XYZ) tile z/x/y; ValueError for tiles that do not exist."""
+    n = 1 << z
+    if not (0 <= x < n and 0 <= y < n):
+        raise ValueError(f"Tile {z}/{x}/{y} does not exist")
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def _edge(lon_from: float, lon_to: float, lat: float) -> list:
+    steps = max(1, math.ceil(abs(lon_to - lon_from) / EDGE_STEP_DEGREES))
+    return [[lon_from + (lon_to - lon_from) * i / steps, lat] for i in range(steps)]
+
+
+def _polygon(min_lon, min_lat, max_lon, max_lat) -> dict:
+    ring = _edge(min_lon, max_lon, min_lat) + _edge(max_lon, min_lon, max_lat)
+    ring.append(ring[0])
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def within_filter(bbox: tuple) -> dict:
+    """Index-backed $geoWithin filter for a lon/lat box."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    pieces = max(1, math.ceil((max_lon - min_lon) / MAX_POLYGON_WIDTH))
+    width = (max_lon - min_lon) / pieces
+    clauses = [
+        {LOCATION_FIELD: {"$geoWithin": {"$geometry": _polygon(
+            min_lon + i * width, min_lat, min_lon + (i + 1) * width, max_lat)}}}
+        for i in range(pieces)
+    ]
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def _filters(filters: dict) -> dict:
+    return {FILTER_FIELDS[name]: value for name, value in filters.items() if value is not None}
+
+
+def points_query(bbox: tuple, **filters) -> dict:
+    return {**within_filter(bbox), **_filters(filters)}
+
+
+def cell_size(width: float, grid: int) -> float:
+    """Grid cell in degrees: the power-of-two fraction of 360° closest to width / grid."""
+    return 360 / 2 ** max(0, round(math.log2(360 * grid / width)))
+
+
+def near_pipeline(lat: float, lon: float, max_distance_m: float, limit: int, **filters) -> list:
+    """Nearest farmers first, each with distance_m (metres on the sphere)."""
+    return [
+        {"$geoNear": {
+            "near": point(lat, lon),
+            "key": LOCATION_FIELD,
+            "distanceField": "distance_m",
+            "maxDistance": max_distance_m,
+            "spherical": True,
+            "query": _filters(filters),
+        }},
+        {"$limit": limit},
+        {"$project": {**POINT_PROJECTION, "distance_m": 1}},
+    ]
+
+
+def cluster_pipeline(bbox: tuple, cell: float, **filters) -> list:
+    """One row per occupied grid cell: count, mean position and, for single farmers, farmer_id."""
+    coords = f"${LOCATION_FIELD}.coordinates"
+    lon, lat = {"$arrayElemAt": [coords, 0]}, {"$arrayElemAt": [coords, 1]}
+    return [
+        {"$match": points_query(bbox, **filters)},
+        {"$project": {"farmer_id": 1, "lon": lon, "lat": lat}},
+        {"$group": {
+            "_id": {
+                "x": {"$floor": {"$divide": [{"$add": ["$lon", 180]}, cell]}},
+                "y": {"$floor": {"$divide": [{"$add": ["$lat", 90]}, cell]}},
+            },
+            "count": {"$sum": 1},
+            "lon": {"$avg": "$lon"},
+            "lat": {"$avg": "$lat"},
+            "farmer_id": {"$first": "$farmer_id"},
+        }},
+        {"$sort": {"count": -1}},
+    ]
+
+
+def clusters_body(rows: list, cell: float) -> dict:
+    clusters = []
+    for row in rows:
+        cluster = {"lon": row["lon"], "lat": row["lat"], "count": row["count"]}
+        if row["count"] == 1:
+            cluster["farmer_id"] = row["farmer_id"]
+        clusters.append(cluster)
+    return {
+        "mode": "clusters",
+        "cell_degrees": cell,
+        "count": sum(c["count"] for c in clusters),
+        "clusters": clusters,
+    }
+
+
+def points_body(docs: list) -> dict:
+    return {"mode": "points", "count": len(docs), "results": docs}
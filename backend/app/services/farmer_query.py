@@ -0,0 +1,80 @@
+import base64
+import json
+import re
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# Keyset order for listings: newest first, _id breaks ties between equal timestamps
+LIST_SORT = [("created_at", -1), ("_id", -1)]
+# never sent to clients, not even on the detail endpoint or through `fields`
+NEVER_SENT_FIELDS = ("nrc_encrypted", "nrc_hash", "search_keys", "sync_fingerprint")
+DETAIL_PROJECTION = {name: 0 for name in NEVER_SENT_FIELDS}
+# Never sent unless explicitly requested through `fields`
+DEFAULT_EXCLUDED_FIELDS = NEVER_SENT_FIELDS + ("identification_documents",)
+FILTER_FIELDS = {
+    "province": "address.province",
+    "district": "address.district",
+    "registration_status": "registration_status",
+}
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+
+def build_filter(**filters) -> dict:
+    """Map query parameters (province, district, registration_status) onto document paths."""
+    return {FILTER_FIELDS[name]: value for name, value in filters.items() if value is not None}
+
+
+def parse_fields(fields: str) -> list[str]:
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    invalid = [n for n in names if not FIELD_NAME.match(n)]
+    if invalid:
+        raise ValueError(f"Invalid field names: {invalid}")
+    hidden = [n for n in names if n.split(".", 1)[0] in NEVER_SENT_FIELDS]
+    if hidden:
+        raise ValueError(f"Fields not available: {hidden}")
+    return names
+
+
+def build_projection(fields: str | None) -> dict:
+    """
+    `fields` is a comma-separated list of document paths, e.g. "farmer_id,personal_info".
+    Without it, heavy / sensitive fields are excluded. The keyset fields are always returned.
+    """
+    if not fields:
+        return {name: 0 for name in DEFAULT_EXCLUDED_FIELDS}
+    projection = {name: 1 for name in parse_fields(fields)}
+    projection.update({"_id": 1, "created_at": 1})
+    return projection
+
+
+def encode_cursor(doc: dict) -> str:
+    created_at = doc.get("created_at")
+    raw = json.dumps({
+        "t": created_at.isoformat() if created_at else None,
+        "i": str(doc["_id"]),
+    }, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = datetime.fromisoformat(data["t"]) if data["t"] else None
+        return created_at, ObjectId(data["i"])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def keyset_filter(cursor: str) -> dict:
+    """Documents strictly after `cursor` in LIST_SORT order."""
+    created_at, _id = decode_cursor(cursor)
+    if created_at is None:
+        # documents without created_at sort last; only _id orders them
+        return {"created_at": None, "_id": {"$lt": _id}}
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "_id": {"$lt": _id}},
+        {"created_at": None},
+    ]}
@@ -0,0 +1,188 @@
+"""
+Fuzzy farmer lookup by name, phone and district.
+
+Every farmer stores `search_keys`, a multikey-indexed array of normalised tokens:
+
+    w:<word>          whole name / district words          ("w:banda")
+    x:<prefix>        1-3 letter prefixes of name words    ("x:b", "x:ba", "x:ban")
+    t:<trigram>       name trigrams, words padded with $   ("t:$ba", "t:ban", ...)
+    p:<digits>        phone suffixes of 4..9 digits        ("p:3456", ..., "p:977123456")
+    f:<farmer_id>     exact farmer id
+    b:<district>:...  duplicate-detection blocks: district + first name + last initial,
+                      and district + first initial + last name
+
+A search selects farmers through the index on its selective keys only (words, ids,
+phone suffixes, 2-3 letter prefixes) and ranks at most MAX_SEARCH_CANDIDATES of them
+by weighted overlap of all its keys: trigrams and 1-letter prefixes are shared by a
+large part of the registry, so they only score. Sync uses the block keys to pull
+the few farmers a new record could duplicate and compares name trigrams.
+"""
+import re
+import unicodedata
+from .farmer_query import DEFAULT_EXCLUDED_FIELDS, FILTER_FIELDS
+
+SEARCH_FIELD = "search_keys"
+WEIGHTS = {"f": 10, "p": 5, "w": 3, "x": 2, "t": 1}
+PHONE_SUFFIXES = range(4, 10)   # 9 digits = national number without the 0 / +260 prefix
+DUPLICATE_MIN_SIMILARITY = 0.6  # Dice coefficient of name trigrams
+# blocks holding more farmers than this are too common to say anything (and too costly to compare)
+MAX_BLOCK_CANDIDATES = 200
+MAX_QUERY_TOKENS = 8
+# farmers scored per search; bounds the $addFields/$sort work for very common words
+MAX_SEARCH_CANDIDATES = 5000
+MATCH_KINDS = ("f", "p", "w")
+NON_ALNUM = re.compile(r"[^a-z0-9]+")
+PHONE_PUNCTUATION = re.compile(r"[\s+\-().]")
+# never returned by the search endpoint
+RESULT_PROJECTION = {name: 0 for name in DEFAULT_EXCLUDED_FIELDS}
+
+
+def normalize(text) -> list[str]:
+    """Lowercase ASCII words: accents stripped, punctuation and spaces collapsed."""
+    if not isinstance(text, str):
+        return []
+    ascii_text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    return [w for w in NON_ALNUM.split(ascii_text) if w]
+
+
+def trigrams(word: str) -> list[str]:
+    padded = f"${word}$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def _digits(phone) -> str:
+    return re.sub(r"\D", "", phone) if isinstance(phone, str) else ""
+
+
+def _names(doc: dict) -> tuple[list[str], list[str]]:
+    personal = doc.get("personal_info") or {}
+    return normalize(personal.get("first_name")), normalize(personal.get("last_name"))
+
+
+def search_keys(doc: dict, farmer_id: str | None = None) -> list[str]:
+    first, last = _names(doc)
+    address = doc.get("address") or {}
+    district = "".join(normalize(address.get("district")))
+    keys = set()
+    for word in first + last:
+        keys.add(f"w:{word}")
+        keys.update(f"x:{word[:n]}" for n in range(1, min(3, len(word)) + 1))
+        keys.update(f"t:{gram}" for gram in trigrams(word))
+    keys.update(f"w:{word}" for word in normalize(address.get("district")))
+    digits = _digits((doc.get("personal_info") or {}).get("phone_primary"))
+    keys.update(f"p:{digits[-n:]}" for n in PHONE_SUFFIXES if len(digits) >= n)
+    farmer_id = farmer_id or doc.get("farmer_id")
+    if farmer_id:
+        keys.add(f"f:{farmer_id.lower()}")
+    first_name, last_name = "".join(first), "".join(last)
+    if district and first_name and last_name:
+        # a typo has to leave one of the two names intact to share a block
+        keys.add(f"b:{district}:{first_name}:{last_name[0]}")
+        keys.add(f"b:{district}:{first_name[0]}:{last_name}")
+    return sorted(keys)
+
+
+def query_keys(q: str) -> dict:
+    """Keys per kind for a free-text query, e.g. "bob yy 0977123456"."""
+    keys = {kind: set() for kind in WEIGHTS}
+    phone = PHONE_PUNCTUATION.sub("", q or "")
+    tokens = [phone] if phone.isdigit() else normalize(q)  # "+260 977 123 456" is one number
+    for token in tokens[:MAX_QUERY_TOKENS]:
+        if token.isdigit():
+            if len(token) >= PHONE_SUFFIXES.start:
+                keys["p"].add(f"p:{token[-(PHONE_SUFFIXES.stop - 1):]}")
+            continue
+        keys["f"].add(f"f:{token}")
+        keys["w"].add(f"w:{token}")
+        keys["x"].add(f"x:{token[:3]}")
+        if len(token) <= 2:
+            keys["x"].add(f"x:{token[0]}")  # short tokens are often initials: "yy" ~ "Y."
+        keys["t"].update(f"t:{gram}" for gram in trigrams(token))
+    return {kind: sorted(values) for kind, values in keys.items() if values}
+
+
+def search_pipeline(q: str, limit: int, **filters) -> list | None:
+    """Aggregation ranking farmers by weighted key overlap; None if q has no usable token."""
+    keys = query_keys(q)
+    if not keys:
+        return None
+    prefixes = keys.get("x", [])
+    # "x:ba", "x:ban"; only a query of single letters ("b k") selects on 1-letter prefixes
+    prefixes = [k for k in prefixes if len(k) > 3] or prefixes
+    match = {SEARCH_FIELD: {"$in": [k for kind in MATCH_KINDS for k in keys.get(kind, ())] + prefixes}}
+    match.update({FILTER_FIELDS[name]: value for name, value in filters.items() if value is not None})
+    score = {"$add": [
+        {"$multiply": [WEIGHTS[kind], {"$size": {"$filter": {
+            "input": f"${SEARCH_FIELD}", "as": "key", "cond": {"$in": ["$$key", values]},
+        }}}]}
+        for kind, values in keys.items()
+    ]}
+    return [
+        {"$match": match},
+        {"$limit": MAX_SEARCH_CANDIDATES},
+        {"$addFields": {"score": score}},
+        {"$sort": {"score": -1, "created_at": -1, "_id": -1}},
+        {"$limit": limit},
+        {"$project": RESULT_PROJECTION},
+    ]
+
+
+def _name_grams(keys) -> set:
+    return {k for k in keys if k.startswith("t:")}
+
+
+def similarity(keys_a, keys_b) -> float:
+    a, b = _name_grams(keys_a), _name_grams(keys_b)
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+def block_keys(keys) -> list[str]:
+    return [k for k in keys if k.startswith("b:")]
+
+
+def block_sizes_pipeline(blocks: list) -> list:
+    """Farmers in each of `blocks`, counted on the server: [{"_id": block, "n": count}]."""
+    return [
+        {"$match": {SEARCH_FIELD: {"$in": blocks}}},
+        {"$project": {"_id": 0, "block": {"$filter": {"input": f"${SEARCH_FIELD}",
+                                                      "cond": {"$in": ["$$this", blocks]}}}}},
+        {"$unwind": "$block"},
+        {"$group": {"_id": "$block", "n": {"$sum": 1}}},
+    ]
+
+
+def possible_duplicates(new_docs: list, candidates: list, oversized=()) -> dict:
+    """
+    For each new doc (with `_id`, `farmer_id`, `search_keys`), the farmer_ids of
+    candidates sharing a block key whose names are similar. New docs are also
+    compared with the ones before them, for duplicates within one batch. Blocks in
+    `oversized` were too large to fetch and are skipped like any other large block.
+    """
+    by_block = {}
+    grams = {}
+    for doc in candidates:
+        grams[doc["_id"]] = _name_grams(doc.get(SEARCH_FIELD) or ())
+        for key in block_keys(doc.get(SEARCH_FIELD) or ()):
+            by_block.setdefault(key, []).append(doc)
+
+    flagged = {}
+    for doc in new_docs:
+        keys = doc.get(SEARCH_FIELD) or ()
+        mine = grams[doc["_id"]] = _name_grams(keys)
+        seen, matches = {doc["_id"]}, []
+        for block in block_keys(keys):
+            members = by_block.get(block, ())
+            if block in oversized or len(members) > MAX_BLOCK_CANDIDATES:
+                continue
+            for other in members:
+                if other["_id"] in seen:
+                    continue
+                seen.add(other["_id"])
+                theirs = grams[other["_id"]]
+                if mine and theirs and 2 * len(mine & theirs) / (len(mine) + len(theirs)) >= DUPLICATE_MIN_SIMILARITY:
+                    matches.append(other["farmer_id"])
+        if matches:
+            flagged[doc["_id"]] = matches
+        for block in block_keys(keys):
+            by_block.setdefault(block, []).append(doc)
+    return flagged
@@ -1,44 +1,90 @@
 import re
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from fastapi import HTTPException
-from ..utils.crypto_utils import encrypt_deterministic, hmac_hash
+from ..utils.crypto_utils import get_keyring
 
 ZAMBIA_LAT_RANGE = (-18.0, -8.0)
 ZAMBIA_LON_RANGE = (21.0, 34.0)
 NRC_PATTERN = re.compile(r"^\d{6}/\d{2}/\d$")
+ISO_DATE_PATTERN = re.compile(r"([0-9]{4})-([0-9]{2})-([0-9]{2})")
+PHONE_PREFIX = "+260"
+MIN_AGE_YEARS = 18
+# age is counted as whole 365-day years since date_of_birth
+MIN_AGE_DAYS = MIN_AGE_YEARS * 365
+
+
+def _parse_dob(value):
+    """date for a YYYY-MM-DD string, None if unparseable (same inputs strptime accepts)."""
+    if not isinstance(value, str):
+        return None
+    match = ISO_DATE_PATTERN.fullmatch(value)
+    try:
+        if match:
+            return date(*map(int, match.groups()))
+        return datetime.strptime(value, "%Y-%m-%d").date()  # e.g. unpadded "1990-1-5"
+    except ValueError:
+        return None
+
 
 class FarmerService:
     @staticmethod
-    def validate_farmer_data(data: dict):
-        errors = []
+    def validate_batch(records: list, now: datetime | None = None) -> dict:
+        """
+        Validate many farmer dicts at once, one column per check.
+        Returns {record index: [error messages]} for invalid records only; never raises.
+        """
+        now = now or datetime.utcnow()
+        latest_dob = (now - timedelta(days=MIN_AGE_DAYS)).date()
+        lat_min, lat_max = ZAMBIA_LAT_RANGE
+        lon_min, lon_max = ZAMBIA_LON_RANGE
+        nrc_match = NRC_PATTERN.match
 
-        personal = data.get("personal_info", {})
-        address = data.get("address", {})
-        nrc = data.get("nrc_number")
-        dob = personal.get("date_of_birth")
-        phone = personal.get("phone_primary")
+        personals = [r.get("personal_info") or {} for r in records]
+        addresses = [r.get("address") or {} for r in records]
+        errors = {}
 
-        if nrc and not NRC_PATTERN.match(nrc):
-            errors.append("Invalid NRC format, expected ######/##/#")
+        def fail(i, message):
+            errors.setdefault(i, []).append(message)
 
-        if dob:
+        for i, record in enumerate(records):
+            nrc = record.get("nrc_number")
+            if nrc and not (isinstance(nrc, str) and nrc_match(nrc)):
+                fail(i, "Invalid NRC format, expected ######/##/#")
+
+        dobs = [p.get("date_of_birth") for p in personals]
+        # parse each distinct value once; tablets often repeat placeholder dates
+        parsed = {value: _parse_dob(value) for value in set(d for d in dobs if d and isinstance(d, str))}
+        for i, dob in enumerate(dobs):
+            if not dob:
+                continue
+            born = parsed.get(dob) if isinstance(dob, str) else None
+            if born is None:
+                fail(i, "Invalid date_of_birth format (YYYY-MM-DD)")
+            elif born > latest_dob:
+                fail(i, f"Farmer must be at least {MIN_AGE_YEARS} years old")
+
+        for i, address in enumerate(addresses):
+            lat, lon = address.get("gps_latitude"), address.get("gps_longitude")
+            if not (lat and lon):
+                continue
             try:
-                age = (datetime.utcnow() - datetime.strptime(dob, "%Y-%m-%d")).days // 365
-                if age < 18:
-                    errors.append("Farmer must be at least 18 years old")
-            except ValueError:
-                errors.append("Invalid date_of_birth format (YYYY-MM-DD)")
-
-        lat, lon = address.get("gps_latitude"), address.get("gps_longitude")
-        if lat and lon:
-            if not (ZAMBIA_LAT_RANGE[0] <= lat <= ZAMBIA_LAT_RANGE[1]):
-                errors.append("Latitude out of Zambia bounds")
-            if not (ZAMBIA_LON_RANGE[0] <= lon <= ZAMBIA_LON_RANGE[1]):
-                errors.append("Longitude out of Zambia bounds")
-
-        if not phone or not phone.startswith("+260"):
-            errors.append("Phone must start with country code +260")
+                if not (lat_min <= lat <= lat_max):
+                    fail(i, "Latitude out of Zambia bounds")
+                if not (lon_min <= lon <= lon_max):
+                    fail(i, "Longitude out of Zambia bounds")
+            except TypeError:
+                fail(i, "GPS coordinates must be numbers")
+
+        for i, personal in enumerate(personals):
+            phone = personal.get("phone_primary")
+            if not phone or not isinstance(phone, str) or not phone.startswith(PHONE_PREFIX):
+                fail(i, "Phone must start with country code +260")
 
+        return errors
+
+    @staticmethod
+    def validate_farmer_data(data: dict):
+        errors = FarmerService.validate_batch([data]).get(0)
         if errors:
             raise HTTPException(status_code=400, detail={"message": "Validation failed", "errors": errors})
 
@@ -46,9 +92,29 @@ class FarmerService:
 
     @staticmethod
     def encrypt_sensitive_fields(farmer: dict):
-        if farmer.get("nrc_number"):
-            val = farmer["nrc_number"]
-            farmer["nrc_encrypted"] = encrypt_deterministic(val)
-            farmer["nrc_hash"] = hmac_hash(val)
-            farmer.pop("nrc_number", None)
+        FarmerService.encrypt_sensitive_batch([farmer])
         return farmer
+
+    @staticmethod
+    def encrypt_sensitive_batch(farmers: list) -> list:
+        """
+        Replace nrc_number with nrc_encrypted + nrc_hash on every record, in place.
+        Returns, per record, the nrc_hash values an existing farmer with the same NRC
+        may carry (active key first, then older keys), or () when there is no NRC.
+        """
+        keyring = get_keyring()
+        nrcs = [f.get("nrc_number") or None for f in farmers]
+        present = [n for n in nrcs if n is not None]
+        encrypted = iter(keyring.encrypt_batch(present))
+        hashes = iter(keyring.hash_candidates_batch(present))
+        candidates = []
+        for farmer, nrc in zip(farmers, nrcs):
+            if nrc is None:
+                candidates.append(())
+                continue
+            lookup = next(hashes)
+            farmer["nrc_encrypted"] = next(encrypted)
+            farmer["nrc_hash"] = lookup[0]
+            farmer.pop("nrc_number", None)
+            candidates.append(lookup)
+        return candidates
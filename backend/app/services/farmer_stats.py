@@ -0,0 +1,115 @@
+"""
+Registry counts per (province, district, registration_status), kept in the
+`farmer_stats` collection so dashboards read a few hundred small documents instead
+of scanning every farmer:
+
+    {"_id": {"province": ..., "district": ..., "registration_status": ...}, "count": n}
+
+Writers apply +1/-1 deltas as farmers are created, moved between buckets or
+deleted; rebuild_farmer_stats (Celery beat) periodically recomputes the whole
+collection with an aggregation to repair any drift (e.g. increments lost while a
+rebuild's $out was replacing the collection, or writes made outside the API).
+"""
+from collections import Counter
+from pymongo import UpdateOne
+from .farmer_query import FILTER_FIELDS
+
+STATS_COLLECTION = "farmer_stats"
+# bucket name -> document path; key order is part of the bucket _id, keep it fixed
+BUCKET_FIELDS = dict(FILTER_FIELDS)
+BUCKET_PROJECTION = {path: 1 for path in BUCKET_FIELDS.values()}
+UNKNOWN = "unknown"
+
+
+def _lookup(doc: dict, path: str):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def bucket_of(doc: dict) -> tuple:
+    return tuple(_lookup(doc, path) for path in BUCKET_FIELDS.values())
+
+
+def bucket_after_set(bucket: tuple, fields: dict) -> tuple:
+    """The bucket a document in `bucket` moves to when `{"$set": fields}` is applied."""
+    values = list(bucket)
+    for i, path in enumerate(BUCKET_FIELDS.values()):
+        for key, value in fields.items():
+            if key == path:
+                values[i] = value
+            elif path.startswith(key + "."):
+                values[i] = _lookup(value, path[len(key) + 1:]) if isinstance(value, dict) else None
+    return tuple(values)
+
+
+def moved(before: tuple | None, after: tuple | None) -> Counter:
+    """Deltas for one farmer going from `before` to `after` (None = did not exist)."""
+    deltas = Counter()
+    if before != after:
+        if before is not None:
+            deltas[before] -= 1
+        if after is not None:
+            deltas[after] += 1
+    return deltas
+
+
+def _ops(deltas: Counter) -> list:
+    return [
+        UpdateOne({"_id": dict(zip(BUCKET_FIELDS, bucket))}, {"$inc": {"count": n}}, upsert=True)
+        for bucket, n in deltas.items() if n
+    ]
+
+
+async def apply_deltas(db, deltas: Counter):
+    ops = _ops(deltas)
+    if ops:
+        await db[STATS_COLLECTION].bulk_write(ops, ordered=False)
+
+
+def apply_deltas_sync(db, deltas: Counter):
+    ops = _ops(deltas)
+    if ops:
+        db[STATS_COLLECTION].bulk_write(ops, ordered=False)
+
+
+def rebuild_pipeline() -> list:
+    return [
+        {"$group": {
+            # $ifNull: missing fields group as null, exactly like the incremental path
+            "_id": {name: {"$ifNull": [f"${path}", None]} for name, path in BUCKET_FIELDS.items()},
+            "count": {"$sum": 1},
+        }},
+        {"$out": STATS_COLLECTION},
+    ]
+
+
+def summarize(buckets: list, **filters) -> dict:
+    """Response body of GET /api/farmers/stats from the raw bucket documents."""
+    wanted = {name: value for name, value in filters.items() if value is not None}
+    rows = []
+    for doc in buckets:
+        row = {**doc["_id"], "count": doc.get("count", 0)}
+        if row["count"] > 0 and all(row.get(name) == value for name, value in wanted.items()):
+            rows.append(row)
+
+    by_province, by_status, by_district = Counter(), Counter(), Counter()
+    for row in rows:
+        province = row.get("province") or UNKNOWN
+        by_province[province] += row["count"]
+        by_status[row.get("registration_status") or UNKNOWN] += row["count"]
+        by_district[(province, row.get("district") or UNKNOWN)] += row["count"]
+
+    return {
+        "total": sum(by_province.values()),
+        "by_province": dict(by_province.most_common()),
+        "by_status": dict(by_status.most_common()),
+        "by_district": [
+            {"province": province, "district": district, "count": count}
+            for (province, district), count in by_district.most_common()
+        ],
+        "buckets": sorted(rows, key=lambda r: -r["count"]),
+    }
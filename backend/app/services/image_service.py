@@ -0,0 +1,81 @@
+import os
+import tempfile
+from pathlib import Path
+
+# name -> (max width, max height, square crop). "card" matches the 25 mm photo
+# box on the ID card at ~300 dpi; "thumb" is for dashboard list views.
+PHOTO_DERIVATIVES = {
+    "full": (1600, 1600, False),
+    "card": (300, 300, True),
+    "thumb": (256, 256, False),
+}
+JPEG_QUALITY = 85
+# Checked on the header size, before any pixel is decoded. JPEGs are decoded at a
+# reduced scale (draft), so they may be larger; other formats decode in full.
+MAX_JPEG_PIXELS = 50_000_000
+MAX_DECODED_PIXELS = 16_000_000
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def content_dir(root: Path, sha256: str) -> Path:
+    """Content-addressed location: <root>/<first two hex chars>/<sha256>/"""
+    return root / sha256[:2] / sha256
+
+
+def derivative_paths(directory: Path) -> dict:
+    return {name: directory / f"{name}.jpg" for name in PHOTO_DERIVATIVES}
+
+
+def _save_jpeg(img, dest: Path):
+    fd, tmp_path = tempfile.mkstemp(dir=dest.parent, prefix=".derivative-", suffix=".jpg")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            # no exif= argument: metadata (GPS, device, ...) is not carried over
+            img.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def generate_photo_derivatives(src: Path, directory: Path) -> dict:
+    """
+    Write normalised, EXIF-free JPEG derivatives of `src` into `directory`.
+    Blocking (Pillow); call it from the threadpool. Existing derivatives are
+    reused, which is what makes identical uploads free.
+    """
+    paths = derivative_paths(directory)
+    if all(p.exists() for p in paths.values()):
+        return paths
+
+    # imported here so the API process only loads Pillow when a photo arrives
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(src) as img:
+            limit = MAX_JPEG_PIXELS if img.format == "JPEG" else MAX_DECODED_PIXELS
+            if img.width * img.height > limit:
+                raise InvalidImage(f"Image too large: {img.width}x{img.height} pixels")
+            img.draft("RGB", (PHOTO_DERIVATIVES["full"][0], PHOTO_DERIVATIVES["full"][1]))
+            img = ImageOps.exif_transpose(img).convert("RGB")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise InvalidImage(str(e))
+
+    directory.mkdir(parents=True, exist_ok=True)
+
+    # largest first, so each step downsizes an already smaller image
+    for name, (width, height, square) in PHOTO_DERIVATIVES.items():
+        if square:
+            derived = ImageOps.fit(img, (width, height), Image.LANCZOS)
+        else:
+            derived = img.copy()
+            derived.thumbnail((width, height), Image.LANCZOS)
+        _save_jpeg(derived, paths[name])
+        if not square:
+            img = derived
+    return paths
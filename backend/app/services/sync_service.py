@@ -0,0 +1,299 @@
+import uuid
+from collections import Counter
+from datetime import datetime
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from ..config import settings
+from . import farmer_changes, farmer_geo, farmer_search, farmer_stats
+from .farmer_service import FarmerService
+from ..utils.serialization import content_hash
+
+PHONE_KEY = "personal_info.phone_primary"
+# Deduplication priority: temp_id, then nrc_hash, then phone_primary; a key that
+# matches no farmer falls through to the next one the record carries
+DEDUP_KEYS = ("temp_id", "nrc_hash", PHONE_KEY)
+# hash of the sync record a farmer was last written from; cleared by API edits
+FINGERPRINT_FIELD = "sync_fingerprint"
+LOOKUP_PROJECTION = {"_id": 1, "farmer_id": 1, "temp_id": 1, "nrc_hash": 1, PHONE_KEY: 1, FINGERPRINT_FIELD: 1,
+                     **farmer_stats.BUCKET_PROJECTION}
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _dedup_queries(rec: dict, nrc_hashes: tuple = ()) -> list:
+    """
+    (key, values) per dedup key the record carries, in priority order.
+    An NRC matches on any of its hashes: current key, rotated-out keys, pre-keyring.
+    """
+    queries = []
+    if rec.get("temp_id"):
+        queries.append(("temp_id", (rec["temp_id"],)))
+    if rec.get("nrc_hash"):
+        # the same person registered again on another tablet (new temp_id); nrc_hash is unique
+        queries.append(("nrc_hash", nrc_hashes or (rec["nrc_hash"],)))
+    phone = rec.get("personal_info", {}).get("phone_primary")
+    if phone:
+        queries.append((PHONE_KEY, (phone,)))
+    return queries
+
+
+def _dedup_values(doc: dict, current: dict | None = None) -> dict:
+    """Dedup key values of `doc`, layered over `current` the way `$set` would apply."""
+    values = dict(current or {})
+    for field in ("farmer_id", "temp_id", "nrc_hash"):
+        if field in doc:
+            values[field] = doc[field]
+    if "personal_info" in doc:
+        values[PHONE_KEY] = (doc["personal_info"] or {}).get("phone_primary")
+    return values
+
+
+class _BatchIndex:
+    """
+    In-memory view of every farmer a batch can match, keyed like the dedup queries.
+    Keeps records later in the batch matching farmers created or updated earlier in it.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.keys = {key: {} for key in DEDUP_KEYS}
+        # stats bucket per _id: as stored before the batch, and after its writes
+        self.bucket_before = {}
+        self.bucket_after = {}
+        # stored sync_fingerprint of farmers loaded from Mongo
+        self.fingerprints = {}
+
+    def _link(self, _id, values: dict):
+        for key in DEDUP_KEYS:
+            value = values.get(key)
+            if value is not None:
+                ids = self.keys[key].setdefault(value, [])
+                if _id not in ids:
+                    ids.append(_id)
+
+    def add(self, doc: dict, existing: bool = False):
+        values = _dedup_values(doc, self.docs.get(doc["_id"]))
+        self.docs[doc["_id"]] = values
+        self._link(doc["_id"], values)
+        bucket = farmer_stats.bucket_of(doc)
+        if existing:
+            self.bucket_before.setdefault(doc["_id"], bucket)
+            self.fingerprints.setdefault(doc["_id"], doc.get(FINGERPRINT_FIELD))
+        self.bucket_after.setdefault(doc["_id"], bucket)
+
+    def update(self, _id, fields: dict):
+        values = _dedup_values(fields, self.docs[_id])
+        self.docs[_id] = values
+        self._link(_id, values)
+        self.bucket_after[_id] = farmer_stats.bucket_after_set(self.bucket_after[_id], fields)
+
+    def match(self, key: str, values, without_temp_id: bool = False):
+        for value in values:
+            for _id in self.keys[key].get(value, ()):
+                if self.docs[_id].get(key) == value and not (without_temp_id and self.docs[_id].get("temp_id")):
+                    return _id
+        return None
+
+    def find(self, rec: dict, queries: list):
+        """The farmer a record updates: first dedup key that matches, in priority order."""
+        for key, values in queries:
+            # family members share phones: a tablet record (temp_id) only takes over a
+            # phone match registered without one, e.g. through the API
+            target = self.match(key, values, without_temp_id=key == PHONE_KEY and bool(rec.get("temp_id")))
+            if target is not None:
+                return target
+        return None
+
+
+class SyncService:
+    @staticmethod
+    def _load_existing(farmers_coll, index: _BatchIndex, lookups: dict, chunk_size: int):
+        # one `$in` query per dedup key (per chunk) instead of one find_one per record
+        for key in DEDUP_KEYS:
+            values = list(lookups[key])
+            for chunk in _chunks(values, chunk_size):
+                for doc in farmers_coll.find({key: {"$in": chunk}}, LOOKUP_PROJECTION):
+                    index.add(doc, existing=True)
+
+    @staticmethod
+    def _set_derived_fields(rec: dict, farmer_id: str | None):
+        # sync records carry whole personal_info / address objects, so these can be rebuilt from rec
+        if "personal_info" in rec and "address" in rec:
+            rec[farmer_search.SEARCH_FIELD] = farmer_search.search_keys(rec, farmer_id)
+        if "address" in rec:
+            rec[farmer_geo.LOCATION_FIELD] = farmer_geo.location_of(rec)
+
+    @staticmethod
+    def _flag_duplicates(farmers_coll, pending: dict, out_results: list, chunk_size: int):
+        """
+        Mark farmers about to be created that look like an existing (or earlier in the
+        batch) farmer: same district and first or last name, similar full name. They are
+        still created; the flag is for an operator to review.
+        """
+        new_docs = [op["insert"] for op in pending.values() if op["insert"] is not None]
+        blocks = sorted({block for doc in new_docs
+                         for block in farmer_search.block_keys(doc.get(farmer_search.SEARCH_FIELD) or ())})
+        candidates, oversized = [], set()
+        for chunk in _chunks(blocks, chunk_size):
+            # count first, so the members of a block too common to compare are never fetched
+            sizes = farmers_coll.aggregate(farmer_search.block_sizes_pipeline(chunk))
+            oversized.update(size["_id"] for size in sizes if size["n"] > farmer_search.MAX_BLOCK_CANDIDATES)
+            wanted = [block for block in chunk if block not in oversized]
+            if wanted:
+                candidates += farmers_coll.find({farmer_search.SEARCH_FIELD: {"$in": wanted}},
+                                                {"farmer_id": 1, farmer_search.SEARCH_FIELD: 1})
+        for _id, farmer_ids in farmer_search.possible_duplicates(new_docs, candidates, oversized).items():
+            pending[_id]["insert"]["possible_duplicate_of"] = farmer_ids
+            for pos in pending[_id]["positions"]:
+                out_results[pos]["possible_duplicates"] = farmer_ids
+
+    @staticmethod
+    def process_batch(db, user_email: str, records: list, now: datetime | None = None,
+                      chunk_size: int | None = None, on_progress=None):
+        """
+        Deduplicate and upsert a batch of sync records with a handful of round trips.
+        Returns one result per record, in order: { temp_id, farmer_id, status, errors }
+        Created farmers that look like an existing one also get possible_duplicates: [farmer_id, ...].
+        A record identical to the one its farmer was last synced from is not written
+        again (status "unchanged").
+
+        on_progress(done, total, results) is called as results become final: once for
+        records rejected by validation, then after every bulk_write chunk.
+        """
+        farmers_coll = db.farmers
+        now = now or datetime.utcnow()
+        chunk_size = chunk_size or settings.SYNC_BULK_CHUNK_SIZE
+
+        out_results = []
+        prepared = []  # (result index, record, dedup queries)
+        lookups = {key: set() for key in DEDUP_KEYS}
+
+        invalid = FarmerService.validate_batch(records, now)
+        valid = [rec for i, rec in enumerate(records) if i not in invalid]
+        nrc_hashes = iter(FarmerService.encrypt_sensitive_batch(valid))
+        for rec in valid:
+            # over the keyed nrc_hash, never the plaintext NRC: an unkeyed hash of a
+            # record with a known rest could be brute-forced back to the NRC
+            rec[FINGERPRINT_FIELD] = content_hash({k: v for k, v in rec.items() if k != "nrc_encrypted"})
+        for i, rec in enumerate(records):
+            temp_id = rec.get("temp_id")
+            if i in invalid:
+                out_results.append({
+                    "temp_id": temp_id,
+                    "farmer_id": None,
+                    "status": "error",
+                    "errors": invalid[i]
+                })
+                continue
+
+            queries = _dedup_queries(rec, next(nrc_hashes))
+            for key, values in queries:
+                lookups[key].update(values)
+            prepared.append((len(out_results), rec, queries))
+            out_results.append(None)
+
+        total = len(out_results)
+        done = total - len(prepared)
+        if on_progress and done:
+            on_progress(done, total, [r for r in out_results if r is not None])
+
+        index = _BatchIndex()
+        SyncService._load_existing(farmers_coll, index, lookups, chunk_size)
+
+        # _id -> pending write; records hitting the same farmer collapse into one op,
+        # so unordered bulk execution cannot reorder dependent writes
+        pending = {}
+        unchanged = []
+        for pos, rec, queries in prepared:
+            temp_id = rec.get("temp_id")
+            target = index.find(rec, queries)
+
+            if target is not None and target not in pending \
+                    and index.fingerprints.get(target) == rec[FINGERPRINT_FIELD]:
+                # a replayed record: the farmer already holds exactly this
+                unchanged.append(pos)
+                out_results[pos] = {
+                    "temp_id": temp_id,
+                    "farmer_id": index.docs[target].get("farmer_id"),
+                    "status": "unchanged",
+                    "errors": []
+                }
+            elif target is not None:
+                rec["last_modified_by"] = user_email
+                farmer_id = index.docs[target].get("farmer_id")
+                SyncService._set_derived_fields(rec, farmer_id)
+                op = pending.setdefault(target, {"insert": None, "set": {}, "positions": []})
+                if op["insert"] is not None:
+                    op["insert"].update(rec)
+                else:
+                    op["set"].update(rec)
+                op["positions"].append(pos)
+                index.update(target, rec)
+                out_results[pos] = {
+                    "temp_id": temp_id,
+                    "farmer_id": farmer_id,
+                    "status": "updated",
+                    "errors": []
+                }
+            else:
+                rec["_id"] = ObjectId()
+                rec["farmer_id"] = rec.get("farmer_id") or ("ZM" + uuid.uuid4().hex[:8].upper())
+                rec["created_at"] = now
+                rec["created_by"] = user_email
+                SyncService._set_derived_fields(rec, rec["farmer_id"])
+                pending[rec["_id"]] = {"insert": rec, "set": None, "positions": [pos]}
+                index.add(rec)
+                out_results[pos] = {
+                    "temp_id": temp_id,
+                    "farmer_id": rec["farmer_id"],
+                    "status": "created",
+                    "errors": []
+                }
+
+        if on_progress and unchanged:
+            done += len(unchanged)
+            on_progress(done, total, [out_results[pos] for pos in unchanged])
+
+        SyncService._flag_duplicates(farmers_coll, pending, out_results, chunk_size)
+
+        writes = list(pending.items())
+        for chunk in _chunks(writes, chunk_size):
+            # sequence numbers are reserved right before the chunk is written, until it is (see farmer_changes)
+            failed = set()
+            with farmer_changes.reserve_sync(db, len(chunk)) as first_seq:
+                requests = []
+                for i, (_id, op) in enumerate(chunk):
+                    if op["insert"] is not None:
+                        requests.append(InsertOne({**op["insert"], **farmer_changes.stamp(first_seq + i)}))
+                    else:
+                        requests.append(UpdateOne({"_id": _id},
+                                                  {"$set": {**op["set"], **farmer_changes.stamp(first_seq + i)}}))
+                try:
+                    farmers_coll.bulk_write(requests, ordered=False)
+                except BulkWriteError as e:
+                    for err in e.details.get("writeErrors", []):
+                        _id, op = chunk[err["index"]]
+                        failed.add(_id)
+                        for pos in op["positions"]:
+                            out_results[pos] = {
+                                "temp_id": out_results[pos]["temp_id"],
+                                "farmer_id": None,
+                                "status": "error",
+                                "errors": [err.get("errmsg", "write failed")]
+                            }
+            # per chunk, so a retried batch (whose earlier chunks now match as updates) stays exact
+            stats_deltas = Counter()
+            for _id, _ in chunk:
+                if _id not in failed:
+                    stats_deltas.update(farmer_stats.moved(index.bucket_before.get(_id), index.bucket_after[_id]))
+            farmer_stats.apply_deltas_sync(db, stats_deltas)
+            if on_progress:
+                positions = [pos for _, op in chunk for pos in op["positions"]]
+                done += len(positions)
+                on_progress(done, total, [out_results[pos] for pos in sorted(positions)])
+
+        return out_results
@@ -1,15 +1,27 @@
 from celery import Celery
-import os
+from kombu import Queue
+from ..config import settings
 
 # Redis broker URL
-REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+REDIS_URL = settings.REDIS_URL
+
+# Task names. The API enqueues by name (celery_app.send_task) so it never imports
+# the task modules and their rendering / sync dependencies; workers load them
+# through `include`. scripts/bench_startup.py checks these stay registered.
+SYNC_BATCH_TASK = "app.tasks.sync_tasks.process_sync_batch"
+ID_CARD_TASK = "app.tasks.id_card_task.generate_id_card"
+ID_CARD_BATCH_TASK = "app.tasks.id_card_task.generate_id_cards_batch"
+# a batch's subtasks: it lists the farmers, then hands them to a chord of chunks
+ID_CARD_CHUNK_TASK = "app.tasks.id_card_task.render_id_card_chunk"
+ID_CARD_BATCH_DONE_TASK = "app.tasks.id_card_task.finish_id_cards_batch"
+STATS_REBUILD_TASK = "app.tasks.stats_tasks.rebuild_farmer_stats"
 
 # Celery app initialization
 celery_app = Celery(
     "farmer_sync",
     broker=REDIS_URL,
     backend=REDIS_URL,
-    include=["app.tasks.id_card_task"],  # 👈 Make sure your task is imported!
+    include=["app.tasks.id_card_task", "app.tasks.sync_tasks", "app.tasks.stats_tasks"],  # 👈 Make sure your task is imported!
 )
 
 # Configuration for reliability and compatibility
@@ -24,7 +36,66 @@ celery_app.conf.update(
     enable_utc=True,
 )
 
-# Optional: define routing if you ever expand
+# Periodic jobs (run `celery ... beat` alongside the workers)
+celery_app.conf.beat_schedule = {
+    "rebuild-farmer-stats": {
+        "task": STATS_REBUILD_TASK,
+        "schedule": settings.FARMER_STATS_REBUILD_SECONDS,
+    },
+}
+
+# Queues, one worker pool each (see app/tasks/worker_profiles.py), so a big card
+# batch can never sit in front of a tablet's sync:
+#   sync         latency sensitive, short tasks
+#   cards        ID-card rendering, single cards ahead of batches
+#   maintenance  scheduled rebuilds; also drains the pre-split "celery" queue
+SYNC_QUEUE, CARDS_QUEUE, MAINTENANCE_QUEUE, LEGACY_QUEUE = "sync", "cards", "maintenance", "celery"
+# Redis priorities: 0 is served first
+HIGH_PRIORITY, DEFAULT_PRIORITY, LOW_PRIORITY = 0, 5, 9
+
+celery_app.conf.task_queues = [Queue(name) for name in (SYNC_QUEUE, CARDS_QUEUE, MAINTENANCE_QUEUE, LEGACY_QUEUE)]
+celery_app.conf.task_default_queue = SYNC_QUEUE
+celery_app.conf.task_default_priority = DEFAULT_PRIORITY
+celery_app.conf.broker_transport_options = {
+    "priority_steps": list(range(10)),
+    "sep": ":",
+    "queue_order_strategy": "priority",
+}
+
 celery_app.conf.task_routes = {
-    "app.tasks.id_card_task.generate_id_card": {"queue": "celery"},
+    SYNC_BATCH_TASK: {"queue": SYNC_QUEUE, "priority": HIGH_PRIORITY},
+    ID_CARD_TASK: {"queue": CARDS_QUEUE, "priority": HIGH_PRIORITY},
+    ID_CARD_BATCH_TASK: {"queue": CARDS_QUEUE, "priority": LOW_PRIORITY},
+    ID_CARD_CHUNK_TASK: {"queue": CARDS_QUEUE, "priority": LOW_PRIORITY},
+    ID_CARD_BATCH_DONE_TASK: {"queue": CARDS_QUEUE, "priority": HIGH_PRIORITY},
+    STATS_REBUILD_TASK: {"queue": MAINTENANCE_QUEUE, "priority": LOW_PRIORITY},
+}
+
+# Per-task limits: the soft limit raises SoftTimeLimitExceeded inside the task, the
+# hard one kills the worker child if the task ignores it.
+celery_app.conf.task_annotations = {
+    SYNC_BATCH_TASK: {
+        "soft_time_limit": settings.SYNC_TASK_SOFT_TIME_LIMIT,
+        "time_limit": settings.SYNC_TASK_TIME_LIMIT,
+    },
+    ID_CARD_TASK: {
+        "soft_time_limit": settings.ID_CARD_TASK_SOFT_TIME_LIMIT,
+        "time_limit": settings.ID_CARD_TASK_TIME_LIMIT,
+    },
+    ID_CARD_BATCH_TASK: {
+        "soft_time_limit": settings.ID_CARD_BATCH_SOFT_TIME_LIMIT,
+        "time_limit": settings.ID_CARD_BATCH_TIME_LIMIT,
+    },
+    ID_CARD_CHUNK_TASK: {
+        "soft_time_limit": settings.ID_CARD_CHUNK_SOFT_TIME_LIMIT,
+        "time_limit": settings.ID_CARD_CHUNK_TIME_LIMIT,
+    },
+    STATS_REBUILD_TASK: {
+        "soft_time_limit": settings.MAINTENANCE_TASK_SOFT_TIME_LIMIT,
+        "time_limit": settings.MAINTENANCE_TASK_TIME_LIMIT,
+    },
 }
+
+# queue wait / run time / throughput hooks (publisher and worker side); imported
+# last because it needs the task names above
+from . import task_metrics  # noqa: E402,F401
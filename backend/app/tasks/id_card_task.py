@@ -1,67 +1,246 @@
-from celery import shared_task
+from celery import chord, shared_task
+from celery.exceptions import SoftTimeLimitExceeded
 from fpdf import FPDF
 import qrcode
-from PIL import Image
 from datetime import datetime
+import io
 import os
-from app.database import get_database
-from PIL import Image
+from pymongo import UpdateOne
+from app.config import settings
+from app.services import farmer_cache, farmer_changes, farmer_query
+from app.tasks.worker_db import get_db_sync
+from app.utils.redis_client import get_redis
 
-UPLOAD_DIR = "/app/uploads/idcards"
-QR_DIR = "/app/uploads/qr"
+UPLOAD_DIR = settings.ID_CARD_DIR
+SHEET_DIR = os.path.join(UPLOAD_DIR, "sheets")
 
-@shared_task
-def generate_id_card(farmer_id: str):
-    import asyncio
-    db = get_database()
+# Card template (mm). Sheets lay cards out 2 x 4 on A4 portrait.
+CARD_W, CARD_H = 90, 60
+A4_W, A4_H = 210, 297
+SHEET_COLS, SHEET_ROWS = 2, 4
+CARDS_PER_SHEET = SHEET_COLS * SHEET_ROWS
+SHEET_MARGIN_X = (A4_W - SHEET_COLS * CARD_W) / 2
+SHEET_MARGIN_Y = (A4_H - SHEET_ROWS * CARD_H) / 2
+# Farmers per render_id_card_chunk task; a multiple of CARDS_PER_SHEET so every
+# chunk fills whole sheets.
+RENDER_CHUNK = CARDS_PER_SHEET * 6
+QR_BOX_SIZE = 6
+QR_MASK_PATTERN = 0
 
-    loop = asyncio.get_event_loop()
-    farmer = loop.run_until_complete(db.farmers.find_one({"farmer_id": farmer_id}))
-    if not farmer:
-        return {"error": "Farmer not found"}
+FARMER_CARD_PROJECTION = {
+    "farmer_id": 1,
+    "personal_info.first_name": 1,
+    "personal_info.last_name": 1,
+    "photo_path": 1,
+    "photo_card_path": 1,
+}
+# running count of a batch's farmers handled by finished chunks
+BATCH_PROGRESS_KEY = "idcard-batch:{batch_id}"
 
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    os.makedirs(QR_DIR, exist_ok=True)
 
-    # --- QR ---
+def _qr_png(farmer_id: str) -> bytes:
+    """Render the QR straight into memory; no temp file round trip."""
     qr_data = {"farmer_id": farmer_id, "verified": True, "timestamp": datetime.utcnow().isoformat()}
-    qr_img = qrcode.make(qr_data)
-    qr_path = os.path.join(QR_DIR, f"{farmer_id}_qr.png")
-    qr_img.save(qr_path)
+    # A fixed mask skips scoring all eight candidates (most of qrcode.make's time);
+    # box_size 6 is ~220 px, plenty for a 25 mm print.
+    qr = qrcode.QRCode(box_size=QR_BOX_SIZE, mask_pattern=QR_MASK_PATTERN)
+    qr.add_data(qr_data)
+    qr.make(fit=True)
+    buf = io.BytesIO()
+    qr.make_image().save(buf)
+    return buf.getvalue()
+
 
-    # --- Photo ---
-    photo_path = farmer.get("photo_path")
+def _photo_file(farmer: dict):
+    # the card-size derivative is ~300 px; fall back to whatever was uploaded
+    photo_path = farmer.get("photo_card_path") or farmer.get("photo_path")
     photo_abs = f"/app{photo_path}" if photo_path else None
+    return photo_abs if photo_abs and os.path.exists(photo_abs) else None
 
-    # --- PDF card ---
-    pdf_path = os.path.join(UPLOAD_DIR, f"{farmer_id}_card.pdf")
-    pdf = FPDF("P", "mm", (90, 60))
-    pdf.add_page()
+
+def _new_pdf(fmt) -> FPDF:
+    pdf = FPDF("P", "mm", fmt)
+    pdf.set_auto_page_break(False)
+    return pdf
+
+
+def _draw_card(pdf: FPDF, farmer: dict, qr_png: bytes, ox: float = 0, oy: float = 0):
+    """Draw one card with its top-left corner at (ox, oy) on the current page."""
+    farmer_id = farmer["farmer_id"]
+    pdf.set_xy(ox + 10, oy + 10)
     pdf.set_font("Helvetica", "B", 14)
-    pdf.cell(0, 10, "Farmer ID Card", ln=True, align="C")
+    pdf.cell(CARD_W - 20, 10, "Farmer ID Card", align="C")
 
-    if photo_abs and os.path.exists(photo_abs):
+    photo = _photo_file(farmer)
+    drawn = False
+    if photo:
         try:
-            pdf.image(photo_abs, x=5, y=20, w=25, h=25)
+            pdf.image(photo, x=ox + 5, y=oy + 20, w=25, h=25)
+            drawn = True
         except Exception as e:
             print(f"[WARN] Could not embed photo: {e}")
-    # Add a blank placeholder instead
-            pdf.set_fill_color(200, 200, 200)
-            pdf.rect(5, 20, 25, 25, style="F")
-            pdf.set_font("Helvetica", "I", 8)
-            pdf.text(8, 35, "No Photo")
-    pdf.image(qr_path, x=60, y=20, w=25, h=25)
-
-    name = f"{farmer['personal_info']['first_name']} {farmer['personal_info']['last_name']}"
-    pdf.set_xy(5, 50)
+    if not drawn:
+        # Add a blank placeholder instead
+        pdf.set_fill_color(200, 200, 200)
+        pdf.rect(ox + 5, oy + 20, 25, 25, style="F")
+        pdf.set_font("Helvetica", "I", 8)
+        pdf.text(ox + 8, oy + 35, "No Photo")
+    pdf.image(io.BytesIO(qr_png), x=ox + 60, y=oy + 20, w=25, h=25)
+
+    info = farmer.get("personal_info", {})
+    name = f"{info.get('first_name', '')} {info.get('last_name', '')}"
+    pdf.set_xy(ox + 5, oy + 47)
     pdf.set_font("Helvetica", size=10)
-    pdf.multi_cell(0, 5, f"Name: {name}\nID: {farmer_id}", align="L")
+    pdf.multi_cell(CARD_W - 10, 5, f"Name: {name}\nID: {farmer_id}", align="L")
 
+
+def render_card(farmer: dict, out_dir: str = UPLOAD_DIR, qr_png: bytes | None = None) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    pdf_path = os.path.join(out_dir, f"{farmer['farmer_id']}_card.pdf")
+    pdf = _new_pdf((CARD_W, CARD_H))
+    pdf.add_page()
+    _draw_card(pdf, farmer, qr_png or _qr_png(farmer["farmer_id"]))
     pdf.output(pdf_path)
+    return pdf_path
+
+
+def render_sheet(farmers: list, sheet_path: str, qr_pngs: list | None = None) -> str:
+    """Multi-up A4 print sheet: CARDS_PER_SHEET cards per page, one page per group."""
+    qr_pngs = qr_pngs or [_qr_png(f["farmer_id"]) for f in farmers]
+    os.makedirs(os.path.dirname(sheet_path), exist_ok=True)
+    pdf = _new_pdf("A4")
+    for i, farmer in enumerate(farmers):
+        slot = i % CARDS_PER_SHEET
+        if slot == 0:
+            pdf.add_page()
+        ox = SHEET_MARGIN_X + (slot % SHEET_COLS) * CARD_W
+        oy = SHEET_MARGIN_Y + (slot // SHEET_COLS) * CARD_H
+        pdf.set_draw_color(180, 180, 180)
+        pdf.rect(ox, oy, CARD_W, CARD_H)
+        _draw_card(pdf, farmer, qr_pngs[i], ox, oy)
+    pdf.output(sheet_path)
+    return sheet_path
+
+
+def render_chunk(farmers: list, out_dir: str = UPLOAD_DIR, sheet_path: str | None = None):
+    """Render one chunk of cards (and optionally its print sheet)."""
+    qr_pngs = [_qr_png(farmer["farmer_id"]) for farmer in farmers]
+    cards = [(farmer["farmer_id"], render_card(farmer, out_dir, qr)) for farmer, qr in zip(farmers, qr_pngs)]
+    sheet = render_sheet(farmers, sheet_path, qr_pngs) if sheet_path else None
+    return cards, sheet
+
+
+@shared_task
+def generate_id_card(farmer_id: str):
+    db = get_db_sync()
+
+    farmer = db.farmers.find_one({"farmer_id": farmer_id}, FARMER_CARD_PROJECTION)
+    if not farmer:
+        return {"error": "Farmer not found"}
+
+    pdf_path = render_card(farmer)
 
     # Update DB
-    loop.run_until_complete(
-        db.farmers.update_one({"farmer_id": farmer_id}, {"$set": {"id_card_path": pdf_path}})
-    )
+    with farmer_changes.reserve_sync(db) as seq:
+        db.farmers.update_one({"farmer_id": farmer_id}, {"$set": {"id_card_path": pdf_path, **farmer_changes.stamp(seq)}})
+    farmer_cache.invalidate_sync([farmer_id])
 
     return {"message": "ID card generated", "id_card_path": pdf_path}
+
+
+def _report_progress(task, batch_id: str, handled: int, total: int):
+    """Add a finished chunk to the batch's count and publish it as the batch's PROGRESS."""
+    key = BATCH_PROGRESS_KEY.format(batch_id=batch_id)
+    r = get_redis()
+    done = r.incrby(key, handled)
+    r.expire(key, settings.ID_CARD_BATCH_TIME_LIMIT)
+    task.backend.store_result(batch_id, {"done": done, "total": total}, "PROGRESS")
+
+
+@shared_task(bind=True)
+def render_id_card_chunk(self, batch_id: str, farmer_ids: list, total: int, sheet_path: str | None = None):
+    """One chunk of a batch: render, stamp and report the cards of up to RENDER_CHUNK farmers."""
+    db = get_db_sync()
+    # farmers deleted since the batch listed them are skipped
+    farmers = list(db.farmers.find({"farmer_id": {"$in": farmer_ids}}, FARMER_CARD_PROJECTION).sort("farmer_id", 1))
+    cards, sheet, timed_out = [], None, False
+    try:
+        if farmers:
+            cards, sheet = render_chunk(farmers, UPLOAD_DIR, sheet_path)
+            with farmer_changes.reserve_sync(db, len(cards)) as first_seq:
+                db.farmers.bulk_write(
+                    [UpdateOne({"farmer_id": fid}, {"$set": {"id_card_path": path, **farmer_changes.stamp(first_seq + i)}})
+                     for i, (fid, path) in enumerate(cards)],
+                    ordered=False,
+                )
+            farmer_cache.invalidate_sync(fid for fid, _ in cards)
+    except SoftTimeLimitExceeded:
+        # re-running the batch renders this chunk again
+        cards, sheet, timed_out = [], None, True
+    _report_progress(self, batch_id, len(farmer_ids), total)
+    return {"generated": len(cards), "sheet": sheet, "incomplete": timed_out}
+
+
+@shared_task
+def finish_id_cards_batch(chunks: list, batch_id: str, missing: list):
+    """Chord body: the batch's result, stored under the batch task's own id."""
+    get_redis().delete(BATCH_PROGRESS_KEY.format(batch_id=batch_id))
+    incomplete = any(chunk["incomplete"] for chunk in chunks)
+    return {
+        "message": "ID card batch stopped at its time limit" if incomplete else "ID cards generated",
+        "generated": sum(chunk["generated"] for chunk in chunks),
+        "incomplete": incomplete,
+        "sheets": [chunk["sheet"] for chunk in chunks if chunk["sheet"]],
+        "missing": missing,
+    }
+
+
+def _id_chunks(cursor):
+    chunk = []
+    for farmer in cursor:
+        chunk.append(farmer["farmer_id"])
+        if len(chunk) == RENDER_CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@shared_task(bind=True)
+def generate_id_cards_batch(self, farmer_ids: list | None = None, filters: dict | None = None,
+                            sheets: bool = False):
+    """
+    Issue cards for many farmers: explicit `farmer_ids`, or `filters` on
+    province / district / registration_status. The farmers are split into
+    render_id_card_chunk tasks on the cards queue, so every worker child takes
+    part; this task is replaced by their chord and its id ends up holding the
+    batch result. Progress is reported through the task state (PROGRESS,
+    meta={"done", "total"}).
+    """
+    db = get_db_sync()
+    if farmer_ids:
+        query = {"farmer_id": {"$in": farmer_ids}}
+    else:
+        filters = filters or {}
+        unknown = set(filters) - set(farmer_query.FILTER_FIELDS)
+        if unknown:
+            return {"error": f"Unsupported filter fields: {sorted(unknown)}"}
+        query = farmer_query.build_filter(**filters)
+
+    # only the ids are listed here; each chunk loads its own card fields
+    cursor = db.farmers.find(query, {"_id": 0, "farmer_id": 1}).sort("farmer_id", 1).batch_size(RENDER_CHUNK * 10)
+    chunks = list(_id_chunks(cursor))
+    found = {fid for chunk in chunks for fid in chunk} if farmer_ids else set()
+    missing = sorted(set(farmer_ids or []) - found)
+    if not chunks:
+        return {"error": "No farmers found", "missing": missing}
+
+    batch_id = self.request.id
+    total = sum(len(chunk) for chunk in chunks)
+    self.update_state(state="PROGRESS", meta={"done": 0, "total": total})
+    header = [
+        render_id_card_chunk.s(batch_id, chunk, total,
+                               os.path.join(SHEET_DIR, f"{batch_id}_{n:04d}.pdf") if sheets else None)
+        for n, chunk in enumerate(chunks)
+    ]
+    return self.replace(chord(header, finish_id_cards_batch.s(batch_id, missing)))
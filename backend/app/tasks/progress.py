@@ -0,0 +1,21 @@
+import json
+import redis
+from ..utils.redis_client import get_redis
+
+# Progress events for a job are published on "job-progress:<job_id>" as JSON:
+# {"job_id", "state", "done", "total", "results"}; "results" holds only the
+# records finalised since the previous event (the whole list on SUCCESS).
+TERMINAL_STATES = {"SUCCESS", "FAILURE", "REVOKED"}
+
+
+def progress_channel(job_id: str) -> str:
+    return f"job-progress:{job_id}"
+
+
+def publish_progress(job_id: str, state: str, done: int, total: int, results: list | None = None):
+    event = {"job_id": job_id, "state": state, "done": done, "total": total, "results": results or []}
+    try:
+        get_redis().publish(progress_channel(job_id), json.dumps(event, default=str))
+    except redis.RedisError as e:
+        # progress is best effort; the task result is still stored in the backend
+        print(f"[WARN] Could not publish progress for {job_id}: {e}")
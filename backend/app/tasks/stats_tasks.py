@@ -0,0 +1,18 @@
+from datetime import datetime
+from .celery_app import celery_app
+from .worker_db import get_db_sync
+from ..services import farmer_stats
+
+
+@celery_app.task
+def rebuild_farmer_stats():
+    """
+    Recompute farmer_stats from the farmers collection ($group + $out, which swaps
+    the collection in atomically). Scheduled by beat; increments that land while
+    the aggregation runs can be lost and are picked up by the next rebuild.
+    """
+    db = get_db_sync()
+    started = datetime.utcnow()
+    db.farmers.aggregate(farmer_stats.rebuild_pipeline(), allowDiskUse=True)
+    buckets = db[farmer_stats.STATS_COLLECTION].count_documents({})
+    return {"buckets": buckets, "seconds": (datetime.utcnow() - started).total_seconds()}
@@ -0,0 +1,138 @@
+import json
+import uuid
+from celery.result import AsyncResult, GroupResult
+from redis.exceptions import WatchError
+from .celery_app import SYNC_BATCH_TASK, celery_app
+from ..utils.redis_client import get_redis
+
+# A chunked sync job is a saved GroupResult (the parent job_id) whose children
+# are process_sync_batch tasks, one per chunk. Each chunk's payload is kept in
+# Redis for as long as its result, so a failed chunk can be re-enqueued alone.
+CHUNK_KEY = "sync-chunk:{task_id}"
+# Submissions already accepted, per user: Idempotency-Key header (or content hash
+# of the batch) -> {"job_id", "hash"}; kept as long as the job's result, or for the
+# given ttl (content hashes only stand in for a key over a short retry window).
+IDEMPOTENCY_KEY = "sync-idempotency:{user}:{key}"
+# Every job the API enqueued (single task, chunk or chunked parent), kept as long
+# as its result: job_id -> {"user", "chunked"}. Celery reports an unknown id as
+# PENDING forever, so this is what tells the two apart.
+JOB_KEY = "sync-job:{job_id}"
+
+
+def _chunk_ttl() -> int:
+    expires = celery_app.conf.result_expires
+    return int(expires.total_seconds() if hasattr(expires, "total_seconds") else expires)
+
+
+def register_job(user_email: str, job_id: str, chunked: bool = False, client=None):
+    entry = json.dumps({"user": user_email, "chunked": chunked})
+    (client or get_redis()).set(JOB_KEY.format(job_id=job_id), entry, ex=_chunk_ttl())
+
+
+def job_info(job_id: str) -> dict | None:
+    raw = get_redis().get(JOB_KEY.format(job_id=job_id))
+    return json.loads(raw) if raw is not None else None
+
+
+def dispatch_chunk(user_email: str, records: list) -> str:
+    """Store the chunk payload, then enqueue it. Blocking: call from the threadpool."""
+    task_id = str(uuid.uuid4())
+    payload = json.dumps({"user": user_email, "records": records}, default=str)
+    with get_redis().pipeline(transaction=False) as pipe:
+        pipe.set(CHUNK_KEY.format(task_id=task_id), payload, ex=_chunk_ttl())
+        register_job(user_email, task_id, client=pipe)
+        pipe.execute()
+    celery_app.send_task(SYNC_BATCH_TASK, args=[user_email, records], task_id=task_id)
+    return task_id
+
+
+def claim_submission(user_email: str, key: str, body_hash: str, job_id: str, ttl: int | None = None) -> dict | None:
+    """
+    Register `job_id` for the submission `key` unless one already is. Returns None
+    when claimed (the caller enqueues job_id), else the earlier {"job_id", "hash"}.
+    Blocking: call from the threadpool.
+    """
+    redis_key = IDEMPOTENCY_KEY.format(user=user_email, key=key)
+    entry = json.dumps({"job_id": job_id, "hash": body_hash})
+    r = get_redis()
+    if r.set(redis_key, entry, nx=True, ex=ttl or _chunk_ttl()):
+        return None
+    raw = r.get(redis_key)
+    if raw is None:  # expired between the two calls
+        r.set(redis_key, entry, ex=ttl or _chunk_ttl())
+        return None
+    return json.loads(raw)
+
+
+def reclaim_submission(user_email: str, key: str, body_hash: str, old_job_id: str, job_id: str,
+                       ttl: int | None = None) -> str:
+    """
+    Point `key` at `job_id` if it still points at `old_job_id` (e.g. that job failed).
+    Returns the job now registered: job_id, or the one a concurrent retry put there.
+    """
+    redis_key = IDEMPOTENCY_KEY.format(user=user_email, key=key)
+    with get_redis().pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(redis_key)
+                raw = pipe.get(redis_key)
+                current = json.loads(raw)["job_id"] if raw is not None else old_job_id
+                if current != old_job_id:
+                    return current
+                pipe.multi()
+                pipe.set(redis_key, json.dumps({"job_id": job_id, "hash": body_hash}), ex=ttl or _chunk_ttl())
+                pipe.execute()
+                return job_id
+            except WatchError:
+                continue
+
+
+def release_submission(user_email: str, key: str):
+    """Forget a claim whose job was never enqueued."""
+    get_redis().delete(IDEMPOTENCY_KEY.format(user=user_email, key=key))
+
+
+def finish_upload(user_email: str, key: str | None, task_ids: list, job_id: str, complete: bool) -> str | None:
+    """
+    Record a streamed upload's enqueued chunks under `job_id` (None when there are
+    none). The claim on `key` is kept only for a complete upload with a job; after
+    an interrupted one the client must be able to send it again under the same key.
+    """
+    saved = None
+    try:
+        if task_ids:
+            saved = save_job(task_ids, job_id)
+            register_job(user_email, saved, chunked=True)
+    finally:
+        if key and not (complete and saved):
+            release_submission(user_email, key)
+    return saved
+
+
+def save_job(task_ids: list, job_id: str | None = None) -> str:
+    job_id = job_id or str(uuid.uuid4())
+    GroupResult(job_id, [AsyncResult(t, app=celery_app) for t in task_ids], app=celery_app).save(
+        backend=celery_app.backend
+    )
+    return job_id
+
+
+def chunk_ids(job_id: str) -> list | None:
+    group = GroupResult.restore(job_id, backend=celery_app.backend, app=celery_app)
+    return [child.id for child in group.results] if group else None
+
+
+def retry_chunks(job_id: str, failed_ids: list) -> dict:
+    """Re-enqueue failed chunks under new task ids and re-save the job. Returns {old: new}."""
+    task_ids = chunk_ids(job_id) or []
+    replaced = {}
+    for task_id in failed_ids:
+        raw = get_redis().get(CHUNK_KEY.format(task_id=task_id))
+        if raw is None:
+            continue  # payload expired with its result
+        chunk = json.loads(raw)
+        replaced[task_id] = dispatch_chunk(chunk["user"], chunk["records"])
+    if replaced:
+        save_job([replaced.get(t, t) for t in task_ids], job_id)
+        register_job(chunk["user"], job_id, chunked=True)
+    return replaced
@@ -0,0 +1,113 @@
+import bisect
+import logging
+import time
+import redis
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from .celery_app import ID_CARD_CHUNK_TASK, ID_CARD_TASK, SYNC_BATCH_TASK
+from ..utils.metrics import Counter, Histogram
+from ..utils.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+# Worker children are separate processes, so task observations are added up in
+# one Redis hash (HINCRBY / HINCRBYFLOAT, one pipelined round trip per task) and
+# the API renders that hash on GET /metrics. Fields: "<metric>|<task>|<bucket index>",
+# "<metric>|<task>|sum", "tasks|<task>|<state>" and "records|<task>|total".
+METRICS_KEY = "metrics:celery"
+SENT_AT_HEADER = "sent_at"
+
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+RUN_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, 3600)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# records a finished task handled, for the throughput metrics
+RECORD_COUNTS = {
+    SYNC_BATCH_TASK: lambda args, kwargs, retval: len(kwargs.get("records") or args[1]),
+    ID_CARD_TASK: lambda args, kwargs, retval: 0 if "error" in retval else 1,
+    ID_CARD_CHUNK_TASK: lambda args, kwargs, retval: retval.get("generated", 0),
+}
+
+HISTOGRAMS = {
+    "wait": ("celery_task_queue_wait_seconds", "Time from publish to a worker starting the task", WAIT_BUCKETS),
+    "run": ("celery_task_run_seconds", "Task execution time", RUN_BUCKETS),
+    "rate": ("celery_task_records_per_second", "Records handled per second of task run time", RATE_BUCKETS),
+}
+
+_started = {}   # task_id -> (wall clock, perf_counter) at prerun, in the worker child running it
+
+
+@before_task_publish.connect
+def stamp_sent_at(headers=None, **kwargs):
+    # runs in the publisher (API, beat, retries); the header reaches the worker as task.request.sent_at
+    if headers is not None:
+        headers[SENT_AT_HEADER] = time.time()
+
+
+@task_prerun.connect
+def task_started(task_id=None, **kwargs):
+    _started[task_id] = (time.time(), time.perf_counter())
+
+
+def _observe(pipe, metric: str, task_name: str, buckets: tuple, value: float):
+    pipe.hincrby(METRICS_KEY, f"{metric}|{task_name}|{bisect.bisect_left(buckets, value)}", 1)
+    pipe.hincrbyfloat(METRICS_KEY, f"{metric}|{task_name}|sum", value)
+
+
+@task_postrun.connect
+def task_finished(task_id=None, task=None, args=None, kwargs=None, retval=None, state=None, **extra):
+    started = _started.pop(task_id, None)
+    if started is None:
+        return
+    started_at, started_counter = started
+    run = time.perf_counter() - started_counter
+    sent_at = task.request.get(SENT_AT_HEADER)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hincrby(METRICS_KEY, f"tasks|{task.name}|{state}", 1)
+        _observe(pipe, "run", task.name, RUN_BUCKETS, run)
+        if sent_at:
+            _observe(pipe, "wait", task.name, WAIT_BUCKETS, max(0.0, started_at - sent_at))
+        count = RECORD_COUNTS.get(task.name)
+        if count and state == "SUCCESS" and isinstance(retval, dict):
+            records = count(args or [], kwargs or {}, retval)
+            if records:
+                pipe.hincrby(METRICS_KEY, f"records|{task.name}|total", records)
+                _observe(pipe, "rate", task.name, RATE_BUCKETS, records / run if run else 0.0)
+        pipe.execute()
+    except redis.RedisError as e:
+        # metrics are best effort; never fail the task over them
+        logger.warning("task metrics not recorded for %s: %s", task.name, e)
+
+
+async def render() -> list:
+    """Task metrics from every worker, read from Redis; [] when Redis is unreachable."""
+    try:
+        raw = await get_async_redis().hgetall(METRICS_KEY)
+    except redis.RedisError as e:
+        logger.warning("task metrics unavailable: %s", e)
+        return []
+
+    histograms = {key: Histogram(name, help, ("task",), buckets) for key, (name, help, buckets) in HISTOGRAMS.items()}
+    tasks = Counter("celery_tasks_total", "Finished tasks by final state", ("task", "state"))
+    records = Counter("celery_task_records_total", "Records handled by successful tasks", ("task",))
+    series = {}   # (metric, task) -> [counts, sum]
+    for field, value in raw.items():
+        metric, task_name, slot = field.decode().split("|", 2)
+        value = float(value)
+        if metric == "tasks":
+            tasks.inc((task_name, slot), int(value))
+        elif metric == "records":
+            records.inc((task_name,), int(value))
+        elif metric in histograms:
+            entry = series.setdefault((metric, task_name), [[0] * (len(histograms[metric].buckets) + 1), 0.0])
+            if slot == "sum":
+                entry[1] = value
+            else:
+                entry[0][int(slot)] = int(value)
+    for (metric, task_name), (counts, total) in series.items():
+        histograms[metric].load((task_name,), counts, total)
+
+    lines = tasks.render() + records.render()
+    for histogram in histograms.values():
+        lines += histogram.render()
+    return lines
@@ -0,0 +1,39 @@
+import os
+from celery.signals import worker_process_init, worker_process_shutdown
+from pymongo import MongoClient
+from ..config import settings
+from ..database import mongo_client_options
+
+# One pooled client per worker process. Celery's prefork pool forks children
+# from the main process; a MongoClient must never be shared across a fork, so
+# the client is keyed to the pid that created it and rebuilt in every child.
+_client = None
+_client_pid = None
+
+
+def get_client_sync() -> MongoClient:
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = MongoClient(settings.MONGO_URI, connect=False, **mongo_client_options())
+        _client_pid = os.getpid()
+    return _client
+
+
+def get_db_sync():
+    return get_client_sync()[settings.MONGO_DB]
+
+
+@worker_process_init.connect
+def init_worker_client(**kwargs):
+    global _client
+    # drop (without closing) anything inherited from the parent, then connect fresh
+    _client = None
+    get_client_sync()
+
+
+@worker_process_shutdown.connect
+def close_worker_client(**kwargs):
+    global _client
+    if _client is not None and _client_pid == os.getpid():
+        _client.close()
+    _client = None
@@ -0,0 +1,71 @@
+"""
+Celery worker presets, one per queue family, sized to the cores the worker gets:
+
+    python -m app.tasks.worker_profiles sync          # tablet syncs
+    python -m app.tasks.worker_profiles cards         # ID-card rendering
+    python -m app.tasks.worker_profiles maintenance   # beat jobs (+ the old "celery" queue)
+    python -m app.tasks.worker_profiles all           # every queue, single-host / dev
+
+Extra arguments are passed on to `celery worker` (e.g. `--loglevel=debug`).
+"""
+import os
+import sys
+from typing import NamedTuple
+from ..config import settings
+from .celery_app import CARDS_QUEUE, LEGACY_QUEUE, MAINTENANCE_QUEUE, SYNC_QUEUE, celery_app
+
+
+class WorkerProfile(NamedTuple):
+    queues: tuple
+    max_per_core: float   # autoscale ceiling, prefork children per core
+    min_processes: int    # autoscale floor
+    prefetch: int         # worker_prefetch_multiplier
+    max_tasks_per_child: int = 0
+
+
+PROFILES = {
+    # short, Mongo-bound tasks: more children than cores, a few prefetched each
+    "sync": WorkerProfile((SYNC_QUEUE,), 2, 2, 4),
+    # CPU-bound rendering: one child per core, never hoard a second batch;
+    # children are recycled to hand back FPDF / image memory. A batch is split into
+    # chunk tasks, so the children are also its parallelism.
+    "cards": WorkerProfile((CARDS_QUEUE,), 1, 1, 1, max_tasks_per_child=50),
+    "maintenance": WorkerProfile((MAINTENANCE_QUEUE, LEGACY_QUEUE), 0, 1, 1),
+    "all": WorkerProfile((SYNC_QUEUE, CARDS_QUEUE, MAINTENANCE_QUEUE, LEGACY_QUEUE), 1, 2, 1),
+}
+
+
+def cpu_count() -> int:
+    if settings.WORKER_CPU_COUNT:
+        return settings.WORKER_CPU_COUNT
+    try:
+        return len(os.sched_getaffinity(0))  # honours cpusets / `docker run --cpuset-cpus`
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def worker_argv(name: str, cpus: int | None = None) -> list:
+    profile = PROFILES[name]
+    cpus = cpus or cpu_count()
+    ceiling = max(profile.min_processes, int(profile.max_per_core * cpus))
+    argv = [
+        "worker",
+        "--loglevel=info",
+        f"--hostname={name}@%h",
+        f"--queues={','.join(profile.queues)}",
+        f"--autoscale={ceiling},{profile.min_processes}",
+        f"--prefetch-multiplier={profile.prefetch}",
+    ]
+    if profile.max_tasks_per_child:
+        argv.append(f"--max-tasks-per-child={profile.max_tasks_per_child}")
+    return argv
+
+
+def main(args: list):
+    if not args or args[0] not in PROFILES:
+        sys.exit(f"usage: python -m app.tasks.worker_profiles {{{'|'.join(PROFILES)}}} [celery worker options]")
+    celery_app.worker_main(worker_argv(args[0]) + args[1:])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,69 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PoolSaturated(Exception):
+    pass
+
+
+class BoundedPool:
+    """
+    Thread pool for CPU-heavy calls (bcrypt) made from the event loop.
+
+    At most `workers` calls run at once and at most `max_queue` more wait for a slot;
+    beyond that run() raises PoolSaturated instead of queueing without bound.
+    Bookkeeping happens on the event loop only, so it needs no lock.
+    """
+
+    def __init__(self, workers: int, max_queue: int, name: str):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.name = name
+        self._executor = None
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self._pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise PoolSaturated(f"{self.name}: {self._pending} calls pending")
+        self._pending += 1
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            result = fn(*args)
+            return started - submitted, time.perf_counter() - started, result
+
+        try:
+            waited, ran, result = await asyncio.get_running_loop().run_in_executor(self._get_executor(), timed)
+        finally:
+            self._pending -= 1
+        self.completed += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        self.run_seconds_total += ran
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": min(self._pending, self.workers),
+            "queued": max(0, self._pending - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+            "run_seconds_total": round(self.run_seconds_total, 6),
+        }
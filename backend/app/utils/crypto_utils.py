@@ -1,24 +1,139 @@
-
-import base64, hashlib, os
+import base64, hashlib, hmac
+from functools import lru_cache
 from Crypto.Cipher import AES
-from Crypto.Random import get_random_bytes
 from ..config import settings
 
-# deterministic AES-GCM encryption using a fixed nonce derived from input hash
+TAG_SIZE = 16
+DEFAULT_KEY_ID = "k0"
+
+
+class Keyring:
+    """
+    Field-encryption keys, derived once per process.
+
+    Every value written carries the id of the key that produced it ("<kid>:<data>"),
+    so keys can be rotated: new writes use the active key, older ones stay readable
+    and matchable until scripts/rotate_crypto_keys.py re-encrypts them.
+
+    Per key id, two sub-keys are derived from the secret with HMAC-SHA256: the
+    512-bit AES-SIV key (RFC 5297, AES-256) and the lookup-hash key for nrc_hash.
+    Encryption is deterministic AES-SIV without a nonce; the stored data is the
+    16-byte synthetic IV (the tag) followed by the ciphertext.
+    """
+
+    def __init__(self, secrets: dict, active: str, legacy_secret: bytes | None = None):
+        if active not in secrets:
+            raise ValueError(f"Active key id {active!r} is not in the keyring")
+        self.active = active
+        self._siv = {}
+        self._lookup = {}
+        for kid, secret in secrets.items():
+            self._siv[kid] = self._derive(secret, b"farmer-field-siv-mac") + self._derive(secret, b"farmer-field-siv-ctr")
+            self._lookup[kid] = hmac.new(self._derive(secret, b"farmer-field-lookup"), digestmod=hashlib.sha256)
+        # verbatim secret of the pre-keyring sha256(secret + value) nrc_hash, if still matched
+        self._legacy_secret = legacy_secret
+
+    @staticmethod
+    def _derive(secret: bytes, purpose: bytes) -> bytes:
+        return hmac.new(secret, purpose, hashlib.sha256).digest()
+
+    @classmethod
+    def from_settings(cls, conf=settings) -> "Keyring":
+        if conf.CRYPTO_KEYS:
+            secrets = {}
+            for entry in conf.CRYPTO_KEYS.split(","):
+                kid, _, secret = entry.strip().partition(":")
+                if not kid or not secret:
+                    raise ValueError("CRYPTO_KEYS entries must look like <kid>:<secret>")
+                secrets[kid] = secret.encode()
+        else:
+            secrets = {DEFAULT_KEY_ID: conf.JWT_SECRET.encode()}
+        active = conf.CRYPTO_ACTIVE_KEY_ID or list(secrets)[-1]
+        legacy = conf.JWT_SECRET.encode() if conf.CRYPTO_LEGACY_LOOKUP else None
+        return cls(secrets, active, legacy)
+
+    @property
+    def key_ids(self) -> list:
+        return list(self._siv)
+
+    @staticmethod
+    def key_id(token: str) -> str | None:
+        kid, sep, _ = token.partition(":")
+        return kid if sep else None
+
+    def _digest(self, keyed, data: bytes) -> bytes:
+        h = keyed.copy()  # skips re-deriving the HMAC pads for every value
+        h.update(data)
+        return h.digest()
+
+    def _seal(self, kid: str, data: bytes) -> bytes:
+        ciphertext, tag = AES.new(self._siv[kid], AES.MODE_SIV).encrypt_and_digest(data)
+        return tag + ciphertext
+
+    def encrypt(self, value: str, kid: str | None = None) -> str:
+        return self.encrypt_batch([value], kid)[0]
+
+    def encrypt_batch(self, values: list, kid: str | None = None) -> list:
+        """encrypt() for a whole sync chunk; None stays None."""
+        kid = kid or self.active
+        if kid not in self._siv:
+            raise ValueError(f"Unknown encryption key id {kid!r}")
+        prefix = f"{kid}:"
+        return [None if v is None else prefix + base64.urlsafe_b64encode(self._seal(kid, v.encode())).decode()
+                for v in values]
+
+    def decrypt(self, token: str) -> str:
+        """Raises ValueError for unknown key ids, tampered data and pre-keyring values."""
+        kid = self.key_id(token)
+        if kid not in self._siv:
+            raise ValueError(f"Unknown encryption key id {kid!r}")
+        raw = base64.urlsafe_b64decode(token[len(kid) + 1:].encode())
+        if len(raw) < TAG_SIZE:
+            raise ValueError("Encrypted value failed authentication")
+        try:
+            data = AES.new(self._siv[kid], AES.MODE_SIV).decrypt_and_verify(raw[TAG_SIZE:], raw[:TAG_SIZE])
+        except ValueError:  # "MAC check failed"
+            raise ValueError("Encrypted value failed authentication") from None
+        return data.decode()
+
+    def hash(self, value: str, kid: str | None = None) -> str:
+        """Keyed HMAC-SHA256 lookup hash (nrc_hash)."""
+        kid = kid or self.active
+        return f"{kid}:" + self._digest(self._lookup[kid], value.encode()).hex()
+
+    def hash_batch(self, values: list, kid: str | None = None) -> list:
+        kid = kid or self.active
+        keyed = self._lookup[kid]
+        prefix = f"{kid}:"
+        return [None if v is None else prefix + self._digest(keyed, v.encode()).hex() for v in values]
+
+    def _legacy_hash(self, value: str) -> str:
+        return hashlib.sha256(self._legacy_secret + value.encode()).hexdigest()
+
+    def hash_candidates(self, value: str) -> tuple:
+        """Every nrc_hash an existing record for `value` may carry; the active one first."""
+        return self.hash_candidates_batch([value])[0]
+
+    def hash_candidates_batch(self, values: list) -> list:
+        columns = [self.hash_batch(values)]
+        columns += [self.hash_batch(values, kid) for kid in self._lookup if kid != self.active]
+        if self._legacy_secret is not None:
+            columns.append([self._legacy_hash(v) for v in values])
+        return list(zip(*columns))
+
+
+@lru_cache(maxsize=1)
+def get_keyring() -> Keyring:
+    return Keyring.from_settings()
+
+
 def encrypt_deterministic(value: str) -> str:
-    key = hashlib.sha256(settings.JWT_SECRET.encode()).digest()
-    nonce = hashlib.sha1(value.encode()).digest()[:12]
-    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
-    ciphertext, tag = cipher.encrypt_and_digest(value.encode())
-    return base64.urlsafe_b64encode(ciphertext).decode()
-
-def decrypt_deterministic(value_b64: str, sample_input: str) -> str:
-    key = hashlib.sha256(settings.JWT_SECRET.encode()).digest()
-    nonce = hashlib.sha1(sample_input.encode()).digest()[:12]
-    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
-    data = base64.urlsafe_b64decode(value_b64.encode())
-    return cipher.decrypt(data).decode(errors="ignore")
+    return get_keyring().encrypt(value)
+
+
+def decrypt_deterministic(token: str) -> str:
+    return get_keyring().decrypt(token)
+
 
 def hmac_hash(value: str) -> str:
-    key = settings.JWT_SECRET.encode()
-    return hashlib.sha256(key + value.encode()).hexdigest()
+    return get_keyring().hash(value)
@@ -0,0 +1,61 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class FileTooLarge(Exception):
+    pass
+
+
+def _open_temp(dest: Path):
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dest.parent, prefix=".upload-", suffix=".part")
+    return os.fdopen(fd, "wb"), tmp_path
+
+
+def _write_chunk(out, digest, chunk: bytes):
+    # hashlib and file writes both release the GIL for large buffers
+    digest.update(chunk)
+    out.write(chunk)
+
+
+def _commit(out, tmp_path: str, dest: Path):
+    out.close()
+    os.chmod(tmp_path, 0o644)  # mkstemp creates 0600 files
+    os.replace(tmp_path, dest)
+
+
+def _discard(out, tmp_path: str):
+    out.close()
+    try:
+        os.unlink(tmp_path)
+    except FileNotFoundError:
+        pass
+
+
+async def save_upload(file: UploadFile, dest: Path, max_bytes: int) -> dict:
+    """
+    Stream an upload to `dest` in UPLOAD_CHUNK_SIZE pieces without blocking the event loop.
+    Enforces `max_bytes` as data arrives (raises FileTooLarge), hashes in the same pass,
+    and only makes the file visible at `dest` once complete (temp file + os.replace).
+    Returns {"size": ..., "sha256": ...}.
+    """
+    out, tmp_path = await run_in_threadpool(_open_temp, dest)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                raise FileTooLarge(f"Upload exceeds {max_bytes} bytes")
+            await run_in_threadpool(_write_chunk, out, digest, chunk)
+        await run_in_threadpool(_commit, out, tmp_path, dest)
+    except BaseException:
+        await run_in_threadpool(_discard, out, tmp_path)
+        raise
+    return {"size": size, "sha256": digest.hexdigest()}
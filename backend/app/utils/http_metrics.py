@@ -0,0 +1,55 @@
+import time
+from .metrics import Counter, Histogram
+
+request_seconds = Histogram("http_request_duration_seconds", "Time to the end of the response body, per route",
+                            ("method", "route"))
+requests_total = Counter("http_requests_total", "Responses sent, per route and status", ("method", "route", "status"))
+UNMATCHED = "<unmatched>"
+
+
+class RequestMetricsMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware request/response wrapping).
+    Requests are labelled with the route template (/api/farmers/{farmer_id}),
+    never the raw path, so the number of series stays bounded.
+    """
+
+    def __init__(self, app, skip: tuple = ("/metrics",)):
+        self.app = app
+        self.skip = set(skip)
+        self._templates = None   # endpoint -> route path, built on first request
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED
+        if self._templates is None:
+            self._templates = {getattr(r, "endpoint", None) or getattr(r, "app", None): r.path
+                               for r in scope["app"].routes}
+        return self._templates.get(endpoint, UNMATCHED)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # the router writes the matched endpoint into this same scope dict
+            route = self._route(scope)
+            request_seconds.observe((scope["method"], route), time.perf_counter() - started)
+            requests_total.inc((scope["method"], route, str(status)))
+
+
+def render() -> list:
+    return request_seconds.render() + requests_total.render()
@@ -0,0 +1,101 @@
+import bisect
+import math
+import threading
+
+# Prometheus text exposition (format 0.0.4) without a client library: a few
+# counters and histograms per process, rendered on GET /metrics.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; shared by HTTP requests and Mongo commands
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in items]
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. observe() is a bisect and two additions under a lock;
+    the cumulative bucket counts Prometheus expects are built when rendering.
+    """
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def load(self, labels: tuple, counts: list, total: float):
+        """Replace one series with counts gathered elsewhere (e.g. from Redis)."""
+        with self._lock:
+            self._series[labels] = [list(counts), total]
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._series.items())
+        for labels, (counts, total) in items:
+            running = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                running += count
+                le = _labels(self.label_names, labels, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {running}")
+        return lines
+
+
+def snapshot(name: str, help: str, samples: dict, label_names: tuple = (), kind: str = "gauge") -> list:
+    """Lines for a value read at scrape time (e.g. from stats()): samples maps label values -> value."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    lines += [f"{name}{_labels(label_names, k)} {_number(v)}" for k, v in sorted(samples.items())]
+    return lines
+
+
+def render(lines: list) -> bytes:
+    return ("\n".join(lines) + "\n").encode()
@@ -0,0 +1,71 @@
+import logging
+from pymongo import monitoring
+from .metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+command_seconds = Histogram("mongo_command_duration_seconds", "MongoDB command round trip, per collection",
+                            ("command", "collection"))
+command_failures = Counter("mongo_command_failures_total", "MongoDB commands that returned an error",
+                           ("command", "collection"))
+slow_commands = Counter("mongo_slow_commands_total", "MongoDB commands slower than MONGO_SLOW_QUERY_MS",
+                        ("command", "collection"))
+
+
+def _collection(event: monitoring.CommandStartedEvent) -> str:
+    # {"find": "farmers", ...}; getMore names its collection separately
+    name = event.command.get("collection") if event.command_name == "getMore" else event.command.get(event.command_name)
+    return name if isinstance(name, str) else ""
+
+
+def _shape(command: dict) -> dict:
+    """Field names only, for the slow log: filters hold encrypted / personal values."""
+    shape = {}
+    for key in ("filter", "query", "sort", "hint"):
+        if isinstance(command.get(key), dict):
+            shape[key] = sorted(command[key])
+    if isinstance(command.get("pipeline"), list):
+        shape["pipeline"] = [next(iter(stage), "") for stage in command["pipeline"] if isinstance(stage, dict)]
+    for key in ("updates", "deletes", "documents"):
+        if isinstance(command.get(key), list):
+            shape[key] = len(command[key])
+    return shape
+
+
+class CommandTimer(monitoring.CommandListener):
+    """
+    Per-command timings for one MongoClient (passed in `event_listeners`).
+    Callbacks run on the thread issuing the command, so they only do dict and
+    counter updates; commands over `slow_ms` are also logged, without values.
+    """
+
+    def __init__(self, slow_ms: int):
+        self.slow_seconds = slow_ms / 1000 if slow_ms > 0 else None
+        self._started = {}   # (connection, request id) -> (command, collection, shape or None)
+
+    def started(self, event):
+        collection = _collection(event)
+        shape = _shape(event.command) if self.slow_seconds is not None else None
+        self._started[(event.connection_id, event.request_id)] = (event.command_name, collection, shape)
+
+    def _finish(self, event, failed: bool):
+        command, collection, shape = self._started.pop(
+            (event.connection_id, event.request_id), (event.command_name, "", None))
+        seconds = event.duration_micros / 1_000_000
+        labels = (command, collection)
+        command_seconds.observe(labels, seconds)
+        if failed:
+            command_failures.inc(labels)
+        if self.slow_seconds is not None and seconds >= self.slow_seconds:
+            slow_commands.inc(labels)
+            logger.warning("slow mongo %s on %s: %.0f ms %s", command, collection or "-", seconds * 1000, shape or "")
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+
+def render() -> list:
+    return command_seconds.render() + command_failures.render() + slow_commands.render()
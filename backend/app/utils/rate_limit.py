@@ -0,0 +1,57 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class RateLimiter:
+    """
+    In-process sliding-window limiter: at most `limit` hits per `window` seconds per key.
+    State is per worker process; keys beyond `maxsize` are evicted least recently used.
+    A limit of 0 disables it.
+    """
+
+    def __init__(self, limit: int, window: float, maxsize: int = 100_000):
+        self.limit = limit
+        self.window = window
+        self.maxsize = maxsize
+        self._hits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key, now: float):
+        hits = self._hits.get(key)
+        if hits is None:
+            return None
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        if not hits:
+            del self._hits[key]
+            return None
+        return hits
+
+    def retry_after(self, key) -> float:
+        """Seconds until `key` may try again; 0 when it is under the limit."""
+        if self.limit <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            hits = self._live(key, now)
+            if hits is None or len(hits) < self.limit:
+                return 0.0
+            return hits[0] + self.window - now
+
+    def hit(self, key):
+        if self.limit <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            hits = self._live(key, now)
+            if hits is None:
+                hits = self._hits[key] = deque(maxlen=self.limit)
+            hits.append(now)
+            self._hits.move_to_end(key)
+            while len(self._hits) > self.maxsize:
+                self._hits.popitem(last=False)
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
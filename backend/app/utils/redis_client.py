@@ -0,0 +1,25 @@
+import os
+import redis
+import redis.asyncio as aioredis
+from ..config import settings
+
+# Process-wide Redis clients (each wraps a connection pool). The sync client is
+# rebuilt after fork, like the worker Mongo client.
+_client = None
+_client_pid = None
+_async_client = None
+
+
+def get_redis() -> redis.Redis:
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+        _client_pid = os.getpid()
+    return _client
+
+
+def get_async_redis() -> aioredis.Redis:
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.from_url(settings.REDIS_URL)
+    return _async_client
@@ -1,9 +1,25 @@
 from datetime import datetime, timedelta
+import time
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from ..config import settings
+from .bounded_pool import BoundedPool
+from .cache import TTLCache
 
-pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min == max == rounds: needs_update() flags hashes at any other cost, both cheaper
+# (weaker) and dearer (slower logins) ones, so they converge on BCRYPT_ROUNDS
+pwd_ctx = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+password_pool = BoundedPool(settings.PASSWORD_VERIFY_WORKERS, settings.PASSWORD_VERIFY_QUEUE, "password-verify")
+
+# token -> verified payload; skips the HMAC check for tokens seen recently.
+# Entries never outlive the token's own `exp`.
+_token_memo = TTLCache(maxsize=settings.AUTH_TOKEN_MEMO_SIZE, ttl=settings.AUTH_USER_CACHE_TTL_SECONDS)
 
 def hash_password(password: str) -> str:
     return pwd_ctx.hash(password[:72])
@@ -11,20 +27,45 @@ def hash_password(password: str) -> str:
 def verify_password(plain: str, hashed: str) -> bool:
     return pwd_ctx.verify(plain, hashed)
 
-def create_token(subject: str, expires_delta: int, token_type: str):
-    expire = datetime.utcnow() + timedelta(minutes=expires_delta)
-    payload = {"sub": subject, "type": token_type, "exp": expire}
+def _verify_and_update(plain: str, hashed: str):
+    if not hashed:
+        return False, None
+    return pwd_ctx.verify_and_update(plain[:72], hashed)
+
+async def verify_password_offloaded(plain: str, hashed: str):
+    """
+    Verify off the event loop through password_pool (raises PoolSaturated when full).
+    Returns (valid, new_hash); new_hash is set when the stored hash should be replaced.
+    """
+    return await password_pool.run(_verify_and_update, plain, hashed)
+
+def create_token(subject: str, expires_delta: int, token_type: str, claims: dict | None = None):
+    now = datetime.utcnow()
+    # iat at sub-second precision: compared with the time of a role / is_active change
+    payload = {"sub": subject, "type": token_type, "iat": time.time(), "exp": now + timedelta(minutes=expires_delta)}
+    if claims:
+        payload.update(claims)
     return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
 
-def create_access_token(subject: str):
-    return create_token(subject, settings.ACCESS_TOKEN_EXPIRE_MINUTES, "access")
+def create_access_token(subject: str, roles: list[str] | None = None):
+    # roles are only embedded when the API is configured to trust them (AUTH_ROLES_IN_TOKEN)
+    claims = {"roles": roles} if settings.AUTH_ROLES_IN_TOKEN and roles is not None else None
+    return create_token(subject, settings.ACCESS_TOKEN_EXPIRE_MINUTES, "access", claims)
 
 def create_refresh_token(subject: str):
     return create_token(subject, settings.REFRESH_TOKEN_EXPIRE_MINUTES, "refresh")
 
 def decode_token(token: str):
+    payload = _token_memo.get(token)
+    if payload is not None:
+        if payload.get("exp", 0) > time.time():
+            return payload
+        _token_memo.pop(token)
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-        return payload
     except JWTError as e:
         raise ValueError(f"Invalid token: {e}")
+    remaining = payload.get("exp", 0) - time.time()
+    if remaining > 0:
+        _token_memo.set(token, payload, ttl=min(remaining, _token_memo.ttl))
+    return payload
@@ -0,0 +1,37 @@
+import hashlib
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+# orjson encodes datetime/date natively (naive values exactly as isoformat() does),
+# so only BSON types need a default hook
+_ENCODERS = {ObjectId: str}
+
+
+def _default(value):
+    encoder = _ENCODERS.get(type(value))
+    if encoder is None:
+        raise TypeError(f"Cannot serialise {type(value).__name__}")
+    return encoder(value)
+
+
+def dumps(content) -> bytes:
+    """Compact JSON bytes for Mongo documents (ObjectId -> str, datetimes as ISO 8601)."""
+    return orjson.dumps(content, default=_default)
+
+
+def content_hash(content) -> str:
+    """Stable digest of JSON-like content: key order does not matter."""
+    return hashlib.blake2b(orjson.dumps(content, default=_default, option=orjson.OPT_SORT_KEYS),
+                           digest_size=16).hexdigest()
+
+
+class MongoJSONResponse(JSONResponse):
+    """
+    orjson-rendered JSON response. Returned directly from a route it also skips
+    FastAPI's jsonable_encoder / response_model pass, so documents go straight
+    from Motor to bytes.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,43 @@
+"""
+Compute search_keys for farmers created before fuzzy search existed (or recompute
+all of them after changing farmer_search's key scheme with --all).
+
+    python scripts/backfill_search_keys.py [--all] [--batch 1000]
+"""
+import argparse
+import os
+import sys
+
+# ✅ Ensure '/app' (parent of scripts) is in Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.indexes import ensure_indexes_sync
+from app.services.farmer_search import SEARCH_FIELD, search_keys
+from pymongo import MongoClient, UpdateOne
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--all", action="store_true", help="recompute keys that already exist too")
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = MongoClient(settings.MONGO_URI)[settings.MONGO_DB]
+    ensure_indexes_sync(db)
+    query = {} if args.all else {SEARCH_FIELD: {"$exists": False}}
+    cursor = db.farmers.find(query, {"farmer_id": 1, "personal_info": 1, "address": 1}).batch_size(args.batch)
+
+    ops, updated = [], 0
+    for doc in cursor:
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {SEARCH_FIELD: search_keys(doc)}}))
+        if len(ops) >= args.batch:
+            updated += db.farmers.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        updated += db.farmers.bulk_write(ops, ordered=False).modified_count
+    print(f"✅ search_keys written for {updated} farmers")
+
+
+if __name__ == "__main__":
+    main()
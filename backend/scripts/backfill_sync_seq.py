@@ -0,0 +1,51 @@
+"""
+Number farmers written before the delta feed existed (GET /api/sync/changes), in
+created_at order, so tablets pulling from scratch receive them. Safe to re-run:
+only farmers without a sync_seq are touched.
+
+    python scripts/backfill_sync_seq.py [--batch 1000]
+"""
+import argparse
+import os
+import sys
+
+# ✅ Ensure '/app' (parent of scripts) is in Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.indexes import ensure_indexes_sync
+from app.services.farmer_changes import SEQ_FIELD, reserve_sync
+from pymongo import MongoClient, UpdateOne
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = MongoClient(settings.MONGO_URI)[settings.MONGO_DB]
+    ensure_indexes_sync(db)
+    # only _id: sequence numbers are stamped without touching updated_at
+    cursor = db.farmers.find({SEQ_FIELD: {"$exists": False}}, {"_id": 1}) \
+        .sort([("created_at", 1), ("_id", 1)]).batch_size(args.batch)
+
+    ids, updated = [], 0
+
+    def flush():
+        with reserve_sync(db, len(ids)) as first:
+            ops = [UpdateOne({"_id": _id, SEQ_FIELD: {"$exists": False}}, {"$set": {SEQ_FIELD: first + i}})
+                   for i, _id in enumerate(ids)]
+            return db.farmers.bulk_write(ops, ordered=False).modified_count
+
+    for doc in cursor:
+        ids.append(doc["_id"])
+        if len(ids) >= args.batch:
+            updated += flush()
+            ids = []
+    if ids:
+        updated += flush()
+    print(f"✅ sync_seq assigned to {updated} farmers")
+
+
+if __name__ == "__main__":
+    main()
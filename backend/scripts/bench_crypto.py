@@ -0,0 +1,78 @@
+"""
+Benchmark NRC protection: the original per-record helpers vs. the keyring batch path.
+
+    python scripts/bench_crypto.py --records 10000 100000
+
+"legacy" re-derives the key from JWT_SECRET and hashes with sha256(secret + value)
+for every record, as encrypt_sensitive_fields did; "batch" is
+FarmerService.encrypt_sensitive_batch (derived keys cached per process, one call per
+sync chunk, lookup hashes for every key id plus the pre-keyring hash).
+"""
+import argparse
+import base64
+import hashlib
+import os
+import random
+import sys
+import time
+from copy import deepcopy
+
+# ✅ Ensure the backend root (parent of scripts) is in Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+
+from Crypto.Cipher import AES
+from app.config import settings
+from app.services.farmer_service import FarmerService
+
+
+def legacy_encrypt(value: str) -> str:
+    key = hashlib.sha256(settings.JWT_SECRET.encode()).digest()
+    nonce = hashlib.sha1(value.encode()).digest()[:12]
+    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+    ciphertext, tag = cipher.encrypt_and_digest(value.encode())
+    return base64.urlsafe_b64encode(ciphertext).decode()
+
+
+def legacy_hash(value: str) -> str:
+    return hashlib.sha256(settings.JWT_SECRET.encode() + value.encode()).hexdigest()
+
+
+def legacy_fields(farmer: dict):
+    if farmer.get("nrc_number"):
+        val = farmer["nrc_number"]
+        farmer["nrc_encrypted"] = legacy_encrypt(val)
+        farmer["nrc_hash"] = legacy_hash(val)
+        farmer.pop("nrc_number", None)
+    return farmer
+
+
+def run_legacy(records, chunk):
+    for rec in records:
+        legacy_fields(rec)
+
+
+def run_batch(records, chunk):
+    for start in range(0, len(records), chunk):
+        FarmerService.encrypt_sensitive_batch(records[start:start + chunk])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--chunk", type=int, default=settings.SYNC_BULK_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    rng = random.Random(13)
+    for n in args.records:
+        base = [{"nrc_number": f"{rng.randint(0, 999999):06d}/{rng.randint(10, 99)}/1"} for _ in range(n)]
+        for label, fn in (("legacy", run_legacy), ("batch", run_batch)):
+            records = deepcopy(base)
+            start = time.perf_counter()
+            fn(records, args.chunk)
+            elapsed = time.perf_counter() - start
+            print(f"{n:>8} records  {label:<7} {n / elapsed:>10,.0f} rec/s  {elapsed * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
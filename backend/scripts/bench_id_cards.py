@@ -0,0 +1,89 @@
+"""
+Benchmark ID-card rendering: the original one-card-per-task path vs. the batch pipeline.
+
+    python scripts/bench_id_cards.py --cards 480 --processes 4
+
+Only rendering is timed (no Mongo, no broker). Output goes to a temp directory.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# ✅ Ensure the backend root (parent of scripts) is in Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+
+import qrcode
+from fpdf import FPDF
+from app.tasks import id_card_task
+
+
+def make_farmers(n: int):
+    return [
+        {"farmer_id": f"ZM{i:08X}", "personal_info": {"first_name": f"Farmer{i}", "last_name": "Phiri"}}
+        for i in range(n)
+    ]
+
+
+def legacy_card(farmer: dict, out_dir: str, qr_dir: str):
+    """The original task body: QR PNG written to disk and read back, fresh FPDF per card."""
+    farmer_id = farmer["farmer_id"]
+    qr_data = {"farmer_id": farmer_id, "verified": True, "timestamp": datetime.utcnow().isoformat()}
+    qr_path = os.path.join(qr_dir, f"{farmer_id}_qr.png")
+    qrcode.make(qr_data).save(qr_path)
+    pdf = FPDF("P", "mm", (90, 60))
+    pdf.add_page()
+    pdf.set_font("Helvetica", "B", 14)
+    pdf.cell(0, 10, "Farmer ID Card", ln=True, align="C")
+    pdf.image(qr_path, x=60, y=20, w=25, h=25)
+    name = f"{farmer['personal_info']['first_name']} {farmer['personal_info']['last_name']}"
+    pdf.set_xy(5, 50)
+    pdf.set_font("Helvetica", size=10)
+    pdf.multi_cell(0, 5, f"Name: {name}\nID: {farmer_id}", align="L")
+    pdf.output(os.path.join(out_dir, f"{farmer_id}_card.pdf"))
+
+
+def timed(label: str, n: int, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {n / elapsed:>8.1f} cards/s  {elapsed:>7.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=480)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    farmers = make_farmers(args.cards)
+    chunk = id_card_task.RENDER_CHUNK
+    chunks = [farmers[i:i + chunk] for i in range(0, len(farmers), chunk)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cards_dir = os.path.join(tmp, "idcards")
+        qr_dir = os.path.join(tmp, "qr")
+        os.makedirs(cards_dir)
+        os.makedirs(qr_dir)
+
+        timed("single-card task (legacy)", len(farmers),
+              lambda: [legacy_card(f, cards_dir, qr_dir) for f in farmers])
+        timed("batch, in-process", len(farmers),
+              lambda: [id_card_task.render_chunk(c, cards_dir) for c in chunks])
+        timed("batch + A4 sheets, in-process", len(farmers),
+              lambda: [id_card_task.render_chunk(c, cards_dir, os.path.join(tmp, f"sheet_{n}.pdf"))
+                       for n, c in enumerate(chunks)])
+
+        # stands in for render_id_card_chunk tasks spread over the cards worker's children
+        def pooled():
+            with ProcessPoolExecutor(max_workers=args.processes) as pool:
+                list(pool.map(id_card_task.render_chunk, chunks, [cards_dir] * len(chunks)))
+        timed(f"batch, {args.processes} processes", len(farmers), pooled)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Per-document encode cost of the farmer endpoints: the previous FastAPI path vs.
+MongoJSONResponse.
+
+    python scripts/bench_serialization.py --docs 200 --rounds 50
+
+- list:   jsonable_encoder + json.dumps of a page (what FastAPI does for a returned
+          dict, after the route stringified each _id) vs. orjson on the raw documents.
+- create: FarmerOut response_model validation + jsonable_encoder + json.dumps vs.
+          shaping the dict to FarmerOut's fields + orjson.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# ✅ Ensure the backend root (parent of scripts) is in Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from app.models.farmer import FarmerOut
+from app.routes.farmers import FARMER_OUT_FIELDS
+from app.utils.serialization import dumps
+
+
+def starlette_json(content) -> bytes:
+    # starlette.responses.JSONResponse.render
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def make_doc(i: int, rng: random.Random) -> dict:
+    return {
+        "_id": ObjectId(),
+        "farmer_id": f"ZM{i:08X}",
+        "temp_id": f"T-{i}",
+        "personal_info": {"first_name": "Mwila", "last_name": "Banda", "phone_primary": f"+2609{i:08d}",
+                          "date_of_birth": "1980-04-12", "gender": rng.choice(["M", "F"])},
+        "address": {"province": "Central", "district": "Kabwe", "village": "Chowa",
+                    "gps_latitude": rng.uniform(-18, -8), "gps_longitude": rng.uniform(21, 34)},
+        "nrc_hash": "k0:" + "ab" * 32,
+        "registration_status": "pending",
+        "photo_thumb_path": f"/uploads/photos/ab/{i:064x}/thumb.jpg",
+        "created_at": datetime(2024, 1, 1) + timedelta(seconds=i),
+        "updated_at": datetime(2024, 2, 1) + timedelta(seconds=i),
+    }
+
+
+def legacy_list(docs):
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    return starlette_json(jsonable_encoder({"count": len(docs), "results": docs, "next_cursor": None}))
+
+
+def fast_list(docs):
+    return dumps({"count": len(docs), "results": docs, "next_cursor": None})
+
+
+def legacy_create(docs):
+    for doc in docs:
+        model = FarmerOut.parse_obj(doc)
+        starlette_json(jsonable_encoder(model))
+
+
+def fast_create(docs):
+    for doc in docs:
+        dumps({k: doc.get(k) for k in FARMER_OUT_FIELDS})
+
+
+def measure(fn, make_docs, rounds: int) -> float:
+    """Best per-document time in microseconds over `rounds` fresh copies."""
+    best = float("inf")
+    for _ in range(rounds):
+        docs = make_docs()
+        start = time.perf_counter()
+        fn(docs)
+        best = min(best, (time.perf_counter() - start) / len(docs))
+    return best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=200, help="page size (MAX_PAGE_SIZE is 200)")
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    base = [make_doc(i, rng) for i in range(args.docs)]
+
+    def make_docs():
+        return [{**d, "personal_info": dict(d["personal_info"]), "address": dict(d["address"])} for d in base]
+
+    for endpoint, legacy, fast in (("list", legacy_list, fast_list), ("create", legacy_create, fast_create)):
+        before = measure(legacy, make_docs, args.rounds)
+        after = measure(fast, make_docs, args.rounds)
+        print(f"{endpoint:<7} before {before:>8.2f} us/doc  after {after:>7.2f} us/doc  x{before / after:>5.1f}")
+
+
+if __name__ == "__main__":
+    main()
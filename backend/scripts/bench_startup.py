@@ -0,0 +1,172 @@
+"""
+Cold-start guard for the API process: time and memory to import app.main, and
+which modules it drags in.
+
+    python scripts/bench_startup.py [--runs 5] --out bench_results/startup.json
+    python scripts/bench_startup.py --compare bench_results/startup.json [--max-regression 0.25]
+    python scripts/bench_startup.py --max-import-ms 1200 --max-rss-mb 80
+
+Each run is a fresh interpreter (no warm module cache in-process). Prints the
+median import time, peak RSS, the slowest imports (python -X importtime) and
+fails (exit 1) when:
+
+- app.main imports a worker-only module (PDF / QR / image rendering, task bodies)
+- a task name the API enqueues by (celery_app.*_TASK) is not registered by the
+  worker's task modules
+- with --compare: the median import time, RSS or module count is more than
+  --max-regression above an earlier --out result from the same machine
+- with --max-import-ms / --max-rss-mb: the median exceeds that absolute limit.
+  Import time depends on the machine and its load, so only set these for a
+  known host.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND)
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+
+# loaded by Celery workers only; the API enqueues by task name
+WORKER_ONLY_MODULES = (
+    "fpdf", "qrcode", "PIL",
+    "app.tasks.id_card_task", "app.tasks.sync_tasks", "app.tasks.stats_tasks",
+)
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+rss_kb = 0
+try:
+    with open("/proc/self/status") as status:
+        rss_kb = next(int(line.split()[1]) for line in status if line.startswith("VmHWM:"))
+except OSError:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"import_ms": elapsed * 1000, "rss_mb": rss_kb / 1024,
+                  "modules": len(sys.modules), "loaded": sorted(sys.modules)}))
+"""
+
+
+def probe(workdir: str, importtime: bool = False) -> tuple:
+    env = {**os.environ, "PYTHONPATH": BACKEND, "PYTHONDONTWRITEBYTECODE": "1"}
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE]
+    proc = subprocess.run(cmd, cwd=workdir, env=env, capture_output=True, text=True)
+    if proc.returncode:
+        raise SystemExit(f"❌ import app.main failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def slowest_imports(importtime_log: str, top: int) -> list:
+    """(cumulative µs, module) of the top-level-ish imports, slowest first."""
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def unregistered_task_names() -> list:
+    from app.tasks import celery_app as module
+    for name in module.celery_app.conf.include:
+        importlib.import_module(name)
+    names = [value for key, value in vars(module).items() if key.endswith("_TASK")]
+    return [name for name in names if name not in module.celery_app.tasks]
+
+
+def compare(results: dict, baseline_path: str, max_regression: float) -> list:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get("host") != results["host"] or baseline.get("python") != results["python"]:
+        print(f"⚠️  baseline ran on {baseline.get('host')} / Python {baseline.get('python')}; "
+              "numbers are not comparable")
+    print(f"vs {baseline_path} ({baseline.get('timestamp')}):")
+    regressions = []
+    for key, unit in (("import_ms", "ms"), ("rss_mb", "MB"), ("modules", "modules")):
+        before, now = baseline.get(key), results[key]
+        if not before:
+            continue
+        ratio = now / before
+        flag = ratio > 1 + max_regression
+        print(f"  {key:>9}: {before:.1f} -> {now:.1f} {unit}  x{ratio:.2f}" + ("  ❌" if flag else ""))
+        if flag:
+            regressions.append(f"{key} {now:.1f} {unit} is x{ratio:.2f} the baseline's {before:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--out", help="write the medians here, as a baseline for --compare")
+    parser.add_argument("--compare", help="earlier --out result to check against")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="allowed growth (0.25 = 25%%)")
+    parser.add_argument("--max-import-ms", type=float, help="absolute limit; off by default")
+    parser.add_argument("--max-rss-mb", type=float, help="absolute limit; off by default")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, "uploads"))  # StaticFiles mount
+        runs = [probe(workdir)[0] for _ in range(args.runs)]
+        _, importtime_log = probe(workdir, importtime=True)
+
+    import_ms = statistics.median(r["import_ms"] for r in runs)
+    rss_mb = statistics.median(r["rss_mb"] for r in runs)
+    print(f"import app.main: median {import_ms:.0f} ms over {args.runs} runs "
+          f"(min {min(r['import_ms'] for r in runs):.0f}), peak RSS {rss_mb:.1f} MB, "
+          f"{runs[0]['modules']} modules")
+    print("slowest imports (cumulative):")
+    for micros, name in slowest_imports(importtime_log, args.top):
+        print(f"  {micros / 1000:>8.1f} ms  {name}")
+
+    loaded = set(runs[0]["loaded"])
+    leaked = [m for m in WORKER_ONLY_MODULES if m in loaded]
+    if leaked:
+        failures.append(f"app.main imports worker-only modules: {leaked}")
+    if args.max_import_ms and import_ms > args.max_import_ms:
+        failures.append(f"import time {import_ms:.0f} ms > {args.max_import_ms:.0f} ms")
+    if args.max_rss_mb and rss_mb > args.max_rss_mb:
+        failures.append(f"RSS {rss_mb:.1f} MB > {args.max_rss_mb:.0f} MB")
+    missing = unregistered_task_names()
+    if missing:
+        failures.append(f"task names not registered by any worker module: {missing}")
+
+    results = {
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "runs": args.runs,
+        "import_ms": round(import_ms, 1),
+        "rss_mb": round(rss_mb, 1),
+        "modules": runs[0]["modules"],
+    }
+    if args.compare:
+        failures += compare(results, args.compare, args.max_regression)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.out}")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ startup within limits")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
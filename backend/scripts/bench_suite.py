@@ -0,0 +1,352 @@
+"""
+End-to-end benchmark of the API on local stand-ins, in one process:
+
+    python scripts/bench_suite.py --dataset 10k
+    python scripts/bench_suite.py --dataset 100k --mongo-uri mongodb://localhost:27017
+    python scripts/bench_suite.py --dataset 10k --compare bench_results/<commit>_10k.json
+
+The app runs under Starlette's TestClient (startup hooks included) against
+mongomock, or a scratch database on a local mongod with --mongo-uri, and
+fakeredis (pip install -r requirements-bench.txt). Celery runs eagerly: the
+API enqueues by task name and task_always_eager does not cover send_task, so
+send_task is pointed at the registered task's apply() and the work happens
+inside the request being timed.
+
+A synthetic registry of --dataset farmers (records shaped like
+sync_payload.json, spread over Zambia's provinces and districts; same --seed,
+same data) is written through the sync engine first. Then each scenario sends
+its requests one at a time and records throughput and p50 / p95 / p99:
+
+    login    POST /api/auth/login (bcrypt at BCRYPT_ROUNDS)
+    list     GET /api/farmers/, walking next_cursor through the registry
+    get      GET /api/farmers/{farmer_id}
+    sync     POST /api/sync/batch with --sync-batch new records, processed inline
+    upload   POST /api/farmers/{farmer_id}/upload-photo, a distinct JPEG each time
+    idcard   POST /api/farmers/{farmer_id}/generate-idcard, rendered inline
+
+Results go to --out (default bench_results/<commit>_<dataset>.json). With
+--compare, exits 1 when a scenario's p95 is more than --max-regression slower
+than in the given earlier result. Only compare runs on the same backend:
+mongomock has no indexes, so every lookup scans the registry in Python (sync
+dedup and list pages slow down with --dataset far sooner than on mongod), and
+100k / 1m are only practical with --mongo-uri.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# ✅ Ensure the backend root (parent of scripts) is in Python path
+sys.path.append(BACKEND)
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+
+DATASETS = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+SCENARIOS = ("login", "list", "get", "sync", "upload", "idcard")
+# requests per scenario at --repeat 1
+REQUESTS = {"login": 20, "list": 300, "get": 300, "sync": 20, "upload": 30, "idcard": 30}
+SEED_CHUNK = 5000
+PAGE_SIZE = 50
+ID_SAMPLE = 1000
+BENCH_USER, BENCH_PASSWORD = "bench@agrimanage.com", "bench-password"
+
+# province -> (centre latitude, centre longitude, districts)
+PROVINCES = {
+    "Central": (-14.0, 28.5, ["Kabwe", "Kapiri Mposhi", "Mkushi", "Serenje", "Chibombo"]),
+    "Copperbelt": (-12.9, 28.2, ["Ndola", "Kitwe", "Chingola", "Luanshya", "Mufulira"]),
+    "Eastern": (-13.3, 32.0, ["Chipata", "Petauke", "Katete", "Lundazi"]),
+    "Luapula": (-11.0, 29.0, ["Mansa", "Kawambwa", "Nchelenge", "Samfya"]),
+    "Lusaka": (-15.4, 28.9, ["Lusaka", "Chilanga", "Kafue", "Chongwe"]),
+    "Muchinga": (-11.5, 31.8, ["Chinsali", "Mpika", "Nakonde", "Isoka"]),
+    "Northern": (-9.8, 30.9, ["Kasama", "Mbala", "Mpulungu", "Luwingu"]),
+    "North-Western": (-13.0, 25.0, ["Solwezi", "Kasempa", "Mwinilunga", "Zambezi"]),
+    "Southern": (-16.6, 27.0, ["Choma", "Monze", "Mazabuka", "Livingstone", "Kalomo"]),
+    "Western": (-15.3, 23.3, ["Mongu", "Senanga", "Kaoma", "Sesheke"]),
+}
+FIRST_NAMES = ["Chanda", "Mwila", "Bwalya", "Mulenga", "Mutale", "Lubinda", "Namukolo", "Mwape", "Chilufya",
+               "Musonda", "Nkandu", "Thandiwe", "Mapalo", "Chipo", "Joseph", "Grace", "Moses", "Esther"]
+LAST_NAMES = ["Banda", "Phiri", "Mwanza", "Tembo", "Zulu", "Mumba", "Sakala", "Lungu", "Daka", "Mbewe",
+              "Chileshe", "Kapembwa", "Simfukwe", "Nyirenda", "Mwale", "Ngoma"]
+PHONE_PREFIXES = ["95", "96", "97", "76", "77"]
+
+
+def make_farmer(rng: random.Random, i: int, run: str) -> dict:
+    """One tablet record; NRC, phone and temp_id are unique per index i (up to 100M)."""
+    province = rng.choice(list(PROVINCES))
+    lat, lon, districts = PROVINCES[province]
+    return {
+        "temp_id": f"bench_{run}_{i}",
+        "nrc_number": f"{i % 1_000_000:06d}/{i // 1_000_000 % 100:02d}/1",
+        "personal_info": {
+            "first_name": rng.choice(FIRST_NAMES),
+            "last_name": rng.choice(LAST_NAMES),
+            "phone_primary": f"+260{PHONE_PREFIXES[i % 5]}{i // 5:07d}",
+            "date_of_birth": f"{rng.randint(1950, 2004)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        },
+        "address": {
+            "province": province,
+            "district": rng.choice(districts),
+            "gps_latitude": round(lat + rng.uniform(-0.8, 0.8), 5),
+            "gps_longitude": round(lon + rng.uniform(-0.8, 0.8), 5),
+        },
+    }
+
+
+def git_commit() -> dict:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=BACKEND, capture_output=True, text=True, check=True).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain"))}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": "unknown", "dirty": None}
+
+
+def summarise(latencies: list, elapsed: float, errors: int, records: int) -> dict:
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    out = {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(cuts[49] * 1000, 2),
+        "p95_ms": round(cuts[94] * 1000, 2),
+        "p99_ms": round(cuts[98] * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+    if records:
+        out["records_per_s"] = round(records / elapsed, 1)
+    return out
+
+
+def measure(name: str, count: int, request) -> dict:
+    """Call request(i) -> (response, records handled or 0) `count` times, one at a time."""
+    latencies, errors, records = [], 0, 0
+    started = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter()
+        response, handled = request(i)
+        latencies.append(time.perf_counter() - t0)
+        if response.status_code >= 400:
+            errors += 1
+        else:
+            records += handled
+    result = summarise(latencies, time.perf_counter() - started, errors, records)
+    print(f"{name:>8}: n={result['requests']:<4} {result['requests_per_s']:>8.1f} req/s  "
+          f"p50={result['p50_ms']:.1f} ms  p95={result['p95_ms']:.1f} ms  p99={result['p99_ms']:.1f} ms"
+          + (f"  {result['records_per_s']:.0f} rec/s" if "records_per_s" in result else "")
+          + (f"  ❌ {errors} errors" if errors else ""))
+    return result
+
+
+def use_stand_ins(mongo_uri: str | None) -> str:
+    """Point the app's Mongo, Redis and Celery at local stand-ins; returns the backend label."""
+    import fakeredis
+    from app import database
+    from app.tasks import worker_db
+    from app.tasks.celery_app import celery_app
+    from app.utils import redis_client
+
+    server = fakeredis.FakeServer()
+    redis_client._client, redis_client._client_pid = fakeredis.FakeRedis(server=server), os.getpid()
+    redis_client._async_client = fakeredis.aioredis.FakeRedis(server=server)
+
+    if not mongo_uri:
+        import mongomock
+        from mongomock_motor import AsyncMongoMockClient
+        shared = mongomock.MongoClient()   # one store for the API (Motor) and task (pymongo) sides
+        database._client = AsyncMongoMockClient(mock_mongo_client=shared)
+        worker_db._client, worker_db._client_pid = shared, os.getpid()
+
+    celery_app.conf.update(task_always_eager=True, task_eager_propagates=True, result_backend="cache+memory://")
+    celery_app.loader.import_default_modules()
+
+    def send_inline(name, args=None, kwargs=None, task_id=None, **options):
+        return celery_app.tasks[name].apply(args=args, kwargs=kwargs, task_id=task_id)
+
+    celery_app.send_task = send_inline
+    return mongo_uri or "mongomock"
+
+
+def seed(size: int, rng: random.Random) -> tuple:
+    """Write the registry through the sync engine; returns (seconds, sample of farmer_ids)."""
+    from app.services.sync_service import SyncService
+    from app.tasks.worker_db import get_db_sync
+    from app.utils.security import hash_password
+
+    db = get_db_sync()
+    db.users.insert_one({"email": BENCH_USER, "password_hash": hash_password(BENCH_PASSWORD),
+                         "roles": ["ADMIN"], "is_active": True, "created_at": datetime.utcnow()})
+    sample, seen = [], 0
+    started = time.perf_counter()
+    for first in range(0, size, SEED_CHUNK):
+        records = [make_farmer(rng, i, "seed") for i in range(first, min(size, first + SEED_CHUNK))]
+        for r in SyncService.process_batch(db, "seed@bench", records):
+            # reservoir sample, so get / upload / idcard hit farmers across the whole registry
+            seen += 1
+            if len(sample) < ID_SAMPLE:
+                sample.append(r["farmer_id"])
+            elif (j := rng.randrange(seen)) < ID_SAMPLE:
+                sample[j] = r["farmer_id"]
+        print(f"  seeded {min(size, first + SEED_CHUNK)}/{size}", end="\r", flush=True)
+    elapsed = time.perf_counter() - started
+    print(f"  seeded {size} farmers in {elapsed:.1f}s ({size / elapsed:.0f} rec/s)")
+    return elapsed, sample
+
+
+def jpeg(rng: random.Random, n: int) -> bytes:
+    from PIL import Image
+    image = Image.effect_noise((1200, 900), 64).convert("RGB")
+    image.putpixel((n % 1200, n // 1200 % 900), (rng.randrange(256), n % 256, 0))  # distinct content hash
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def run_scenarios(client, names: list, repeat: float, sync_batch: int, size: int, ids: list,
+                  rng: random.Random) -> dict:
+    def count(name):
+        return max(2, round(REQUESTS[name] * repeat))
+
+    login = client.post("/api/auth/login", json={"username": BENCH_USER, "password": BENCH_PASSWORD})
+    login.raise_for_status()
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    results = {}
+
+    if "login" in names:
+        results["login"] = measure("login", count("login"), lambda i: (
+            client.post("/api/auth/login", json={"username": BENCH_USER, "password": BENCH_PASSWORD}), 0))
+
+    if "list" in names:
+        cursor = {"next": None}
+
+        def list_page(i):
+            params = {"limit": PAGE_SIZE, **({"cursor": cursor["next"]} if cursor["next"] else {})}
+            response = client.get("/api/farmers/", params=params, headers=headers)
+            cursor["next"] = response.json().get("next_cursor") if response.status_code == 200 else None
+            return response, PAGE_SIZE
+        results["list"] = measure("list", count("list"), list_page)
+
+    if "get" in names:
+        results["get"] = measure("get", count("get"), lambda i: (
+            client.get(f"/api/farmers/{rng.choice(ids)}", headers=headers), 0))
+
+    if "sync" in names:
+        run = uuid.uuid4().hex[:8]
+
+        def sync(i):
+            farmers = [make_farmer(rng, size + i * sync_batch + k, run) for k in range(sync_batch)]
+            return client.post("/api/sync/batch", json={"farmers": farmers}, headers=headers), sync_batch
+        results["sync"] = measure("sync", count("sync"), sync)
+
+    if "upload" in names:
+        photos = [jpeg(rng, n) for n in range(count("upload"))]
+        results["upload"] = measure("upload", len(photos), lambda i: (
+            client.post(f"/api/farmers/{rng.choice(ids)}/upload-photo", headers=headers,
+                        files={"file": ("photo.jpg", photos[i], "image/jpeg")}), 0))
+
+    if "idcard" in names:
+        # the background task (the render) finishes before TestClient returns
+        results["idcard"] = measure("idcard", count("idcard"), lambda i: (
+            client.post(f"/api/farmers/{rng.choice(ids)}/generate-idcard", headers=headers), 0))
+
+    return results
+
+
+def compare(results: dict, baseline_path: str, max_regression: float) -> list:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if (baseline.get("backend"), baseline.get("dataset")) != (results["backend"], results["dataset"]):
+        print(f"⚠️  baseline ran on {baseline.get('backend')} / {baseline.get('dataset')}; numbers are not comparable")
+    print(f"p95 vs {baseline.get('commit')} ({baseline_path}):")
+    regressions = []
+    for name, now in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        ratio = now["p95_ms"] / before["p95_ms"] if before["p95_ms"] else 1.0
+        flag = ratio > 1 + max_regression
+        print(f"{name:>8}: {before['p95_ms']:.1f} -> {now['p95_ms']:.1f} ms  x{ratio:.2f}" + ("  ❌" if flag else ""))
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", choices=DATASETS, default="10k")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset")
+    parser.add_argument("--repeat", type=float, default=1.0, help="scale every scenario's request count")
+    parser.add_argument("--sync-batch", type=int, default=100, help="records per sync request")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mongo-uri", help="local mongod to use instead of mongomock (a scratch database)")
+    parser.add_argument("--out", help="result file (default bench_results/<commit>_<dataset>.json)")
+    parser.add_argument("--compare", help="earlier result file to check p95 against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    names = [n for n in args.scenarios.split(",") if n]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {sorted(unknown)}")
+    size = DATASETS[args.dataset]
+    rng = random.Random(args.seed)
+    version = git_commit()
+    out_path = args.out or os.path.join(BACKEND, "bench_results", f"{version['commit']}_{args.dataset}.json")
+
+    workdir = tempfile.TemporaryDirectory()
+    os.makedirs(os.path.join(workdir.name, "uploads"))   # StaticFiles mount and upload routes are cwd-relative
+    # settings are read at import, so everything is configured before the app is loaded
+    os.environ["ID_CARD_DIR"] = os.path.join(workdir.name, "uploads", "idcards")
+    scratch_db = None
+    if args.mongo_uri:
+        scratch_db = f"bench_{uuid.uuid4().hex[:8]}"
+        os.environ.update(MONGO_URI=args.mongo_uri, MONGO_DB=scratch_db)
+    os.chdir(workdir.name)
+
+    backend = use_stand_ins(args.mongo_uri)
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    print(f"Dataset {args.dataset} ({size} farmers) on {backend}, commit {version['commit']}")
+    try:
+        seed_seconds, ids = seed(size, rng)
+        with TestClient(app) as client:
+            scenarios = run_scenarios(client, names, args.repeat, args.sync_batch, size, ids, rng)
+    finally:
+        if scratch_db:
+            from app.tasks.worker_db import get_client_sync
+            get_client_sync().drop_database(scratch_db)
+        os.chdir(BACKEND)
+        workdir.cleanup()
+
+    results = {
+        **version,
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "backend": "mongod" if args.mongo_uri else backend,
+        "dataset": args.dataset,
+        "farmers": size,
+        "seed": args.seed,
+        "seed_seconds": round(seed_seconds, 2),
+        "scenarios": scenarios,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {out_path}")
+
+    if args.compare and compare(results, args.compare, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
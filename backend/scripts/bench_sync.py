@@ -0,0 +1,179 @@
+"""
+Benchmark the sync engine: legacy per-record writes vs. the batched bulk_write path.
+
+    python scripts/bench_sync.py --records 5000 --latency-ms 0.5
+
+Uses mongomock when installed (pip install -r requirements-bench.txt), otherwise
+a scratch database on MONGO_URI. `--latency-ms` adds a simulated round-trip cost
+to every collection call so the stand-in behaves more like a networked mongod.
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from copy import deepcopy
+from datetime import datetime
+
+# ✅ Ensure the backend root (parent of scripts) is in Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+
+from app.config import settings
+from app.services.farmer_service import FarmerService
+from app.services.sync_service import SyncService
+
+PROVINCES = {
+    "Central": ["Kabwe", "Kapiri Mposhi", "Mkushi"],
+    "Lusaka": ["Chilanga", "Kafue", "Chongwe"],
+    "Southern": ["Choma", "Monze", "Mazabuka"],
+}
+
+
+class CountingCollection:
+    """Proxy that counts (and optionally delays) every call that hits the server."""
+
+    def __init__(self, coll, latency_s: float):
+        self._coll = coll
+        self._latency_s = latency_s
+        self.calls = 0
+
+    def _hit(self):
+        self.calls += 1
+        if self._latency_s:
+            time.sleep(self._latency_s)
+
+    def __getattr__(self, name):
+        attr = getattr(self._coll, name)
+        if name not in ("find", "find_one", "insert_one", "update_one", "bulk_write"):
+            return attr
+
+        def wrapped(*args, **kwargs):
+            self._hit()
+            return attr(*args, **kwargs)
+        return wrapped
+
+
+class BenchDB:
+    def __init__(self, db, latency_s: float):
+        self._db = db
+        self.farmers = CountingCollection(db.farmers, latency_s)
+
+    def __getitem__(self, name):
+        # side collections (farmer_stats) are not counted
+        return self._db[name]
+
+
+def make_records(n: int, offset: int = 0, date_of_birth: str = "1985-06-01"):
+    provinces = list(PROVINCES)
+    records = []
+    for i in range(offset, offset + n):
+        province = provinces[i % len(provinces)]
+        records.append({
+            "temp_id": f"offline_{i}",
+            "nrc_number": f"{i % 1000000:06d}/{i % 100:02d}/{i % 10}",
+            "personal_info": {
+                "first_name": f"Farmer{i}",
+                "last_name": "Banda",
+                "phone_primary": f"+26097{i % 10000000:07d}",
+                "date_of_birth": date_of_birth,
+            },
+            "address": {
+                "province": province,
+                "district": PROVINCES[province][i % 3],
+                "gps_latitude": -13.0 - (i % 40) / 10,
+                "gps_longitude": 28.0 + (i % 40) / 10,
+            },
+        })
+    return records
+
+
+def legacy_process(db, user_email, records):
+    """The original one-find_one-plus-one-write-per-record loop, kept for comparison."""
+    out_results = []
+    now = datetime.utcnow()
+    farmers_coll = db.farmers
+    for rec in records:
+        temp_id = rec.get("temp_id")
+        try:
+            FarmerService.validate_farmer_data(rec)
+            rec = FarmerService.encrypt_sensitive_fields(rec)
+        except Exception as e:
+            out_results.append({"temp_id": temp_id, "farmer_id": None, "status": "error", "errors": [str(e)]})
+            continue
+        query = {}
+        if temp_id:
+            query = {"temp_id": temp_id}
+        elif rec.get("nrc_hash"):
+            query = {"nrc_hash": rec["nrc_hash"]}
+        elif rec.get("personal_info", {}).get("phone_primary"):
+            query = {"personal_info.phone_primary": rec["personal_info"]["phone_primary"]}
+        existing = farmers_coll.find_one(query) if query else None
+        if existing:
+            rec["updated_at"] = now
+            rec["last_modified_by"] = user_email
+            farmers_coll.update_one({"_id": existing["_id"]}, {"$set": rec})
+            out_results.append({"temp_id": temp_id, "farmer_id": existing.get("farmer_id"),
+                                "status": "updated", "errors": []})
+        else:
+            rec["farmer_id"] = rec.get("farmer_id") or ("ZM" + uuid.uuid4().hex[:8].upper())
+            rec["created_at"] = now
+            rec["created_by"] = user_email
+            farmers_coll.insert_one(rec)
+            out_results.append({"temp_id": temp_id, "farmer_id": rec["farmer_id"],
+                                "status": "created", "errors": []})
+    return out_results
+
+
+def get_database():
+    try:
+        import mongomock
+        return mongomock.MongoClient()["bench_sync"], "mongomock"
+    except ImportError:
+        from pymongo import MongoClient
+        client = MongoClient(settings.MONGO_URI)
+        name = f"bench_sync_{uuid.uuid4().hex[:6]}"
+        return client[name], settings.MONGO_URI
+
+
+def run(label, fn, records, latency_s, seed):
+    raw, backend = get_database()
+    db = BenchDB(raw, latency_s)
+    fn(db, "seed@bench", deepcopy(seed))
+    db.farmers.calls = 0
+
+    start = time.perf_counter()
+    results = fn(db, "bench@bench", deepcopy(records))
+    elapsed = time.perf_counter() - start
+
+    statuses = {}
+    for r in results:
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+    print(f"{label:<8} {len(records) / elapsed:>10.0f} rec/s  {elapsed:>7.2f}s  "
+          f"{db.farmers.calls:>6} calls  {statuses}  [{backend}]")
+    if backend != "mongomock":
+        raw.client.drop_database(raw.name)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    records = make_records(args.records)
+    # half the batch already exists on the server (in an older version), half is new
+    older = make_records(args.records // 2, date_of_birth="1984-06-01")
+    latency_s = args.latency_ms / 1000
+    legacy = run("legacy", legacy_process, records, latency_s, older)
+    batched = run("batched", SyncService.process_batch, records, latency_s, older)
+
+    same = [(a["status"], a["temp_id"]) for a in legacy] == [(b["status"], b["temp_id"]) for b in batched]
+    print(f"per-record statuses identical: {same}")
+    # a tablet resending records the server already holds: the existing half is skipped
+    run("replay", SyncService.process_batch, records, latency_s, records[: args.records // 2])
+
+
+if __name__ == "__main__":
+    main()
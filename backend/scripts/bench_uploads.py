@@ -0,0 +1,85 @@
+"""
+Show how parallel uploads affect event-loop responsiveness.
+
+    python scripts/bench_uploads.py --uploads 16 --size-mb 5
+
+Runs N concurrent saves of spooled UploadFiles (as the multipart parser hands them
+to the routes) with the old blocking shutil.copyfileobj path and with the chunked
+thread-pool path, while a 1 ms ticker measures how late the loop wakes up.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# ✅ Ensure the backend root (parent of scripts) is in Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+
+from fastapi import UploadFile
+from app.utils.file_utils import save_upload
+
+
+async def legacy_save(file: UploadFile, dest: Path, max_bytes: int):
+    """The original save_file: blocking mkdir + copyfileobj on the event loop."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with dest.open("wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+
+
+def make_upload(payload: bytes) -> UploadFile:
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spool.write(payload)
+    spool.seek(0)
+    return UploadFile(file=spool, filename="photo.jpg")
+
+
+async def ticker(stop: asyncio.Event, lags: list):
+    interval = 0.001
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def run(label: str, saver, uploads: int, payload: bytes, root: Path):
+    files = [make_upload(payload) for _ in range(uploads)]
+    lags = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(stop, lags))
+    await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        saver(f, root / label / f"{i}.jpg", len(payload)) for i, f in enumerate(files)
+    ))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0.0
+    print(f"{label:<8} {elapsed:>6.2f}s  {len(payload) * uploads / elapsed / 2**20:>8.1f} MiB/s  "
+          f"loop lag median {statistics.median(lags or [0]):>6.2f} ms  p99 {p99:>6.2f} ms  "
+          f"max stall {max(lags or [0]):>7.2f} ms  ({len(lags)} ticks)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=16)
+    parser.add_argument("--size-mb", type=float, default=5)
+    args = parser.parse_args()
+
+    payload = os.urandom(int(args.size_mb * 1024 * 1024))
+    with tempfile.TemporaryDirectory() as tmp:
+        await run("legacy", legacy_save, args.uploads, payload, Path(tmp))
+        await run("chunked", save_upload, args.uploads, payload, Path(tmp))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
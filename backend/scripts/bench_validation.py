@@ -0,0 +1,125 @@
+"""
+Benchmark farmer validation: per-record validate_farmer_data vs. validate_batch.
+
+    python scripts/bench_validation.py --records 10000 100000
+
+The per-record path is the original implementation (strptime + utcnow per record,
+HTTPException per invalid record). Both paths must agree on which records fail and
+why; the script exits non-zero if they do not.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+# ✅ Ensure the backend root (parent of scripts) is in Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+
+from fastapi import HTTPException
+from app.services.farmer_service import (
+    FarmerService, NRC_PATTERN, ZAMBIA_LAT_RANGE, ZAMBIA_LON_RANGE,
+)
+
+
+def legacy_validate(data: dict):
+    """validate_farmer_data as it was before validate_batch."""
+    errors = []
+    personal = data.get("personal_info", {})
+    address = data.get("address", {})
+    nrc = data.get("nrc_number")
+    dob = personal.get("date_of_birth")
+    phone = personal.get("phone_primary")
+
+    if nrc and not NRC_PATTERN.match(nrc):
+        errors.append("Invalid NRC format, expected ######/##/#")
+    if dob:
+        try:
+            age = (datetime.utcnow() - datetime.strptime(dob, "%Y-%m-%d")).days // 365
+            if age < 18:
+                errors.append("Farmer must be at least 18 years old")
+        except ValueError:
+            errors.append("Invalid date_of_birth format (YYYY-MM-DD)")
+    lat, lon = address.get("gps_latitude"), address.get("gps_longitude")
+    if lat and lon:
+        if not (ZAMBIA_LAT_RANGE[0] <= lat <= ZAMBIA_LAT_RANGE[1]):
+            errors.append("Latitude out of Zambia bounds")
+        if not (ZAMBIA_LON_RANGE[0] <= lon <= ZAMBIA_LON_RANGE[1]):
+            errors.append("Longitude out of Zambia bounds")
+    if not phone or not phone.startswith("+260"):
+        errors.append("Phone must start with country code +260")
+    if errors:
+        raise HTTPException(status_code=400, detail={"message": "Validation failed", "errors": errors})
+    return True
+
+
+def make_records(n: int, seed: int = 7) -> list:
+    """Mostly valid records with ~10% bad NRC/date/GPS/phone values mixed in."""
+    rng = random.Random(seed)
+    this_year = datetime.utcnow().year
+    records = []
+    for i in range(n):
+        dob = f"{rng.randint(1950, this_year - 17)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        rec = {
+            "temp_id": f"T{i}",
+            "nrc_number": f"{rng.randint(0, 999999):06d}/{rng.randint(10, 99)}/1",
+            "personal_info": {"first_name": "A", "last_name": "B", "date_of_birth": dob,
+                              "phone_primary": f"+2609{rng.randint(10000000, 99999999)}"},
+            "address": {"province": "Central", "district": "Kabwe",
+                        "gps_latitude": rng.uniform(-18, -8), "gps_longitude": rng.uniform(21, 34)},
+        }
+        roll = rng.random()
+        if roll < 0.025:
+            rec["nrc_number"] = "12345/67/8"
+        elif roll < 0.05:
+            rec["personal_info"]["date_of_birth"] = rng.choice(["1990-13-01", "01/02/1990", "1990-1-5"])
+        elif roll < 0.075:
+            rec["address"]["gps_latitude"] = 5.0
+        elif roll < 0.1:
+            rec["personal_info"]["phone_primary"] = "0977123456"
+        records.append(rec)
+    return records
+
+
+def run_legacy(records: list) -> dict:
+    errors = {}
+    for i, rec in enumerate(records):
+        try:
+            legacy_validate(rec)
+        except HTTPException as e:
+            errors[i] = e.detail["errors"]
+    return errors
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    args = parser.parse_args()
+
+    ok = True
+    for n in args.records:
+        records = make_records(n)
+        legacy_s = batch_s = float("inf")
+        for _ in range(args.repeat):
+            expected, t = timed(run_legacy, records)
+            legacy_s = min(legacy_s, t)
+            got, t = timed(FarmerService.validate_batch, records)
+            batch_s = min(batch_s, t)
+        same = expected == got
+        ok = ok and same
+        print(f"{n:>8} records  per-record {legacy_s * 1000:>8.1f} ms  batch {batch_s * 1000:>8.1f} ms  "
+              f"x{legacy_s / batch_s:>4.1f}  invalid {len(got):>6}  {'match' if same else 'MISMATCH'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""
+Apply the index registry and verify no hot query plan uses a COLLSCAN.
+Exits non-zero on failure, so it can gate CI against a real mongod:
+
+    MONGO_URI=mongodb://localhost:27017 python scripts/check_query_plans.py
+"""
+import sys
+import os
+
+# ✅ Ensure '/app' (parent of scripts) is in Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.indexes import ensure_indexes_sync, assert_indexed_queries_sync
+from pymongo import MongoClient
+
+client = MongoClient(settings.MONGO_URI)
+db = client[settings.MONGO_DB]
+
+ensure_indexes_sync(db)
+try:
+    assert_indexed_queries_sync(db)
+except RuntimeError as e:
+    print(f"❌ {e}")
+    sys.exit(1)
+print("✅ All hot queries use an index")
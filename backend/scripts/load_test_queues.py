@@ -0,0 +1,132 @@
+"""
+Load test: sync latency while a large ID-card batch is rendering.
+
+Needs the real stack (Redis broker, Mongo, the sync and cards workers running):
+
+    python scripts/load_test_queues.py --cards 5000 --syncs 200 --rate 10
+
+1. seeds --cards farmers (district "LoadTest") through the sync queue
+2. baseline: sends --syncs small sync tasks at --rate per second, measures
+   enqueue -> result latency
+3. starts generate_id_cards_batch over the seeded farmers, repeats step 2
+   while it runs
+4. prints p50/p95/p99 for both phases; exits 1 if the loaded p95 is more than
+   --max-ratio times the baseline p95
+
+With the queues split, the loaded p95 should stay close to the baseline. Run
+with --cleanup to delete the seeded farmers afterwards.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+# ✅ Ensure the backend root (parent of scripts) is in Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.tasks.celery_app import ID_CARD_BATCH_TASK, STATS_REBUILD_TASK, SYNC_BATCH_TASK, celery_app
+from app.tasks.worker_db import get_db_sync
+
+DISTRICT = "LoadTest"
+USER = "loadtest@agrimanage.com"
+POLL_SECONDS = 0.01
+
+
+def farmer(run: str, i: int) -> dict:
+    return {
+        "temp_id": f"loadtest_{run}_{i}",
+        "personal_info": {"first_name": f"Load{i}", "last_name": "Test", "phone_primary": f"+260{900000000 + i}"},
+        "address": {"province": "Central", "district": DISTRICT},
+    }
+
+
+def wait_all(results: list, timeout: float) -> dict:
+    """Poll until every AsyncResult is ready; returns {task_id: monotonic time it was seen ready}."""
+    done, deadline = {}, time.monotonic() + timeout
+    while len(done) < len(results):
+        if time.monotonic() > deadline:
+            raise SystemExit(f"❌ {len(results) - len(done)} tasks not finished after {timeout}s")
+        for r in results:
+            if r.id not in done and r.ready():
+                done[r.id] = time.monotonic()
+        time.sleep(POLL_SECONDS)
+    return done
+
+
+def sync_phase(run: str, first: int, count: int, rate: float, records: int, timeout: float) -> list:
+    """Latencies of `count` sync tasks creating new farmers numbered from `first`."""
+    sent, results = {}, []
+    for n in range(count):
+        batch = [farmer(run, first + n * records + k) for k in range(records)]
+        r = celery_app.send_task(SYNC_BATCH_TASK, args=[USER, batch])
+        sent[r.id] = time.monotonic()
+        results.append(r)
+        time.sleep(1 / rate)
+    finished = wait_all(results, timeout)
+    return [finished[task_id] - started for task_id, started in sent.items()]
+
+
+def percentiles(latencies: list) -> dict:
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98], "max": max(latencies)}
+
+
+def report(label: str, latencies: list) -> dict:
+    p = percentiles(latencies)
+    print(f"{label:>10}: n={len(latencies)}  p50={p['p50'] * 1000:.0f} ms  p95={p['p95'] * 1000:.0f} ms  "
+          f"p99={p['p99'] * 1000:.0f} ms  max={p['max'] * 1000:.0f} ms")
+    return p
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=5000, help="farmers in the card batch")
+    parser.add_argument("--syncs", type=int, default=200, help="sync tasks per phase")
+    parser.add_argument("--records", type=int, default=5, help="records per sync task")
+    parser.add_argument("--rate", type=float, default=10, help="sync tasks sent per second")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--max-ratio", type=float, default=1.5)
+    parser.add_argument("--cleanup", action="store_true")
+    args = parser.parse_args()
+
+    run = uuid.uuid4().hex[:8]
+    seed = [farmer(run, i) for i in range(args.cards)]
+    print(f"Seeding {args.cards} farmers ...")
+    wait_all([celery_app.send_task(SYNC_BATCH_TASK, args=[USER, seed[i:i + 500]])
+              for i in range(0, len(seed), 500)], args.timeout)
+
+    phase_size = args.syncs * args.records
+    baseline = report("baseline", sync_phase(run, args.cards, args.syncs, args.rate, args.records, args.timeout))
+
+    batch = celery_app.send_task(ID_CARD_BATCH_TASK, kwargs={"filters": {"district": DISTRICT}})
+    loaded = report("with cards", sync_phase(run, args.cards + phase_size, args.syncs, args.rate,
+                                             args.records, args.timeout))
+    state = batch.state
+    if state == "FAILURE" or (state == "SUCCESS" and "error" in (batch.result or {})):
+        # the loaded phase ran without the load it is meant to measure
+        batch_failed = batch.result
+    else:
+        batch_failed = None
+        if state == "SUCCESS":
+            print("⚠️  The card batch finished before the loaded phase ended; raise --cards for a longer overlap")
+        elif state == "PENDING":
+            print("⚠️  The card batch never started; is the cards worker running?")
+        else:
+            print(f"Card batch {state}: {batch.info}")
+
+    if args.cleanup:
+        deleted = get_db_sync().farmers.delete_many({"address.district": DISTRICT}).deleted_count
+        celery_app.send_task(STATS_REBUILD_TASK)
+        print(f"Deleted {deleted} load-test farmers; farmer_stats rebuild queued")
+
+    if batch_failed is not None:
+        sys.exit(f"❌ Card batch failed: {batch_failed!r}")
+    ratio = loaded["p95"] / baseline["p95"]
+    print(f"p95 ratio loaded / baseline: {ratio:.2f} (limit {args.max_ratio})")
+    sys.exit(0 if ratio <= args.max_ratio else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Give farmers created before geospatial queries existed a GeoJSON `location`
+(from address.gps_latitude / gps_longitude), or recompute every one with --all.
+Creates the location_2dsphere index first.
+
+    python scripts/migrate_geo.py [--all] [--batch 1000]
+"""
+import argparse
+import os
+import sys
+
+# ✅ Ensure '/app' (parent of scripts) is in Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.indexes import ensure_indexes_sync
+from app.services.farmer_geo import LOCATION_FIELD, location_of
+from pymongo import MongoClient, UpdateOne
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--all", action="store_true", help="recompute locations that already exist too")
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = MongoClient(settings.MONGO_URI)[settings.MONGO_DB]
+    ensure_indexes_sync(db)
+    query = {} if args.all else {LOCATION_FIELD: {"$exists": False}}
+    cursor = db.farmers.find(query, {"address": 1}).batch_size(args.batch)
+
+    ops, located, without_gps, updated = [], 0, 0, 0
+    for doc in cursor:
+        location = location_of(doc)
+        if location is None:
+            without_gps += 1
+        else:
+            located += 1
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {LOCATION_FIELD: location}}))
+        if len(ops) >= args.batch:
+            updated += db.farmers.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        updated += db.farmers.bulk_write(ops, ordered=False).modified_count
+    print(f"✅ location written for {updated} farmers "
+          f"({located} with coordinates, {without_gps} without usable GPS)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Re-encrypt farmer NRCs under the active keyring key (CRYPTO_ACTIVE_KEY_ID).
+
+    python scripts/rotate_crypto_keys.py [--batch 500] [--dry-run]
+
+Values written by any key still listed in CRYPTO_KEYS are decrypted and re-written
+(nrc_encrypted and nrc_hash). Pre-keyring values cannot be decrypted without the NRC
+itself; they are counted and upgrade the next time that farmer is synced. Remove an
+old key from CRYPTO_KEYS only once this reports nothing left under it.
+"""
+import argparse
+import os
+import sys
+from collections import Counter
+
+# ✅ Ensure '/app' (parent of scripts) is in Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.utils.crypto_utils import get_keyring
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    keyring = get_keyring()
+    db = MongoClient(settings.MONGO_URI)[settings.MONGO_DB]
+    active_prefix = f"{keyring.active}:"
+    cursor = db.farmers.find(
+        {"nrc_encrypted": {"$exists": True, "$not": {"$regex": f"^{active_prefix}"}}},
+        {"nrc_encrypted": 1},
+    ).batch_size(args.batch)
+
+    counts = Counter()
+    ops = []
+
+    def flush():
+        if ops and not args.dry_run:
+            try:
+                db.farmers.bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                # most likely two records of the same NRC colliding on nrc_hash_unique
+                counts["failed"] += len(e.details.get("writeErrors", []))
+                counts["rotated"] -= len(e.details.get("writeErrors", []))
+        ops.clear()
+
+    for doc in cursor:
+        token = doc["nrc_encrypted"]
+        kid = keyring.key_id(token)
+        if kid not in keyring.key_ids:
+            counts["legacy" if kid is None else f"unknown key {kid}"] += 1
+            continue
+        nrc = keyring.decrypt(token)
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {
+            "nrc_encrypted": keyring.encrypt(nrc),
+            "nrc_hash": keyring.hash(nrc),
+        }}))
+        counts["rotated"] += 1
+        if len(ops) >= args.batch:
+            flush()
+    flush()
+
+    print(f"active key {keyring.active}: " + (", ".join(f"{k} {v}" for k, v in counts.items()) or "nothing to rotate"))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,19 +4,21 @@ import os
 # ✅ Ensure '/app' (parent of scripts) is in Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import redis
 from app.config import settings
-from passlib.context import CryptContext
+from app.dependencies.roles import mark_user_changed
+from app.indexes import ensure_indexes_sync
+from app.utils.security import hash_password
 from pymongo import MongoClient
 
 
-pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 client = MongoClient(settings.MONGO_URI)
 db = client[settings.MONGO_DB]
+ensure_indexes_sync(db)
 
 EMAIL = settings.SEED_ADMIN_EMAIL
 PASSWORD = settings.SEED_ADMIN_PASSWORD
-HASHED = pwd_ctx.hash(PASSWORD[:72])
+HASHED = hash_password(PASSWORD)
 
 admin = {
     "email": EMAIL,
@@ -30,4 +32,10 @@ if not existing:
     print(f"✅ Seeded admin: {EMAIL}")
 else:
     db.users.update_one({"email": EMAIL}, {"$set": admin})
-    print(f"✅ Updated existing admin: {EMAIL}")
\ No newline at end of file
+    print(f"✅ Updated existing admin: {EMAIL}")
+    try:
+        # running API processes drop their cached copy / role claims of this user
+        mark_user_changed(EMAIL)
+    except redis.RedisError as e:
+        print(f"⚠️  Could not notify API processes ({e}); cached users expire within "
+              f"{settings.AUTH_USER_CACHE_TTL_SECONDS}s")
@@ -0,0 +1,49 @@
+import os
+import sys
+from types import SimpleNamespace
+import fakeredis
+import mongomock
+import pytest
+
+# the backend root (parent of tests) is the import root, as for scripts/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET", "test-secret")
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """
+    The FastAPI app on mongomock (async and sync views of one store) and fakeredis.
+    `api.db` is the sync view, `api.headers(*roles)` an Authorization header.
+    """
+    from fastapi.testclient import TestClient
+    from mongomock_motor import AsyncMongoMockClient
+    from app import database
+    from app.config import settings
+    from app.dependencies import roles
+    from app.services import farmer_cache
+    from app.utils import redis_client
+    from app.utils.cache import TTLCache
+    from app.utils.security import create_access_token
+
+    (tmp_path / "uploads").mkdir()
+    monkeypatch.chdir(tmp_path)
+    mongo = mongomock.MongoClient()
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(database, "_client", AsyncMongoMockClient(mock_mongo_client=mongo))
+    monkeypatch.setattr(redis_client, "_client", fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(redis_client, "_client_pid", os.getpid())
+    monkeypatch.setattr(redis_client, "_async_client", fakeredis.aioredis.FakeRedis(server=server))
+    monkeypatch.setattr(farmer_cache, "_local", TTLCache(maxsize=100, ttl=settings.FARMER_CACHE_TTL_SECONDS))
+    roles.invalidate_user()
+    db = mongo[settings.MONGO_DB]
+
+    def headers(*role_names, email="admin@example.com"):
+        if not db.users.find_one({"email": email}):
+            db.users.insert_one({"email": email, "roles": list(role_names or ["ADMIN"]), "is_active": True})
+        return {"Authorization": f"Bearer {create_access_token(email)}"}
+
+    from app.main import app
+    with TestClient(app) as client:
+        yield SimpleNamespace(client=client, db=db, headers=headers)
+    roles.invalidate_user()
@@ -0,0 +1,150 @@
+import base64
+import hashlib
+import importlib.util
+import os
+import sys
+import mongomock
+import pytest
+from Crypto.Cipher import AES
+from app.utils.crypto_utils import TAG_SIZE, Keyring
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+NRCS = ["123456/10/1", "", "987654/32/1" * 7, "€ unicode"]
+
+
+@pytest.fixture
+def keyring():
+    return Keyring({"k1": b"old-secret", "k2": b"new-secret"}, "k2", legacy_secret=b"jwt-secret")
+
+
+def _raw(token: str) -> bytes:
+    return base64.urlsafe_b64decode(token.partition(":")[2].encode())
+
+
+def _with_raw(token: str, raw: bytes) -> str:
+    return token.partition(":")[0] + ":" + base64.urlsafe_b64encode(raw).decode()
+
+
+def test_round_trip_and_determinism(keyring):
+    tokens = keyring.encrypt_batch(NRCS + [None])
+    assert tokens[-1] is None
+    assert tokens[:-1] == [keyring.encrypt(v) for v in NRCS]
+    assert all(t.startswith("k2:") for t in tokens[:-1])
+    assert [keyring.decrypt(t) for t in tokens[:-1]] == NRCS
+    assert len(set(tokens[:-1])) == len(NRCS)
+    # a given key always produces the same token; another key a different one
+    assert keyring.encrypt("123456/10/1") == tokens[0]
+    assert keyring.encrypt("123456/10/1", "k1") != tokens[0]
+    assert keyring.decrypt(keyring.encrypt("123456/10/1", "k1")) == "123456/10/1"
+
+
+def test_tokens_are_standard_aes_siv(keyring):
+    """tag + ciphertext of RFC 5297 AES-SIV (no nonce, no associated data) under the derived key."""
+    key = Keyring._derive(b"new-secret", b"farmer-field-siv-mac") + Keyring._derive(b"new-secret", b"farmer-field-siv-ctr")
+    for value in NRCS:
+        raw = _raw(keyring.encrypt(value))
+        assert AES.new(key, AES.MODE_SIV).decrypt_and_verify(raw[TAG_SIZE:], raw[:TAG_SIZE]) == value.encode()
+
+
+def test_tampered_values_are_rejected(keyring):
+    token = keyring.encrypt("123456/10/1")
+    raw = _raw(token)
+    for i in (0, TAG_SIZE - 1, TAG_SIZE, len(raw) - 1):
+        flipped = raw[:i] + bytes([raw[i] ^ 1]) + raw[i + 1:]
+        with pytest.raises(ValueError, match="authentication"):
+            keyring.decrypt(_with_raw(token, flipped))
+    with pytest.raises(ValueError, match="authentication"):
+        keyring.decrypt(_with_raw(token, raw[:TAG_SIZE - 1]))
+
+
+def test_wrong_or_unknown_key_id_is_rejected(keyring):
+    token = keyring.encrypt("123456/10/1", "k1")
+    # same data relabelled with the other key fails authentication
+    with pytest.raises(ValueError, match="authentication"):
+        keyring.decrypt("k2:" + token.partition(":")[2])
+    with pytest.raises(ValueError, match="Unknown encryption key id 'k9'"):
+        keyring.decrypt("k9:" + token.partition(":")[2])
+    # pre-keyring tokens carry no key id
+    with pytest.raises(ValueError, match="Unknown encryption key id None"):
+        keyring.decrypt(token.partition(":")[2])
+
+
+def test_hash_candidates_cover_every_key_and_legacy(keyring):
+    candidates = keyring.hash_candidates("123456/10/1")
+    assert candidates == (
+        keyring.hash("123456/10/1"),
+        keyring.hash("123456/10/1", "k1"),
+        hashlib.sha256(b"jwt-secret" + b"123456/10/1").hexdigest(),
+    )
+    assert candidates[0].startswith("k2:") and candidates[1].startswith("k1:")
+    assert keyring.hash_candidates_batch(["a", "b"]) == [keyring.hash_candidates("a"), keyring.hash_candidates("b")]
+    assert keyring.hash_batch(["a", None]) == [keyring.hash("a"), None]
+
+    without_legacy = Keyring({"k1": b"old-secret"}, "k1")
+    assert without_legacy.hash_candidates("a") == (without_legacy.hash("a"),)
+
+
+def test_from_settings(monkeypatch):
+    class Conf:
+        JWT_SECRET = "jwt-secret"
+        CRYPTO_KEYS = ""
+        CRYPTO_ACTIVE_KEY_ID = ""
+        CRYPTO_LEGACY_LOOKUP = False
+
+    ring = Keyring.from_settings(Conf)
+    assert ring.key_ids == ["k0"] and ring.active == "k0"
+
+    Conf.CRYPTO_KEYS = "k1:old-secret, k2:new-secret"
+    ring = Keyring.from_settings(Conf)
+    assert ring.key_ids == ["k1", "k2"] and ring.active == "k2"
+
+    Conf.CRYPTO_ACTIVE_KEY_ID = "k3"
+    with pytest.raises(ValueError, match="Active key id"):
+        Keyring.from_settings(Conf)
+
+    Conf.CRYPTO_KEYS = "k1"
+    with pytest.raises(ValueError, match="<kid>:<secret>"):
+        Keyring.from_settings(Conf)
+
+
+def _load_rotate_script():
+    spec = importlib.util.spec_from_file_location("rotate_crypto_keys", os.path.join(SCRIPTS_DIR, "rotate_crypto_keys.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize("dry_run", [False, True])
+def test_rotate_crypto_keys(monkeypatch, capsys, dry_run):
+    old = Keyring({"k1": b"old-secret"}, "k1")
+    new = Keyring({"k1": b"old-secret", "k2": b"new-secret"}, "k2")
+    client = mongomock.MongoClient()
+    farmers = client["rotate_test"].farmers
+    farmers.insert_many(
+        [{"farmer_id": f"F{i}", "nrc_encrypted": old.encrypt(f"{i}/10/1"), "nrc_hash": old.hash(f"{i}/10/1")}
+         for i in range(5)]
+        + [{"farmer_id": "current", "nrc_encrypted": new.encrypt("9/10/1"), "nrc_hash": new.hash("9/10/1")},
+           {"farmer_id": "legacy", "nrc_encrypted": "bm90LWEta2V5cmluZy12YWx1ZQ==", "nrc_hash": "abc"},
+           {"farmer_id": "unknown", "nrc_encrypted": "k0:AAAA", "nrc_hash": "k0:abc"},
+           {"farmer_id": "no-nrc"}]
+    )
+    before = {d["farmer_id"]: d for d in farmers.find()}
+
+    script = _load_rotate_script()
+    monkeypatch.setattr(script, "get_keyring", lambda: new)
+    monkeypatch.setattr(script, "MongoClient", lambda uri: client)
+    monkeypatch.setattr(script.settings, "MONGO_DB", "rotate_test")
+    monkeypatch.setattr(sys, "argv", ["rotate_crypto_keys.py", "--batch", "2"] + (["--dry-run"] if dry_run else []))
+    script.main()
+
+    assert capsys.readouterr().out.strip() == "active key k2: rotated 5, legacy 1, unknown key k0 1"
+    after = {d["farmer_id"]: d for d in farmers.find()}
+    for i in range(5):
+        doc = after[f"F{i}"]
+        if dry_run:
+            assert doc == before[f"F{i}"]
+        else:
+            assert doc["nrc_encrypted"] == new.encrypt(f"{i}/10/1")
+            assert doc["nrc_hash"] == new.hash(f"{i}/10/1")
+    for farmer_id in ("current", "legacy", "unknown", "no-nrc"):
+        assert after[farmer_id] == before[farmer_id]
@@ -0,0 +1,80 @@
+from app.services import farmer_cache
+
+FARMER = {
+    "personal_info": {"first_name": "Mwila", "last_name": "Banda", "phone_primary": "+260971234567",
+                      "date_of_birth": "1980-01-01", "gender": "F"},
+    "address": {"province": "Central", "district": "Kabwe", "village": "Mpima"},
+}
+
+
+def _create(api):
+    response = api.client.post("/api/farmers/", json=FARMER, headers=api.headers())
+    assert response.status_code == 201, response.text
+    return response.json()["farmer_id"]
+
+
+def test_detail_is_cached_and_revalidated(api):
+    farmer_id = _create(api)
+    first = api.client.get(f"/api/farmers/{farmer_id}", headers=api.headers())
+    assert first.status_code == 200 and first.headers["ETag"]
+    # served from the cache: a write behind the API's back is not seen ...
+    api.db.farmers.update_one({"farmer_id": farmer_id}, {"$set": {"registration_status": "approved"}})
+    again = api.client.get(f"/api/farmers/{farmer_id}", headers=api.headers())
+    assert again.json() == first.json()
+    # ... and the client's copy is confirmed with a 304
+    revalidated = api.client.get(f"/api/farmers/{farmer_id}",
+                                 headers={**api.headers(), "If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 304 and not revalidated.content
+
+
+def test_update_and_delete_invalidate_detail_and_list(api):
+    farmer_id = _create(api)
+    detail = api.client.get(f"/api/farmers/{farmer_id}", headers=api.headers())
+    page = api.client.get("/api/farmers/", headers=api.headers())
+    assert page.json()["count"] == 1
+
+    response = api.client.put(f"/api/farmers/{farmer_id}", json={"registration_status": "approved"},
+                              headers=api.headers())
+    assert response.status_code == 200
+    updated = api.client.get(f"/api/farmers/{farmer_id}", headers={**api.headers(), "If-None-Match": detail.headers["ETag"]})
+    assert updated.status_code == 200 and updated.json()["registration_status"] == "approved"
+    listed = api.client.get("/api/farmers/", headers=api.headers()).json()
+    assert listed["results"][0]["registration_status"] == "approved"
+
+    assert api.client.delete(f"/api/farmers/{farmer_id}", headers=api.headers()).status_code == 200
+    assert api.client.get(f"/api/farmers/{farmer_id}", headers=api.headers()).status_code == 404
+    assert api.client.get("/api/farmers/", headers=api.headers()).json()["count"] == 0
+
+
+def test_sync_worker_writes_invalidate(api, monkeypatch):
+    from app.tasks import sync_tasks
+    from app.tasks.celery_app import celery_app
+    monkeypatch.setattr(celery_app.conf, "result_backend", "cache+memory://")
+    farmer_id = _create(api)
+    api.db.farmers.update_one({"farmer_id": farmer_id}, {"$set": {"temp_id": "tablet-1"}})
+    assert api.client.get(f"/api/farmers/{farmer_id}", headers=api.headers()).json()["temp_id"] == "tablet-1"
+
+    monkeypatch.setattr(sync_tasks, "get_db_sync", lambda: api.db)
+    monkeypatch.setattr(sync_tasks, "publish_progress", lambda *args: None)
+    record = {"temp_id": "tablet-1", "personal_info": {**FARMER["personal_info"], "first_name": "Ruth"},
+              "address": FARMER["address"]}
+    result = sync_tasks.process_sync_batch.apply(args=["tablet@example.com", [record]]).get()
+    assert result["results"][0]["status"] == "updated"
+    detail = api.client.get(f"/api/farmers/{farmer_id}", headers=api.headers()).json()
+    assert detail["personal_info"]["first_name"] == "Ruth"
+
+
+def test_redis_outage_bypasses_the_cache(api, monkeypatch):
+    import redis
+    farmer_id = _create(api)
+    api.client.get(f"/api/farmers/{farmer_id}", headers=api.headers())
+
+    class Down:
+        def __getattr__(self, name):
+            raise redis.ConnectionError("down")
+
+    # invalidation cannot be recorded while Redis is down, so nothing may be served from the cache
+    api.db.farmers.update_one({"farmer_id": farmer_id}, {"$set": {"registration_status": "approved"}})
+    monkeypatch.setattr(farmer_cache, "get_async_redis", lambda: Down())
+    detail = api.client.get(f"/api/farmers/{farmer_id}", headers=api.headers())
+    assert detail.json()["registration_status"] == "approved"
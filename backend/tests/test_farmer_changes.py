@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+import mongomock
+import pytest
+from app.services import farmer_changes
+
+COUNTER = {"_id": farmer_changes.SEQ_COUNTER}
+
+
+def _farmer(seq):
+    return {"farmer_id": f"F{seq}", farmer_changes.SEQ_FIELD: seq}
+
+
+def _tombstone(seq):
+    return {"farmer_id": f"D{seq}", farmer_changes.SEQ_FIELD: seq}
+
+
+def test_page_merges_both_collections_in_sequence_order():
+    result = farmer_changes.page([_farmer(2), _farmer(5)], [_tombstone(3), _tombstone(4)], since=1, limit=10)
+    assert result["changes"] == [
+        {"op": "upsert", "farmer": _farmer(2)},
+        {"op": "delete", "farmer_id": "D3"},
+        {"op": "delete", "farmer_id": "D4"},
+        {"op": "upsert", "farmer": _farmer(5)},
+    ]
+    assert result["count"] == 4 and not result["has_more"]
+    assert farmer_changes.decode_token(result["next"]) == 5
+
+
+def test_page_stops_at_the_limit():
+    # each collection is queried with limit + 1
+    result = farmer_changes.page([_farmer(2), _farmer(4), _farmer(6)], [_tombstone(3), _tombstone(5)],
+                                 since=1, limit=2)
+    assert [c.get("farmer_id") or c["farmer"]["farmer_id"] for c in result["changes"]] == ["F2", "D3"]
+    assert result["has_more"] and farmer_changes.decode_token(result["next"]) == 3
+
+    exact = farmer_changes.page([_farmer(2)], [_tombstone(3)], since=1, limit=2)
+    assert exact["count"] == 2 and not exact["has_more"]
+
+
+def test_empty_page_resumes_where_it_was():
+    result = farmer_changes.page([], [], since=7, limit=10)
+    assert result == {"count": 0, "changes": [], "next": result["next"], "has_more": False}
+    assert farmer_changes.decode_token(result["next"]) == 7
+
+
+def test_high_water_mark_stops_below_the_oldest_open_reservation():
+    now = datetime.utcnow()
+    later, earlier = now + timedelta(minutes=1), now - timedelta(minutes=1)
+    assert farmer_changes.high_water_mark(None) == 0
+    assert farmer_changes.high_water_mark({"value": 9}) == 9
+    assert farmer_changes.high_water_mark({"value": 9, "pending": [
+        {"token": "a", "until": later, "seq": 4}, {"token": "b", "until": later, "seq": 7}]}, now) == 3
+    # a writer that died: its reservation stops counting once the lease is over
+    assert farmer_changes.high_water_mark({"value": 9, "pending": [
+        {"token": "a", "until": earlier, "seq": 4}, {"token": "b", "until": later, "seq": 7}]}, now) == 6
+    # the oldest reservation has not recorded its number yet: nothing is known to be written
+    assert farmer_changes.high_water_mark({"value": 9, "pending": [
+        {"token": "a", "until": later}, {"token": "b", "until": later, "seq": 7}]}, now) == 0
+
+
+def test_reservations_hold_the_feed_back_until_released():
+    db = mongomock.MongoClient()["changes_test"]
+    counters = db[farmer_changes.COUNTERS_COLLECTION]
+    mark = lambda: farmer_changes.high_water_mark(counters.find_one(COUNTER))
+    with farmer_changes.reserve_sync(db, 3) as slow:
+        assert slow == 1
+        with farmer_changes.reserve_sync(db) as fast:
+            assert fast == 4
+        # the later write finished first, but the feed must not overtake the earlier one
+        assert mark() == 0
+    assert mark() == 4
+    assert counters.find_one(COUNTER)["pending"] == []
+
+    with pytest.raises(RuntimeError):
+        with farmer_changes.reserve_sync(db):
+            raise RuntimeError("write failed")
+    assert mark() == 5
+
+
+def test_release_prunes_expired_reservations():
+    db = mongomock.MongoClient()["changes_test"]
+    crashed = {"token": "dead", "until": datetime.utcnow() - timedelta(minutes=1), "seq": 1}
+    db[farmer_changes.COUNTERS_COLLECTION].insert_one({**COUNTER, "value": 1, "pending": [crashed]})
+    with farmer_changes.reserve_sync(db) as seq:
+        assert seq == 2
+    assert db[farmer_changes.COUNTERS_COLLECTION].find_one(COUNTER)["pending"] == []
+
+
+def test_changes_endpoint_waits_for_an_unfinished_write(api):
+    headers = api.headers()
+    with farmer_changes.reserve_sync(api.db) as slow:
+        with farmer_changes.reserve_sync(api.db) as fast:
+            api.db.farmers.insert_one({**_farmer(fast), "farmer_id": "FAST"})
+        page = api.client.get("/api/sync/changes", headers=headers).json()
+        assert page["count"] == 0
+        api.db.farmers.insert_one({**_farmer(slow), "farmer_id": "SLOW"})
+
+    page = api.client.get("/api/sync/changes", params={"since": page["next"]}, headers=headers).json()
+    assert [c["farmer"]["farmer_id"] for c in page["changes"]] == ["SLOW", "FAST"]
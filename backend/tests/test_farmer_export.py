@@ -0,0 +1,57 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import threading
+from app.services import farmer_export
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield doc
+
+
+def _docs(n):
+    return [{"farmer_id": f"ZM{i:08d}", "personal_info": {"first_name": f"F{i}", "last_name": "Banda"},
+             "address": {"district": "Kabwe"}} for i in range(n)]
+
+
+def _export(docs, fmt, compress, batch_size=7):
+    async def collect():
+        return [chunk async for chunk in farmer_export.stream_export(
+            _Cursor(docs), fmt, ["farmer_id", "personal_info.first_name"], batch_size, compress=compress)]
+    chunks = asyncio.run(collect())
+    body = b"".join(chunks)
+    return gzip.decompress(body) if compress else body
+
+
+def test_ndjson_and_csv_round_trip():
+    docs = _docs(20)
+    for compress in (False, True):
+        lines = _export(docs, "ndjson", compress).decode().splitlines()
+        assert [json.loads(line)["farmer_id"] for line in lines] == [d["farmer_id"] for d in docs]
+        rows = list(csv.reader(io.StringIO(_export(docs, "csv", compress).decode())))
+        assert rows[0] == ["farmer_id", "personal_info.first_name"]
+        assert rows[1:] == [[d["farmer_id"], d["personal_info"]["first_name"]] for d in docs]
+
+
+def test_batches_are_encoded_off_the_event_loop(monkeypatch):
+    threads = set()
+    encode = farmer_export._Encoder.encode
+
+    def recording_encode(self, docs):
+        threads.add(threading.get_ident())
+        return encode(self, docs)
+
+    monkeypatch.setattr(farmer_export._Encoder, "encode", recording_encode)
+    loop_thread = threading.get_ident()   # asyncio.run drives the loop on this thread
+    _export(_docs(20), "ndjson", compress=True)
+    assert threads and loop_thread not in threads
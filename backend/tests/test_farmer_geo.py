@@ -0,0 +1,27 @@
+import pytest
+from app.services import farmer_geo
+
+
+def _vertices(bbox):
+    query = farmer_geo.within_filter(farmer_geo.parse_bbox(bbox))
+    clauses = query.get("$or", [query])
+    return [clause[farmer_geo.LOCATION_FIELD]["$geoWithin"]["$geometry"]["coordinates"][0] for clause in clauses]
+
+
+@pytest.mark.parametrize("bbox", ["-180,-90,180,90", "20,-90,35,-5", "20,-10,35,90"])
+def test_polar_boxes_build_valid_polygons(bbox):
+    for ring in _vertices(bbox):
+        assert ring[0] == ring[-1]
+        assert len({tuple(v) for v in ring[:-1]}) == len(ring) - 1   # no duplicate vertices
+        assert all(-farmer_geo.MERCATOR_MAX_LAT <= lat <= farmer_geo.MERCATOR_MAX_LAT for _, lat in ring)
+
+
+def test_parse_bbox():
+    assert farmer_geo.parse_bbox("22,-18,34,-8") == (22.0, -18.0, 34.0, -8.0)
+    assert farmer_geo.parse_bbox("-180,-90,180,90") == (
+        -180.0, -farmer_geo.MERCATOR_MAX_LAT, 180.0, farmer_geo.MERCATOR_MAX_LAT)
+    for bad in ("1,2,3", "a,b,c,d", "34,-18,22,-8", "22,-18,34,-95"):
+        with pytest.raises(ValueError, match="bbox"):
+            farmer_geo.parse_bbox(bad)
+    with pytest.raises(ValueError, match="overlap latitudes"):
+        farmer_geo.parse_bbox("0,86,10,90")
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from app.services import farmer_query
+
+
+def _farmers(db, n, district="Kabwe"):
+    base = datetime(2024, 1, 1)
+    docs = [{"_id": ObjectId(), "farmer_id": f"ZM{i:08d}", "created_at": base + timedelta(minutes=i // 3),
+             "address": {"district": district if i % 2 else "Mkushi"},
+             "nrc_hash": f"k0:{i}", "nrc_encrypted": "k0:x", "search_keys": ["w:x"], "personal_info": {"first_name": "A"}}
+            for i in range(n)]
+    # a few older records written before created_at existed
+    docs += [{"_id": ObjectId(), "farmer_id": f"ZMOLD{i}", "address": {"district": district}} for i in range(3)]
+    db.farmers.insert_many(docs)
+    return docs
+
+
+def _walk(client, headers, limit, **params):
+    seen, cursor = [], None
+    while True:
+        query = {"limit": limit, **params, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/farmers/", params=query, headers=headers).json()
+        seen += [doc["farmer_id"] for doc in page["results"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return seen
+
+
+@pytest.mark.parametrize("limit", [1, 4, 7, 50])
+def test_cursor_pages_cover_every_farmer_once_in_order(api, limit):
+    docs = _farmers(api.db, 20)
+    expected = [d["farmer_id"] for d in api.db.farmers.find({}, {"farmer_id": 1}).sort(farmer_query.LIST_SORT)]
+    assert _walk(api.client, api.headers(), limit) == expected
+    assert len(expected) == len(docs)
+
+
+def test_cursor_pages_with_a_filter(api):
+    _farmers(api.db, 20)
+    kabwe = _walk(api.client, api.headers(), 3, district="Kabwe")
+    assert len(kabwe) == len(set(kabwe)) == 13
+
+
+def test_pages_never_send_hidden_fields(api):
+    _farmers(api.db, 5)
+    page = api.client.get("/api/farmers/", headers=api.headers()).json()
+    for doc in page["results"]:
+        assert not set(doc) & set(farmer_query.DEFAULT_EXCLUDED_FIELDS)
+    chosen = api.client.get("/api/farmers/", params={"fields": "farmer_id"}, headers=api.headers()).json()
+    assert set(chosen["results"][0]) == {"_id", "farmer_id", "created_at"}
+    for fields in ("nrc_hash", "personal_info,nrc_encrypted", "search_keys.0", "$where"):
+        response = api.client.get("/api/farmers/", params={"fields": fields}, headers=api.headers())
+        assert response.status_code == 400
+
+
+def test_invalid_cursor(api):
+    response = api.client.get("/api/farmers/", params={"cursor": "not-a-cursor"}, headers=api.headers())
+    assert response.status_code == 400
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        farmer_query.decode_cursor("eyJ0IjoxfQ")
@@ -0,0 +1,49 @@
+import mongomock
+import pytest
+from app.services import farmer_search
+
+
+def _farmer(farmer_id, first, last, district="Kabwe", phone=None):
+    doc = {"farmer_id": farmer_id, "personal_info": {"first_name": first, "last_name": last, "phone_primary": phone},
+           "address": {"district": district}}
+    doc[farmer_search.SEARCH_FIELD] = farmer_search.search_keys(doc)
+    return doc
+
+
+@pytest.fixture
+def farmers():
+    coll = mongomock.MongoClient()["search_test"].farmers
+    coll.insert_many([
+        _farmer("ZM1", "Bob", "Yamba", phone="0977123456"),
+        _farmer("ZM2", "Bobby", "Banda"),
+        _farmer("ZM3", "Bertha", "Kunda", district="Chipata"),
+        _farmer("ZM4", "Mary", "Zulu", district="Chipata"),
+    ])
+    return coll
+
+
+def _search(coll, q, limit=10):
+    return [doc["farmer_id"] for doc in coll.aggregate(farmer_search.search_pipeline(q, limit))]
+
+
+def _match_keys(q):
+    return farmer_search.search_pipeline(q, 10)[0]["$match"][farmer_search.SEARCH_FIELD]["$in"]
+
+
+def test_trigrams_and_single_letters_never_select():
+    keys = _match_keys("bob y")
+    assert not [k for k in keys if k.startswith("t:")]
+    assert "x:bob" in keys and "x:y" not in keys
+    assert sorted(_match_keys("b k")) == ["f:b", "f:k", "w:b", "w:k", "x:b", "x:k"]
+    pipeline = farmer_search.search_pipeline("bob", 10)
+    assert pipeline[1] == {"$limit": farmer_search.MAX_SEARCH_CANDIDATES}
+
+
+def test_ranking(farmers):
+    assert _search(farmers, "bob yy")[0] == "ZM1"
+    assert set(_search(farmers, "bo")) == {"ZM1", "ZM2"}
+    assert _search(farmers, "+260 977 123 456") == ["ZM1"]
+    assert _search(farmers, "banda kabwe")[0] == "ZM2"
+    assert _search(farmers, "bobb")[0] == "ZM2"   # typo past the third letter
+    assert set(_search(farmers, "b")) == {"ZM1", "ZM2", "ZM3"}
+    assert farmer_search.search_pipeline("!!", 10) is None
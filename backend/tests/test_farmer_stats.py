@@ -0,0 +1,64 @@
+import mongomock
+from app.services import farmer_stats
+from app.services.sync_service import SyncService
+
+BUCKET = ("Central", "Kabwe", "pending")
+
+
+def _stored(db) -> dict:
+    return {tuple(doc["_id"].values()): doc["count"] for doc in db[farmer_stats.STATS_COLLECTION].find()
+            if doc["count"]}
+
+
+def _rebuilt(db) -> dict:
+    db.farmers.aggregate(farmer_stats.rebuild_pipeline())
+    return _stored(db)
+
+
+def _record(i, district="Kabwe", **personal):
+    return {"temp_id": f"t{i}", "personal_info": {"first_name": f"F{i}", "phone_primary": f"+26097000000{i}",
+                                                   **personal},
+            "address": {"province": "Central", "district": district}}
+
+
+def test_bucket_after_set():
+    assert farmer_stats.bucket_after_set(BUCKET, {"address.district": "Mkushi"}) == ("Central", "Mkushi", "pending")
+    # a whole sub-document replaces every bucket field under it
+    assert farmer_stats.bucket_after_set(BUCKET, {"address": {"district": "Kafue"}}) == (None, "Kafue", "pending")
+    assert farmer_stats.bucket_after_set(BUCKET, {"registration_status": "approved", "notes": "x"}) \
+        == ("Central", "Kabwe", "approved")
+    assert farmer_stats.moved(BUCKET, BUCKET) == {}
+    assert farmer_stats.moved(None, BUCKET) == {BUCKET: 1}
+    assert farmer_stats.moved(BUCKET, None) == {BUCKET: -1}
+
+
+def test_sync_deltas_match_a_rebuild():
+    db = mongomock.MongoClient()["stats_test"]
+    SyncService.process_batch(db, "tablet@example.com", [_record(i) for i in range(4)])
+    # two move district, one is only renamed, one is new; a record in error counts nowhere
+    results = SyncService.process_batch(db, "tablet@example.com", [
+        _record(0, district="Mkushi"), _record(1, district="Mkushi"), _record(2, last_name="Phiri"),
+        _record(5, district="Chibombo"), {**_record(6), "nrc_number": "bad"},
+    ], chunk_size=2)
+    assert [r["status"] for r in results] == ["updated", "updated", "updated", "created", "error"]
+    incremental = _stored(db)
+    assert incremental == {("Central", "Kabwe", None): 2, ("Central", "Mkushi", None): 2,
+                           ("Central", "Chibombo", None): 1}
+    assert _rebuilt(db) == incremental
+
+
+def test_api_writes_keep_stats_current(api):
+    farmer = {"personal_info": {"first_name": "Mwila", "last_name": "Banda", "phone_primary": "+260971234567",
+                                "date_of_birth": "1980-01-01", "gender": "F"},
+              "address": {"province": "Central", "district": "Kabwe", "village": "Mpima"}}
+    ids = [api.client.post("/api/farmers/", json=farmer, headers=api.headers()).json()["farmer_id"] for _ in range(3)]
+    api.client.put(f"/api/farmers/{ids[0]}", json={"registration_status": "approved"}, headers=api.headers())
+    api.client.put(f"/api/farmers/{ids[1]}", json={"address.district": "Mkushi"}, headers=api.headers())
+    api.client.delete(f"/api/farmers/{ids[2]}", headers=api.headers())
+
+    stats = api.client.get("/api/farmers/stats", headers=api.headers()).json()
+    assert stats["total"] == 2
+    assert stats["by_status"] == {"approved": 1, "pending": 1}
+    assert {(d["district"], d["count"]) for d in stats["by_district"]} == {("Kabwe", 1), ("Mkushi", 1)}
+    assert api.client.get("/api/farmers/stats?district=Mkushi", headers=api.headers()).json()["total"] == 1
+    assert _stored(api.db) == _rebuilt(api.db)
@@ -0,0 +1,71 @@
+import os
+import fakeredis
+import mongomock
+import pytest
+from app.tasks import id_card_task
+from app.tasks.celery_app import CARDS_QUEUE, ID_CARD_BATCH_DONE_TASK, ID_CARD_CHUNK_TASK, celery_app
+
+FARMERS = id_card_task.RENDER_CHUNK * 2 + 1   # three chunks
+
+
+@pytest.fixture
+def farmers_db(tmp_path, monkeypatch):
+    db = mongomock.MongoClient()["farmers_test"]
+    monkeypatch.setattr(id_card_task, "get_db_sync", lambda: db)
+    redis = fakeredis.FakeStrictRedis()
+    monkeypatch.setattr(id_card_task, "get_redis", lambda: redis)
+    monkeypatch.setattr(id_card_task, "UPLOAD_DIR", str(tmp_path / "cards"))
+    monkeypatch.setattr(id_card_task, "SHEET_DIR", str(tmp_path / "sheets"))
+    monkeypatch.setattr(celery_app.conf, "result_backend", "cache+memory://")
+    db.farmers.insert_many([
+        {"farmer_id": f"ZM{i:08X}", "personal_info": {"first_name": f"Farmer{i}", "last_name": "Phiri"},
+         "address": {"district": "Kabwe"}}
+        for i in range(FARMERS)
+    ])
+    return db
+
+
+def test_batch_is_rendered_by_chunk_subtasks(farmers_db, tmp_path):
+    batch = id_card_task.generate_id_cards_batch.apply(kwargs={"filters": {"district": "Kabwe"}, "sheets": True})
+    result = batch.get()
+
+    assert result["generated"] == FARMERS
+    assert not result["incomplete"] and result["missing"] == []
+    assert len(os.listdir(tmp_path / "cards")) == FARMERS
+    assert len(result["sheets"]) == 3 and all(os.path.basename(s).startswith(batch.id) for s in result["sheets"])
+    assert farmers_db.farmers.count_documents({"id_card_path": {"$exists": True}}) == FARMERS
+    # every chunk added its farmers to the batch's progress
+    progress = celery_app.backend.get_task_meta(batch.id)
+    assert progress["status"] == "PROGRESS"
+    assert progress["result"] == {"done": FARMERS, "total": FARMERS}
+    assert not id_card_task.get_redis().exists(id_card_task.BATCH_PROGRESS_KEY.format(batch_id=batch.id))
+
+
+def test_explicit_ids_report_missing_and_deleted_farmers_are_skipped(farmers_db):
+    ids = ["ZM00000001", "ZM00000002", "ZM-UNKNOWN"]
+    result = id_card_task.generate_id_cards_batch.apply(args=[ids]).get()
+    assert result["generated"] == 2 and result["missing"] == ["ZM-UNKNOWN"]
+
+    chunk = id_card_task.render_id_card_chunk.apply(args=["batch-1", ["ZM00000003", "ZM-GONE"], 2]).get()
+    assert chunk == {"generated": 1, "sheet": None, "incomplete": False}
+
+
+def test_unknown_filters_and_empty_batches(farmers_db):
+    assert "Unsupported filter fields" in id_card_task.generate_id_cards_batch.apply(
+        kwargs={"filters": {"colour": "red"}}).get()["error"]
+    assert id_card_task.generate_id_cards_batch.apply(
+        kwargs={"filters": {"district": "Nowhere"}}).get() == {"error": "No farmers found", "missing": []}
+
+
+def test_batch_fans_out_on_the_cards_queue(farmers_db, monkeypatch):
+    replaced = []
+    monkeypatch.setattr(id_card_task.generate_id_cards_batch, "replace", replaced.append)
+    id_card_task.generate_id_cards_batch.apply(kwargs={"filters": {"district": "Kabwe"}})
+
+    (sig,) = replaced
+    assert [task.task for task in sig.tasks] == [ID_CARD_CHUNK_TASK] * 3
+    assert [len(task.args[1]) for task in sig.tasks] == [id_card_task.RENDER_CHUNK] * 2 + [1]
+    assert sig.body.task == ID_CARD_BATCH_DONE_TASK
+    router = celery_app.amqp.router
+    for name in (ID_CARD_CHUNK_TASK, ID_CARD_BATCH_DONE_TASK):
+        assert router.route({}, name)["queue"].name == CARDS_QUEUE
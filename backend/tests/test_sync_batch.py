@@ -0,0 +1,45 @@
+import asyncio
+import fakeredis
+import pytest
+from app.routes import sync
+from app.tasks import sync_jobs
+from app.tasks.celery_app import celery_app
+
+USER = "operator@example.com"
+PAYLOAD = sync.SyncRequest(farmers=[{"temp_id": "t1", "personal_info": {"first_name": "Bob"}, "address": {}}])
+
+
+@pytest.fixture
+def r(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(sync_jobs, "get_redis", lambda: client)
+    monkeypatch.setattr(celery_app.conf, "result_backend", "cache+memory://")
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, task_id: None)
+    return client
+
+
+def _submit(idempotency_key=None):
+    return asyncio.run(sync.sync_batch(PAYLOAD, current_user=USER, idempotency_key=idempotency_key))
+
+
+def _ttl(r, key):
+    return r.ttl(sync_jobs.IDEMPOTENCY_KEY.format(user=USER, key=key))
+
+
+def test_content_hash_dedupes_only_for_a_short_window(r):
+    first = _submit()
+    assert first["status"] == "queued"
+    assert _submit()["status"] == "replayed"
+    (key,) = r.keys("sync-idempotency:*")
+    assert 0 < r.ttl(key) <= sync.settings.SYNC_CONTENT_DEDUPE_SECONDS
+
+    # e.g. the farmer was edited through the API since: a later resend is applied again
+    r.delete(key)
+    again = _submit()
+    assert again["status"] == "queued" and again["job_id"] != first["job_id"]
+
+
+def test_idempotency_key_is_kept_as_long_as_the_result(r):
+    _submit("tablet-7:batch-1")
+    assert _ttl(r, "key:tablet-7:batch-1") > sync.settings.SYNC_CONTENT_DEDUPE_SECONDS
+    assert _submit("tablet-7:batch-1")["status"] == "replayed"
@@ -0,0 +1,201 @@
+import importlib.util
+import os
+from copy import deepcopy
+import mongomock
+import pytest
+from app.services import farmer_search, farmer_service
+from app.services.sync_service import FINGERPRINT_FIELD, SyncService
+from app.utils.crypto_utils import Keyring
+from app.utils.serialization import content_hash
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+# written by the batched path only, or generated per run
+GENERATED_FIELDS = {"_id", "farmer_id", "created_at", "updated_at", "sync_seq", "search_keys", "location",
+                    "possible_duplicate_of", FINGERPRINT_FIELD}
+
+
+def _bench_sync():
+    spec = importlib.util.spec_from_file_location("bench_sync", os.path.join(SCRIPTS_DIR, "bench_sync.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+bench_sync = _bench_sync()
+
+
+def _record(i, **changes):
+    rec = bench_sync.make_records(1, offset=i)[0]
+    for path, value in changes.items():
+        target = rec
+        *parents, leaf = path.split(".")
+        for parent in parents:
+            target = target[parent]
+        if value is None:
+            target.pop(leaf, None)
+        else:
+            target[leaf] = value
+    return rec
+
+
+def _batch():
+    """Records seeded beforehand, then a batch covering every outcome of the old loop."""
+    seed = [_record(0), _record(1, temp_id=None), _record(2, temp_id=None, nrc_number=None)]
+    batch = [
+        _record(0, **{"personal_info.last_name": "Phiri"}),               # updated by temp_id
+        _record(1, temp_id=None, **{"address.district": "Choma"}),       # updated by nrc_hash
+        _record(2, temp_id=None, nrc_number=None, **{"personal_info.first_name": "Ruth"}),  # by phone
+        _record(3),                                                      # created
+        _record(3, **{"personal_info.first_name": "Again"}),             # same temp_id later in the batch
+        _record(4, temp_id=None),                                        # created by NRC ...
+        _record(4, temp_id=None, **{"personal_info.last_name": "Zulu"}),  # ... and matched by it
+        _record(5, nrc_number="12/34"),                                  # invalid NRC
+        _record(6, **{"personal_info.phone_primary": "0977000000"}),     # invalid phone
+        _record(7, **{"personal_info.date_of_birth": "2020-01-01"}),     # too young
+        _record(8, temp_id=None, nrc_number=None, **{"personal_info.phone_primary": "+260971234567"}),
+        _record(9, temp_id=None, nrc_number=None, **{"personal_info.phone_primary": "+260971234567"}),
+    ]
+    return seed, batch
+
+
+def _run(process):
+    db = mongomock.MongoClient()["sync_test"]
+    seed, batch = _batch()
+    process(db, "seed@example.com", deepcopy(seed))
+    return db, process(db, "tablet@example.com", deepcopy(batch))
+
+
+def _stored(db):
+    docs = [{k: v for k, v in doc.items() if k not in GENERATED_FIELDS} for doc in db.farmers.find()]
+    return sorted(docs, key=repr)
+
+
+def test_matches_the_per_record_loop():
+    legacy_db, legacy = _run(bench_sync.legacy_process)
+    batched_db, batched = _run(SyncService.process_batch)
+
+    assert [r["status"] for r in batched] == [r["status"] for r in legacy] == [
+        "updated", "updated", "updated", "created", "updated", "created", "updated",
+        "error", "error", "error", "created", "updated",
+    ]
+    assert [r["temp_id"] for r in batched] == [r["temp_id"] for r in legacy]
+    for old, new in zip(legacy, batched):
+        assert bool(new["errors"]) == bool(old["errors"])
+        assert (new["farmer_id"] is None) == (old["farmer_id"] is None)
+    # the same farmer gets the later records of the batch
+    assert batched[4]["farmer_id"] == batched[3]["farmer_id"]
+    assert batched[6]["farmer_id"] == batched[5]["farmer_id"]
+    assert batched[11]["farmer_id"] == batched[10]["farmer_id"]
+    assert _stored(batched_db) == _stored(legacy_db)
+
+
+def test_replayed_records_are_unchanged_and_not_written():
+    db = mongomock.MongoClient()["sync_test"]
+    _, batch = _batch()
+    valid = [rec for i, rec in enumerate(batch) if i not in (7, 8, 9)]
+    first = SyncService.process_batch(db, "tablet@example.com", deepcopy(valid))
+    seqs = {doc["farmer_id"]: doc["sync_seq"] for doc in db.farmers.find()}
+
+    results = SyncService.process_batch(db, "tablet@example.com", deepcopy(valid))
+    # a farmer written from several records of the batch holds the last one, so the
+    # earlier ones differ from it and the whole group is written again
+    assert [r["status"] for r in results] == ["unchanged"] * 3 + ["updated"] * 6
+    assert [r["farmer_id"] for r in results] == [r["farmer_id"] for r in first]
+    after = {doc["farmer_id"]: doc["sync_seq"] for doc in db.farmers.find()}
+    assert after.keys() == seqs.keys()
+    for result in results[:3]:
+        assert after[result["farmer_id"]] == seqs[result["farmer_id"]]
+    for result in results[3:]:
+        assert after[result["farmer_id"]] > seqs[result["farmer_id"]]
+
+
+def test_progress_reports_every_record_once():
+    db = mongomock.MongoClient()["sync_test"]
+    seed, batch = _batch()
+    SyncService.process_batch(db, "seed@example.com", deepcopy(seed))
+    calls = []
+    results = SyncService.process_batch(db, "tablet@example.com", deepcopy(batch), chunk_size=2,
+                                        on_progress=lambda done, total, part: calls.append((done, total, part)))
+    assert [done for done, _, _ in calls] == sorted(done for done, _, _ in calls)
+    assert calls[-1][0] == calls[-1][1] == len(batch)
+    reported = [r for _, _, part in calls for r in part]
+    assert sorted(map(repr, reported)) == sorted(map(repr, results))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 500])
+def test_chunk_size_does_not_change_outcomes(chunk_size):
+    db = mongomock.MongoClient()["sync_test"]
+    seed, batch = _batch()
+    SyncService.process_batch(db, "seed@example.com", deepcopy(seed), chunk_size=chunk_size)
+    results = SyncService.process_batch(db, "tablet@example.com", deepcopy(batch), chunk_size=chunk_size)
+    assert [r["status"] for r in results] == [
+        "updated", "updated", "updated", "created", "updated", "created", "updated",
+        "error", "error", "error", "created", "updated",
+    ]
+
+
+def _indexed_db():
+    from app.indexes import ensure_indexes_sync
+    db = mongomock.MongoClient()["sync_test"]
+    ensure_indexes_sync(db)
+    return db
+
+
+def test_known_nrc_under_a_new_temp_id_updates_the_farmer():
+    db = _indexed_db()
+    first = SyncService.process_batch(db, "tablet-a@example.com", [_record(0, temp_id="tablet-a-1")])
+    # another tablet registers the same person (same NRC) under its own temp_id
+    again = SyncService.process_batch(db, "tablet-b@example.com",
+                                      [_record(0, temp_id="tablet-b-7", **{"personal_info.first_name": "Mwila"})])
+    assert again[0]["status"] == "updated", again[0]["errors"]
+    assert again[0]["farmer_id"] == first[0]["farmer_id"]
+    assert db.farmers.count_documents({}) == 1
+    assert db.farmers.find_one()["personal_info"]["first_name"] == "Mwila"
+
+
+def test_phone_fallback_never_merges_two_tablet_registrations():
+    db = _indexed_db()
+    api_farmer = _record(1, temp_id=None, nrc_number=None)
+    SyncService.process_batch(db, "operator@example.com", [api_farmer])
+    phone = api_farmer["personal_info"]["phone_primary"]
+    results = SyncService.process_batch(db, "tablet@example.com", [
+        _record(2, temp_id="t-1", nrc_number=None, **{"personal_info.phone_primary": phone}),
+        _record(3, temp_id="t-2", nrc_number=None, **{"personal_info.phone_primary": phone}),
+    ])
+    # the first takes over the farmer registered without a temp_id; a family member
+    # sharing the phone on the same tablet is a farmer of their own
+    assert [r["status"] for r in results] == ["updated", "created"]
+    assert db.farmers.count_documents({}) == 2
+
+
+def test_oversized_blocks_are_counted_not_fetched():
+    db = _indexed_db()
+    rec = _record(0, **{"personal_info.first_name": "Mwila", "personal_info.last_name": "Banda"})
+    common, rare = farmer_search.block_keys(farmer_search.search_keys(rec))
+    # one of its blocks is shared by too many farmers, the other by one similar farmer
+    db.farmers.insert_many(
+        [{"farmer_id": f"C{i}", farmer_search.SEARCH_FIELD: [common, "t:$mw", "t:mwi", "t:wil", "t:ila", "t:la$"]}
+         for i in range(farmer_search.MAX_BLOCK_CANDIDATES + 1)]
+        + [{"farmer_id": "R1", farmer_search.SEARCH_FIELD: [rare] + farmer_search.search_keys(rec)}]
+    )
+    queries = []
+    find = db.farmers.find
+    db.farmers.find = lambda query=None, *args, **kwargs: queries.append(query) or find(query, *args, **kwargs)
+
+    results = SyncService.process_batch(db, "tablet@example.com", [rec])
+    assert results[0]["possible_duplicates"] == ["R1"]
+    fetched = [q for q in queries if farmer_search.SEARCH_FIELD in (q or {})]
+    assert fetched == [{farmer_search.SEARCH_FIELD: {"$in": [rare]}}]
+
+
+def test_fingerprint_is_keyed(monkeypatch):
+    rec = _record(0)
+    fingerprints = []
+    for secret in (b"key-one", b"key-two"):
+        monkeypatch.setattr(farmer_service, "get_keyring", lambda secret=secret: Keyring({"k1": secret}, "k1"))
+        db = mongomock.MongoClient()["sync_test"]
+        SyncService.process_batch(db, "tablet@example.com", [deepcopy(rec)])
+        fingerprints.append(db.farmers.find_one()[FINGERPRINT_FIELD])
+    # not recomputable from the plaintext record, and different under another key
+    assert content_hash(rec) not in fingerprints
+    assert fingerprints[0] != fingerprints[1]
@@ -0,0 +1,176 @@
+import asyncio
+import gzip
+import json
+import fakeredis
+import pytest
+import redis
+from starlette.requests import Request
+from app.routes import sync
+from app.tasks import sync_jobs
+from app.tasks.celery_app import celery_app
+
+USER = "operator@example.com"
+
+
+def _line(i: int) -> bytes:
+    return json.dumps({"temp_id": f"t{i}", "personal_info": {"first_name": f"F{i}"}, "address": {}}).encode() + b"\n"
+
+
+def _request(parts: list, disconnect: bool = False, headers: list = ()) -> Request:
+    messages = [{"type": "http.request", "body": part, "more_body": True} for part in parts]
+    messages.append({"type": "http.disconnect"} if disconnect else {"type": "http.request", "body": b""})
+
+    async def receive():
+        return messages.pop(0)
+
+    return Request({"type": "http", "method": "POST", "path": "/api/sync/batch/stream",
+                    "headers": list(headers)}, receive)
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(sync_jobs, "get_redis", lambda r=fakeredis.FakeRedis(server=server): r)
+    monkeypatch.setattr(sync, "get_async_redis", lambda r=fakeredis.aioredis.FakeRedis(server=server): r)
+    monkeypatch.setattr(celery_app.conf, "result_backend", "cache+memory://")
+    monkeypatch.setattr(sync.settings, "SYNC_CHUNK_SIZE", 2)
+    task_ids = []
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, task_id: task_ids.append(task_id))
+    return task_ids
+
+
+def _upload(request, key="upload-1"):
+    return asyncio.run(sync.sync_batch_stream(request, current_user=USER, idempotency_key=key))
+
+
+def _claimed(key="upload-1") -> bool:
+    return sync_jobs.get_redis().exists(sync_jobs.IDEMPOTENCY_KEY.format(user=USER, key=f"stream:{key}")) == 1
+
+
+def test_complete_upload_keeps_its_key(sent):
+    result = _upload(_request([_line(0) + _line(1), _line(2)]))
+    assert result["status"] == "queued" and result["chunks"] == 2 and result["records"] == 3
+    assert sync_jobs.chunk_ids(result["job_id"]) == sent
+    assert _claimed()
+
+
+def test_disconnect_saves_enqueued_chunks_and_frees_the_key(sent):
+    with pytest.raises(sync.HTTPException) as e:
+        _upload(_request([_line(0) + _line(1) + _line(2)], disconnect=True))
+    assert e.value.status_code == 400
+    assert "disconnected" in e.value.detail["message"]
+    # the full chunk was enqueued and is tracked; the partial one never was
+    assert sync_jobs.chunk_ids(e.value.detail["job_id"]) == sent and len(sent) == 1
+    assert not _claimed()
+    # the client can send the same upload again under the same key
+    assert _upload(_request([_line(0) + _line(1) + _line(2)]))["status"] == "queued"
+
+
+def test_enqueue_error_saves_enqueued_chunks_and_frees_the_key(sent, monkeypatch):
+    def send_task(name, args, task_id):
+        if sent:
+            raise redis.ConnectionError("broker down")
+        sent.append(task_id)
+
+    saved = []
+    save_job = sync_jobs.save_job
+    monkeypatch.setattr(celery_app, "send_task", send_task)
+    monkeypatch.setattr(sync_jobs, "save_job", lambda task_ids, job_id: saved.append(save_job(task_ids, job_id)))
+    with pytest.raises(redis.ConnectionError):
+        _upload(_request([_line(0) + _line(1) + _line(2) + _line(3)]))
+    assert len(saved) == 1 and sync_jobs.chunk_ids(saved[0]) == sent
+    assert not _claimed()
+
+
+def test_nothing_enqueued_frees_the_key(sent):
+    with pytest.raises(sync.HTTPException) as e:
+        _upload(_request([b"x" * (sync.MAX_NDJSON_LINE_BYTES + 1)]), key="bad")
+    assert e.value.detail["job_id"] is None
+    assert not _claimed("bad") and not sent
+
+
+GZIP = [(b"content-encoding", b"gzip")]
+
+
+def test_gzip_body_is_inflated_in_bounded_pieces(sent, monkeypatch):
+    monkeypatch.setattr(sync.settings, "SYNC_CHUNK_SIZE", 5000)
+    # a few KB that inflate to more than one MAX_NDJSON_LINE_BYTES piece
+    lines = b"".join(_line(i % 2) for i in range(20000))
+    assert len(lines) > sync.MAX_NDJSON_LINE_BYTES
+    body = gzip.compress(lines)
+    result = _upload(_request([body[:len(body) // 2], body[len(body) // 2:]], headers=GZIP))
+    assert result["records"] == 20000 and result["chunks"] == 4
+
+
+def test_gzip_bomb_is_rejected(sent, monkeypatch):
+    monkeypatch.setattr(sync.settings, "SYNC_STREAM_MAX_BYTES", 1024 * 1024)
+    body = gzip.compress(b"\n" * (64 * 1024 * 1024))
+    with pytest.raises(sync.HTTPException) as e:
+        _upload(_request([body], headers=GZIP), key="bomb")
+    assert e.value.status_code == 400 and "exceeds 1048576 bytes" in e.value.detail["message"]
+
+
+def test_jobs_are_only_visible_to_their_submitter(sent):
+    job_id = _upload(_request([_line(0) + _line(1) + _line(2)]))["job_id"]
+    assert asyncio.run(sync.sync_job(job_id, current_user=USER))["chunks"] == 2
+    for call in (sync.sync_job(job_id, current_user="other@example.com"),
+                 sync.retry_sync_job(job_id, current_user="other@example.com"),
+                 sync.sync_status_stream(job_id=job_id, current_user="other@example.com")):
+        with pytest.raises(sync.HTTPException) as e:
+            asyncio.run(call)
+        assert e.value.status_code == 404
+
+
+def _events(job_id: str, publish=None) -> list:
+    """(event, data) pairs of a progress stream; `publish` runs after the first event."""
+    async def collect():
+        job = await sync.run_in_threadpool(sync._find_job, job_id, USER)
+        events = []
+        async for frame in sync._progress_events(job_id, *job):
+            if frame.startswith("event: "):
+                event, data = frame.split("\n")[:2]
+                events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+                if publish and len(events) == 1:
+                    publish()
+        return events
+    return asyncio.run(collect())
+
+
+@pytest.fixture
+def quick_stream(monkeypatch):
+    monkeypatch.setattr(sync.settings, "SYNC_STREAM_KEEPALIVE_SECONDS", 0.01)
+    monkeypatch.setattr(sync.settings, "SYNC_STREAM_IDLE_SECONDS", 0.05)
+
+
+def test_stream_of_an_unknown_job_is_a_404(sent):
+    with pytest.raises(sync.HTTPException) as e:
+        asyncio.run(sync.sync_status_stream(job_id="no-such-job", current_user=USER))
+    assert e.value.status_code == 404
+
+
+@pytest.mark.usefixtures("quick_stream")
+def test_stream_of_an_idle_job_ends(sent):
+    job_id = _upload(_request([_line(0) + _line(1) + _line(2)]))["job_id"]
+    events = _events(job_id)
+    assert [event for event, _ in events] == ["job", "idle"]
+    assert events[0][1]["state"] == "PROGRESS" and events[0][1]["chunks"] == 2
+
+
+@pytest.mark.usefixtures("quick_stream")
+def test_stream_of_an_upload_follows_its_chunks(sent):
+    job_id = _upload(_request([_line(0) + _line(1) + _line(2)]))["job_id"]
+
+    def chunk_progress():
+        event = {"job_id": sent[-1], "state": "PROGRESS", "done": 1, "total": 2, "results": []}
+        sync_jobs.get_redis().publish(sync.progress_channel(sent[-1]), json.dumps(event))
+
+    events = _events(job_id, publish=chunk_progress)
+    assert [event for event, _ in events] == ["job", "progress", "idle"]
+    assert events[1][1]["job_id"] == sent[-1]
+
+    for task_id in sent:
+        celery_app.backend.store_result(task_id, {"results": [{"status": "created"}]}, "SUCCESS")
+    # a finished job is a single snapshot
+    events = _events(job_id)
+    assert [event for event, _ in events] == ["job"]
+    assert events[0][1]["state"] == "SUCCESS" and events[0][1]["counts"] == {"created": 2}